@@ -1,14 +1,36 @@
 # main.py
 
-from src.data_preprocessing import load_data, clean_data, add_embeddings
-from src.search import build_index, search
-from src.embedding import get_embedding
-from src.summarization import generate_summary_local
+import argparse
+import logging
+import os
+import time
+
+# Models load lazily on first use (src.models), so these imports stay cheap.
+_import_start = time.perf_counter()
+from src.artifact_store import (
+    load_or_build, load_tombstones, KEYWORD_INDEX_FILE, ENTITY_INDEX_FILE, SUMMARY_CACHE_FILE, RESPONSE_CACHE_FILE,
+)
+from src.summarization import stream_summary_local, set_summary_cache, SummaryCache
 from src.router import route_request
-from src.linkedin_post import generate_linkedin_post
-from src.agent2 import retrieve_and_summarize  # Make sure you have this defined in agent2.py
+from src.linkedin_post import generate_linkedin_post, stream_linkedin_post
+from src.agent2 import retrieve_articles, summarize_articles, combine_summaries  # Make sure you have this defined in agent2.py
+from src.models import print_load_report
+from src.metadata_filter import MetadataIndex
+from src.tracing import start_trace, span
+from src.entity_index import load_entity_index
+from src.search import QUANTIZED_INDEX_TYPES
+from src.response_cache import ResponseCache, response_scope, response_cache_version
+
+# Hybrid search is optional (it needs scikit-learn).
+try:
+    from src.hybrid_search import load_or_build_hybrid_search
+except ImportError:
+    load_or_build_hybrid_search = None
+IMPORT_SECONDS = time.perf_counter() - _import_start
 import numpy as np
 
+logger = logging.getLogger("main")
+
 def interactive_query():
     """
     Prompt the user to enter a query and, if additional data is provided,
@@ -32,42 +54,139 @@ def interactive_query():
     return user_query, data_provided, extra_data
 
 def main():
+    parser = argparse.ArgumentParser(description="Answer one news query interactively.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print summaries and the LinkedIn post as they are generated (single-beam summaries).")
+    args = parser.parse_args()
+    # LOG_LEVEL=DEBUG also shows the retrieval debug lines (src.agent2); WARNING hides the stage timings.
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(levelname)s %(name)s: %(message)s")
+    logger.info("Imported src modules in %.2fs.", IMPORT_SECONDS)
     # Data loading and preprocessing.
     file_path = "data/sample.json"  # Please change to Dataset.json if whole dataset needed.
-    data = load_data(file_path)
-    if data is None:
+    store_dir = "data/artifacts"
+    index_type = "flat"  # Exact search; try "hnsw", "ivf_flat" or the compact "sq8" for the full dataset (see src/search.py).
+    num_shards = 1  # >1 builds the shards in parallel processes and searches them in parallel (see src/sharding.py).
+    # Embeddings, FAISS index and metadata are built once and memory-mapped on later runs.
+    artifacts = load_or_build(file_path, store_dir, text_column='short_description', batch_size=64,
+                              index_type=index_type, num_shards=num_shards)
+    if artifacts is None:
         print("Failed to load data!")
         return
-    data = clean_data(data)
-    data = add_embeddings(data, text_column='short_description')
-    
-    # Build the FAISS index.
-    embeddings_list = data['embedding'].tolist()
-    embeddings_np = np.vstack(embeddings_list)
-    index = build_index(embeddings_np)
+    data, embeddings_np, index = artifacts
+    # Quantized indexes re-rank their candidates exactly from the memory-mapped float32 embeddings.
+    rerank_embeddings = embeddings_np if index_type in QUANTIZED_INDEX_TYPES else None
+    # Articles retracted through src.ingest.retract_articles are skipped by every search.
+    excluded_ids = load_tombstones(store_dir)
+    # The BM25 keyword index is built once and reused by every hybrid query.
+    hybrid_search = None
+    if load_or_build_hybrid_search is not None:
+        hybrid_search = load_or_build_hybrid_search(data, os.path.join(store_dir, KEYWORD_INDEX_FILE),
+                                                    tfidf_field="short_description")
+    # Category/date/author lookups for filtered retrieval ("politics news from 2022").
+    metadata_index = MetadataIndex(data)
+    # Entity -> article lookups for boosting articles about the people/places in the query
+    # (built once by scripts/build_entity_index.py; None if it was never built).
+    entity_index = load_entity_index(data, os.path.join(store_dir, ENTITY_INDEX_FILE))
+    # Summaries of popular articles are reused across runs (see scripts/presummarize.py).
+    set_summary_cache(SummaryCache(max_size=1024, ttl=7 * 24 * 3600, db_path=os.path.join(store_dir, SUMMARY_CACHE_FILE)))
+    # Whole responses are reused for near-paraphrases of recent queries; ingesting or
+    # retracting articles changes the version, which drops them.
+    response_cache = ResponseCache(max_size=1024, ttl=3600, version=response_cache_version(store_dir),
+                                   db_path=os.path.join(store_dir, RESPONSE_CACHE_FILE))
     
     # Interactive query input.
     user_query, data_provided, extra_data = interactive_query()
     
+    # Every stage of the request is timed (see src.tracing).
+    with start_trace("request") as trace:
+        answer_query(user_query, data_provided, extra_data, data, index, excluded_ids, hybrid_search, metadata_index,
+                     entity_index, rerank_embeddings, response_cache, stream=args.stream)
+    logger.info("Request stages:\n%s", trace.format())
+    
+    # Only the models this request needed were loaded.
+    print_load_report()
+
+def print_stream(header, chunks):
+    """
+    Print a header, then each chunk of streamed text as soon as it arrives.
+    Returns the whole text.
+    """
+    print(header, end="", flush=True)
+    pieces = []
+    for chunk in chunks:
+        pieces.append(chunk)
+        print(chunk, end="", flush=True)
+    print()
+    return "".join(pieces)
+
+def print_post(text, mode, stream=False):
+    """
+    Generate and print a LinkedIn post; with stream, it is printed as GPT-2 writes it.
+    Returns the post.
+    """
+    header = "\n--- Generated LinkedIn Post ---\n"
+    if stream:
+        return print_stream(header, stream_linkedin_post(text, mode=mode, max_iterations=3))
+    post = generate_linkedin_post(text, mode=mode, max_iterations=3)
+    print(header + post)
+    return post
+
+def print_cache_hit(hit):
+    similarity, seconds = hit[1], hit[2]
+    print(f"\nReusing the response to a similar earlier query (similarity {similarity:.3f}, {seconds:.1f}s saved).")
+
+def answer_query(user_query, data_provided, extra_data, data, index, excluded_ids, hybrid_search, metadata_index,
+                 entity_index=None, rerank_embeddings=None, response_cache=None, stream=False):
+    """
+    Route the query and run the chosen agent, printing its result.
+
+    By default the summaries come from one batched beam-search pass and the post
+    is printed once complete. With stream, summaries and the post are printed as
+    they are generated; streamed summaries use a single beam (see
+    src.summarization.stream_summary_local), so they can differ from the default ones.
+    """
     # Use the router to determine the agent.
-    agent = route_request(user_query, data_provided)
+    with span("router"):
+        agent = route_request(user_query, data_provided)
     print("Router directs the query to:", agent)
+    # Search only the articles matching filters mentioned in the query.
+    with span("metadata_filter"):
+        filters, allowed_ids = metadata_index.filter_for_query(user_query)
+    print("Filters:", filters or "none")
     
     if agent == "Agent2":
         # Normal news retrieval & summarization branch.
-        query_embedding = get_embedding(user_query)
         top_k = 3
-        indices, distances = search(index, query_embedding, top_k)
+        # Streamed summaries are single-beam, so they are cached apart from batched ones.
+        scope = response_scope(agent, filters, top_k=top_k, streamed=stream)
+        query_embedding, hit = response_cache.lookup_query(user_query, scope) if response_cache else (None, None)
+        start = time.perf_counter()
+        streamed = stream and hit is None
+        if hit is not None:
+            print_cache_hit(hit)
+            indices, summaries = hit[0]["indices"], hit[0]["summaries"]
+        else:
+            indices = retrieve_articles(user_query, data, index, top_k=top_k, excluded_ids=excluded_ids,
+                                        allowed_ids=allowed_ids, entity_index=entity_index,
+                                        rerank_embeddings=rerank_embeddings)
+            # One batched beam-search pass over all articles; deterministic decoding matches
+            # scripts/presummarize.py, so pre-computed summaries are cache hits.
+            summaries = [] if streamed else summarize_articles(data, indices, deterministic=True)
         print("\nRetrieved Articles (by indices):", indices)
-        for idx in indices[0]:
-            article = data.iloc[idx]
+        articles = data.gather(indices, fields=["headline", "short_description"])
+        for position, article in enumerate(articles):
             headline = article.get("headline", "No Headline")
             short_description = article.get("short_description", "")
-            summary = generate_summary_local(short_description)
             print("\n--- Retrieved Article ---")
             print("Headline:", headline)
             print("Original Short Description:", short_description)
-            print("Summary:", summary)
+            if not streamed:
+                print("Summary:", summaries[position])
+                continue
+            # With --stream, each summary is printed as BART writes it (single beam, see stream_summary_local).
+            summaries.append(print_stream("Summary: ", stream_summary_local(short_description, deterministic=True)))
+        if hit is None and query_embedding is not None:
+            response_cache.put(query_embedding, scope, indices, summaries, time.perf_counter() - start)
             
     elif agent == "Agent3":
         # Agent 3: LinkedIn post generation.
@@ -75,15 +194,35 @@ def main():
             # Extra data provided: combine the user's query and the additional data,
             # and generate the LinkedIn post directly without contacting the database.
             combined_input = f"{user_query}. Additional details: {extra_data}"
-            linkedin_post = generate_linkedin_post(combined_input, mode="dynamic", initial_max_length=200, max_iterations=3)
+            print_post(combined_input, "dynamic", stream)
         else:
             # No extra data provided:
-            # Retrieve and summarize relevant news using hybrid search.
-            combined_summary = retrieve_and_summarize(user_query, data, index, top_k=2, use_hybrid=True, alpha=0.5)
-            linkedin_post = generate_linkedin_post(combined_summary, mode="default", initial_max_length=200, max_iterations=3)
-    
-        print("\n--- Generated LinkedIn Post ---")
-        print(linkedin_post)
+            # Retrieve and summarize relevant news using hybrid search (or reuse a cached response).
+            scope = response_scope(agent, filters, top_k=2, alpha=0.5)
+            query_embedding, hit = response_cache.lookup_query(user_query, scope) if response_cache else (None, None)
+            start = time.perf_counter()
+            if hit is not None:
+                print_cache_hit(hit)
+                indices, summaries, post = hit[0]["indices"], hit[0]["summaries"], hit[0].get("post")
+            else:
+                indices = retrieve_articles(user_query, data, index, top_k=2, use_hybrid=True, alpha=0.5,
+                                            excluded_ids=excluded_ids, hybrid_search=hybrid_search,
+                                            allowed_ids=allowed_ids, entity_index=entity_index,
+                                            rerank_embeddings=rerank_embeddings)
+                summaries = summarize_articles(data, indices, deterministic=True)
+                post = None
+            compute_seconds = time.perf_counter() - start
+            if post is not None:
+                print("\n--- Generated LinkedIn Post ---\n" + post)
+                return
+            start = time.perf_counter()
+            post = print_post(combine_summaries(summaries), "default", stream)
+            if hit is not None:
+                # The cached response has no post yet: store this one with its articles and summaries.
+                response_cache.add_post(hit[0], post, time.perf_counter() - start)
+            elif query_embedding is not None:
+                response_cache.put(query_embedding, scope, indices, summaries, compute_seconds, post=post,
+                                   post_seconds=time.perf_counter() - start)
 
 if __name__ == '__main__':
     main()
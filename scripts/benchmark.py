@@ -0,0 +1,406 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Allow running as `python scripts/benchmark.py` from the repository root.
+sys.path.insert(0, REPO_ROOT)
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from src.models import register_model
+from src.article_store import ArticleStore
+from src.data_preprocessing import iter_data_chunks, drop_seen_duplicates
+from src.embedding import get_embeddings, get_query_embedding, query_encoder
+from src.search import build_index, search, batch_search, INDEX_TYPES
+from src.hybrid_search import HybridSearch
+from src.agent2 import summarize_articles, retrieve_and_summarize
+from src.linkedin_post import generate_linkedin_post, stream_linkedin_post
+from src.summarization import set_summary_cache
+
+CATEGORIES = ["POLITICS", "WELLNESS", "ENTERTAINMENT", "TRAVEL", "STYLE & BEAUTY", "BUSINESS",
+              "SPORTS", "WORLD NEWS", "TECH", "SCIENCE"]
+# Metrics where a larger value is better; every other timing is lower-is-better.
+HIGHER_IS_BETTER = ("per_second",)
+
+class _StubEncoder:
+    # Deterministic bag-of-words vectors: each token maps to a fixed random direction.
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+        self._vectors = {}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _token_vector(self, token):
+        vector = self._vectors.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            self._vectors[token] = vector
+        return vector
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        rows = []
+        for text in ([texts] if single else texts):
+            vector = np.zeros(self.dimension, dtype=np.float32)
+            for token in text.lower().split():
+                vector += self._token_vector(token)
+            rows.append(vector / max(np.linalg.norm(vector), 1e-6))
+        matrix = np.stack(rows) if rows else np.zeros((0, self.dimension), dtype=np.float32)
+        return matrix[0] if single else matrix
+
+def _stub_summarizer(texts, max_length=40, **kwargs):
+    texts = [texts] if isinstance(texts, str) else texts
+    return [{"summary_text": " ".join(text.split()[:max_length // 2])} for text in texts]
+
+class _StubTokenizer:
+    # Word-level ids; id 0 is the pad/EOS token.
+    pad_token_id = 0
+    
+    def __init__(self):
+        self.words = ["<|endoftext|>"]
+        self.ids = {"<|endoftext|>": 0}
+    
+    def __call__(self, text, truncation=False, max_length=None, add_special_tokens=True):
+        ids = []
+        for word in text.split():
+            if word not in self.ids:
+                self.ids[word] = len(self.words)
+                self.words.append(word)
+            ids.append(self.ids[word])
+        return {"input_ids": ids[:max_length] if truncation and max_length else ids}
+    
+    def decode(self, ids, skip_special_tokens=False):
+        ids = ids.tolist() if hasattr(ids, "tolist") else ids
+        return " ".join(self.words[i] for i in ids if i or not skip_special_tokens)
+
+class _StubPostModel:
+    # Appends a canned three-sentence post, cut at max_new_tokens.
+    def __init__(self, tokenizer):
+        self.config = SimpleNamespace(n_positions=1024)
+        self.post_ids = tokenizer("First point. Second point. Third point.")["input_ids"]
+    
+    def generate(self, input_ids, max_new_tokens=20, streamer=None, **kwargs):
+        import torch
+        new_ids = torch.tensor([self.post_ids[:max_new_tokens]] * len(input_ids), dtype=input_ids.dtype)
+        if streamer is not None:
+            streamer.put(input_ids)
+            for token in new_ids[0]:
+                streamer.put(token.reshape(1))
+            streamer.end()
+        return SimpleNamespace(sequences=torch.cat([input_ids, new_ids], dim=1), past_key_values=None)
+
+def _stub_post_generator():
+    tokenizer = _StubTokenizer()
+    return SimpleNamespace(tokenizer=tokenizer, model=_StubPostModel(tokenizer))
+
+def use_stub_models():
+    """
+    Replace the registered model loaders with small deterministic stand-ins, so
+    the pipeline can be benchmarked offline (the numbers then measure everything
+    except model compute).
+    """
+    register_model("embedding", _StubEncoder)
+    register_model("summarizer", lambda: _stub_summarizer)
+    register_model("post_generator", _stub_post_generator)
+
+def synthetic_corpus(num_articles, vocabulary_size=5000, seed=0):
+    """
+    Generate News Category-like articles from a random vocabulary.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(vocabulary_size)])
+    # Zipf-like word frequencies, as in real text.
+    weights = 1 / np.arange(1, vocabulary_size + 1)
+    weights /= weights.sum()
+
+    def sentence(length):
+        return " ".join(rng.choice(vocabulary, size=length, p=weights))
+
+    return pd.DataFrame({
+        "link": [f"https://example.com/article/{i}" for i in range(num_articles)],
+        "headline": [sentence(8) for _ in range(num_articles)],
+        "category": rng.choice(CATEGORIES, size=num_articles),
+        "short_description": [sentence(int(rng.integers(15, 35))) for _ in range(num_articles)],
+        "authors": rng.choice(["Jane Doe", "John Roe", "Alex Poe, AP"], size=num_articles),
+        "date": pd.Timestamp("2012-01-28") + pd.to_timedelta(rng.integers(0, 3900, num_articles), unit="D"),
+    })
+
+def sampled_corpus(file_path, num_articles, chunksize=10000):
+    """
+    Read the first num_articles distinct rows of a line-delimited JSON dataset.
+    """
+    seen, chunks, total = set(), [], 0
+    for chunk in iter_data_chunks(file_path, chunksize=chunksize):
+        chunk = drop_seen_duplicates(chunk, seen)
+        chunks.append(chunk.head(num_articles - total))
+        total += len(chunks[-1])
+        if total >= num_articles:
+            break
+    return pd.concat(chunks, ignore_index=True)
+
+def make_queries(texts, num_queries, words_per_query=5, seed=1):
+    """
+    Build queries from random words of random articles, so most have relevant matches.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    for position in rng.integers(0, len(texts), size=num_queries):
+        words = texts[position].split() or ["news"]
+        queries.append(" ".join(rng.choice(words, size=min(words_per_query, len(words)), replace=False)))
+    return queries
+
+def latency_stats(seconds):
+    """
+    Summarize per-call latencies (seconds) as count, mean and p50/p95/p99 in milliseconds.
+    """
+    millis = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "count": int(len(millis)),
+        "mean_ms": round(float(millis.mean()), 4),
+        "p50_ms": round(float(np.percentile(millis, 50)), 4),
+        "p95_ms": round(float(np.percentile(millis, 95)), 4),
+        "p99_ms": round(float(np.percentile(millis, 99)), 4),
+    }
+
+def time_calls(func, inputs):
+    """
+    Call func once per input and return the latency of each call in seconds.
+    Output printed by the pipeline is swallowed so it does not skew the timings.
+    """
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in inputs:
+            start = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def time_to_first_chunk(stream, inputs):
+    """
+    Consume stream(input) for each input and return the seconds until its first chunk.
+    """
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in inputs:
+            start = time.perf_counter()
+            first = None
+            for _ in stream(item):
+                first = first or time.perf_counter() - start
+            latencies.append(first if first is not None else time.perf_counter() - start)
+    return latencies
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 2)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(data, num_queries=200, top_k=5, batch_size=64, index_types=("flat", "hnsw"),
+                   generation_requests=20):
+    """
+    Benchmark every stage of the pipeline on the given articles.
+
+    Parameters:
+        data (pandas.DataFrame): The corpus.
+        num_queries (int): Queries used for the latency measurements.
+        top_k (int): Results per query.
+        batch_size (int): Embedding and batch-search batch size.
+        index_types (tuple): Index types whose build time is measured (flat is always
+                             used for the query benchmarks).
+        generation_requests (int): Requests timed for summarization and post generation.
+
+    Returns:
+        dict: Machine-readable results (see README.md, "Benchmarks").
+    """
+    results = {}
+    store = ArticleStore.from_dataframe(data)
+    texts = store.texts("short_description")
+    queries = make_queries(texts, num_queries)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        embeddings = get_embeddings(texts, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    results["corpus_embedding"] = {"texts": len(texts), "seconds": round(seconds, 4),
+                                   "texts_per_second": round(len(texts) / seconds, 2)}
+
+    results["index_build"] = {}
+    indexes = {}
+    for index_type in index_types:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            indexes[index_type] = build_index(embeddings, index_type=index_type)
+        results["index_build"][index_type] = {"seconds": round(time.perf_counter() - start, 4)}
+    index = indexes.get("flat") or build_index(embeddings)
+    start = time.perf_counter()
+    hybrid_search = HybridSearch(store)
+    results["index_build"]["bm25"] = {"seconds": round(time.perf_counter() - start, 4)}
+
+    # Distinct queries, so every one of them is a query-cache miss.
+    query_encoder.clear()
+    results["query_embedding"] = latency_stats(time_calls(get_query_embedding, queries))
+    query_embeddings = [get_query_embedding(query) for query in queries]
+
+    results["single_query"] = {
+        "flat": latency_stats(time_calls(lambda q: search(index, q, top_k), query_embeddings)),
+        "hybrid": latency_stats(time_calls(
+            lambda i: hybrid_search.search(queries[i], index, top_k=top_k, query_embedding=query_embeddings[i]),
+            range(len(queries)))),
+    }
+
+    results["batch_query"] = {}
+    for name, run in (("flat", lambda: batch_search(index, np.stack(query_embeddings), top_k=top_k,
+                                                    batch_size=batch_size)),
+                      ("hybrid", lambda: hybrid_search.batch_search(queries, index, top_k=top_k,
+                                                                    batch_size=batch_size))):
+        seconds = time_calls(lambda _: run(), [None])[0]
+        results["batch_query"][name] = {"queries": len(queries), "seconds": round(seconds, 4),
+                                        "queries_per_second": round(len(queries) / seconds, 2)}
+
+    # Generation is timed without the summary cache, so every request does the work.
+    set_summary_cache(None)
+    request_queries = queries[:generation_requests]
+    retrieved = [search(index, query_embeddings[i], 3)[0][0].tolist() for i in range(len(request_queries))]
+    results["summarization"] = latency_stats(time_calls(
+        lambda ids: summarize_articles(store, ids, deterministic=True), retrieved))
+    # The first post imports torch/transformers for the stopping criteria; keep that out of the timings.
+    generate_linkedin_post(request_queries[0], mode="dynamic", max_iterations=3)
+    post_stats = []
+    results["post_generation"] = latency_stats(time_calls(
+        lambda query: post_stats.append(generate_linkedin_post(query, mode="dynamic", max_iterations=3,
+                                                               return_stats=True)[1]),
+        request_queries))
+    results["post_generation"]["generated_tokens"] = sum(stats["generated_tokens"] for stats in post_stats)
+    results["post_generation"]["discarded_tokens"] = sum(stats["discarded_tokens"] for stats in post_stats)
+    # Perceived latency of the streaming API: time until the first words can be shown.
+    results["post_first_chunk"] = latency_stats(time_to_first_chunk(
+        lambda query: stream_linkedin_post(query, mode="dynamic", max_iterations=3), request_queries))
+    results["retrieve_and_summarize"] = latency_stats(time_calls(
+        lambda query: retrieve_and_summarize(query, store, index, top_k=3, use_hybrid=True,
+                                             hybrid_search=hybrid_search, deterministic=True),
+        request_queries))
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not name.endswith("count"):
+            flat[name] = value
+    return flat
+
+def compare_results(current, baseline, tolerance=0.2, min_delta_ms=1.0):
+    """
+    Compare two benchmark results and list the metrics that got worse by more
+    than tolerance (relative). Metrics ending in "per_second" are higher-is-better;
+    all other timings and sizes are lower-is-better. Timing changes smaller than
+    min_delta_ms are treated as noise.
+
+    Returns:
+        list: (metric, baseline value, current value) for every regression.
+    """
+    current, baseline = _flatten(current.get("results", current)), _flatten(baseline.get("results", baseline))
+    regressions = []
+    for metric, old in baseline.items():
+        new = current.get(metric)
+        if new is None or old <= 0 or metric.endswith(("texts", "queries")):
+            continue
+        if metric.endswith(HIGHER_IS_BETTER):
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+            if metric.endswith("_ms"):
+                worse = worse and new - old >= min_delta_ms
+            elif metric.endswith("seconds"):
+                worse = worse and (new - old) * 1000 >= min_delta_ms
+        if worse:
+            regressions.append((metric, old, new))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval and generation.")
+    parser.add_argument("--data", help="Line-delimited JSON dataset to sample (default: synthetic articles).")
+    parser.add_argument("--num-articles", type=int, default=5000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--generation-requests", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--index-types", default="flat,hnsw", help=f"Comma-separated subset of {INDEX_TYPES}.")
+    parser.add_argument("--real-models", action="store_true",
+                        help="Use the real MiniLM/BART/GPT-2 models instead of offline stubs.")
+    parser.add_argument("--output", help="Write the JSON results to this file (default: stdout).")
+    parser.add_argument("--baseline", help="Earlier JSON results; exit with status 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown vs. the baseline.")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore timing changes smaller than this.")
+    args = parser.parse_args()
+
+    if not args.real_models:
+        use_stub_models()
+    if args.data:
+        data, source = sampled_corpus(args.data, args.num_articles), args.data
+    else:
+        data, source = synthetic_corpus(args.num_articles), "synthetic"
+
+    results = run_benchmarks(data, num_queries=args.num_queries, top_k=args.top_k, batch_size=args.batch_size,
+                             index_types=tuple(args.index_types.split(",")),
+                             generation_requests=args.generation_requests)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "faiss": faiss.__version__,
+            "models": "real" if args.real_models else "stub",
+            "corpus": source,
+            "num_articles": len(data),
+            "num_queries": args.num_queries,
+            "top_k": args.top_k,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Benchmark results written to {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(report, json.load(f), tolerance=args.tolerance,
+                                          min_delta_ms=args.min_delta_ms)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old} -> {new}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+import time
+
+# Allow running as `python scripts/build_entity_index.py` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.artifact_store import load_or_build, ENTITY_INDEX_FILE
+from src.entity_index import build_entity_index
+
+def build(file_path, store_dir, batch_size=256, n_process=1):
+    """
+    Run NER over every article once and save the entity -> article index
+    that main.py and src/server.py use to boost entity matches.
+    """
+    artifacts = load_or_build(file_path, store_dir, text_column='short_description')
+    if artifacts is None:
+        print("Failed to load data!")
+        return
+    data, _, _ = artifacts
+    start = time.perf_counter()
+    entity_index = build_entity_index(data, batch_size=batch_size, n_process=n_process)
+    entity_index.save(os.path.join(store_dir, ENTITY_INDEX_FILE))
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(entity_index.postings)} entities over {entity_index.num_documents} articles "
+          f"in {elapsed:.1f}s ({entity_index.num_documents / max(elapsed, 1e-9):.0f} articles/s).")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the entity index used for entity-aware retrieval.")
+    parser.add_argument("--data", default="data/sample.json")
+    parser.add_argument("--store-dir", default="data/artifacts")
+    parser.add_argument("--batch-size", type=int, default=256, help="Texts per spaCy nlp.pipe batch.")
+    parser.add_argument("--n-process", type=int, default=1, help="spaCy worker processes (-1 = one per CPU).")
+    args = parser.parse_args()
+    build(args.data, args.store_dir, batch_size=args.batch_size, n_process=args.n_process)
@@ -1,20 +1,38 @@
-import pandas as pd
+import random
 
-def create_sample(input_file_path, output_file_path, sample_size=1000):
+def create_sample(input_file_path, output_file_path, sample_size=1000, reservoir=False, seed=0):
     """
-    Reads the full JSON dataset and writes the first sample_size rows to a new JSON file.
+    Streams the full JSON dataset line by line and writes sample_size rows to a new JSON file.
+
+    By default the first sample_size rows are taken and reading stops as soon
+    as they are found. With reservoir=True the whole file is read once and a
+    uniform random sample is kept (reservoir sampling), so memory stays bounded
+    by sample_size either way. Rows are copied verbatim.
     """
+    rng = random.Random(seed)
+    sample = []
+    seen = 0
     try:
-        # Load the full dataset 
-        data = pd.read_json(input_file_path, lines=True)
-        print(f"Full dataset loaded. Shape: {data.shape}")
-
-        # Select the first sample_size rows
-        sample_data = data.head(sample_size)
-        print(f"Sample created. Shape: {sample_data.shape}")
+        with open(input_file_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                seen += 1
+                if len(sample) < sample_size:
+                    sample.append(line)
+                    if not reservoir and len(sample) == sample_size:
+                        break
+                elif reservoir:
+                    # Keep the new row with probability sample_size / seen.
+                    slot = rng.randrange(seen)
+                    if slot < sample_size:
+                        sample[slot] = line
+        print(f"Read {seen} rows. Sample created with {len(sample)} rows.")
 
         # Save the sample data to a new JSON file in line-delimited format
-        sample_data.to_json(output_file_path, orient='records', lines=True)
+        with open(output_file_path, "w", encoding="utf-8") as f:
+            for line in sample:
+                f.write(line if line.endswith("\n") else line + "\n")
         print(f"Sample saved to {output_file_path}")
     except Exception as e:
         print("Error creating sample:", e)
@@ -0,0 +1,25 @@
+import os
+import sys
+
+# Allow running as `python scripts/presummarize.py` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.artifact_store import load_or_build, SUMMARY_CACHE_FILE
+from src.summarization import presummarize_corpus, set_summary_cache, SummaryCache
+
+def presummarize(file_path, store_dir, text_column='short_description', batch_size=8):
+    """
+    Summarize every article of the dataset ahead of time and store the results
+    in the on-disk summary cache used by main.py.
+    """
+    artifacts = load_or_build(file_path, store_dir, text_column=text_column)
+    if artifacts is None:
+        print("Failed to load data!")
+        return
+    data, _, _ = artifacts
+    set_summary_cache(SummaryCache(max_size=1024, db_path=os.path.join(store_dir, SUMMARY_CACHE_FILE)))
+    # Deterministic decoding, so the cached summaries are reproducible.
+    presummarize_corpus(data.texts(text_column), batch_size=batch_size, deterministic=True)
+
+if __name__ == '__main__':
+    presummarize("data/sample.json", "data/artifacts")
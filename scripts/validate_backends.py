@@ -0,0 +1,188 @@
+import argparse
+import difflib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Allow running as `python scripts/validate_backends.py` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.backends import BACKENDS
+
+MODELS = ("embedding", "summarizer", "post_generator")
+# Minimum agreement with fp32 PyTorch for a backend to pass: mean cosine similarity
+# of the embeddings, mean word-sequence similarity of the summaries and greedy posts.
+PARITY_THRESHOLDS = {"embedding": 0.99, "summarizer": 0.8, "post_generator": 0.8}
+# Greedy tokens generated per post prompt.
+POST_TOKENS = 40
+SAMPLE_TEXTS = [
+    "The central bank held interest rates steady on Wednesday, saying inflation had cooled but remained above "
+    "its target, and signalled that cuts were unlikely before the end of the year.",
+    "A powerful storm knocked out electricity to more than 200,000 homes across the region overnight, and "
+    "officials warned that repairs could take several days as crews cleared fallen trees.",
+    "The company unveiled a smaller, cheaper electric car aimed at first-time buyers, betting that a lower price "
+    "will revive demand after a year of slowing sales and heavy discounting.",
+    "Researchers found that adults who walked at least 7,000 steps a day had a markedly lower risk of heart "
+    "disease than those who walked less, regardless of how fast they walked.",
+    "The city council approved a plan to convert empty office towers downtown into apartments, offering tax "
+    "breaks to developers who set aside a share of the units as affordable housing.",
+    "After a decade-long restoration, the museum reopened its main hall with a new exhibition of Renaissance "
+    "paintings, some of which have never been shown to the public before.",
+    "The national team advanced to the semifinals with a late goal in extra time, setting up a rematch "
+    "against the side that knocked them out of the tournament four years ago.",
+    "Lawmakers introduced a bill that would require social media platforms to verify the age of their users "
+    "and give parents more control over the accounts of children under sixteen.",
+]
+
+def load_texts(file_path, num_texts, text_column="short_description"):
+    """
+    Read the first num_texts non-trivial texts of a line-delimited JSON dataset.
+    """
+    from src.data_preprocessing import iter_data_chunks
+    texts = []
+    for chunk in iter_data_chunks(file_path):
+        texts.extend(text for text in chunk[text_column] if isinstance(text, str) and len(text.split()) >= 20)
+        if len(texts) >= num_texts:
+            break
+    return texts[:num_texts]
+
+def _run_embedding(texts):
+    from src.embedding import get_embeddings
+    from src.models import get_model
+    model = get_model("embedding")
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        model.encode(text)
+        latencies.append(time.perf_counter() - start)
+    return get_embeddings(texts).tolist(), latencies
+
+def _run_summarizer(texts):
+    from src.summarization import generate_summary_local
+    outputs, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        outputs.append(generate_summary_local(text, use_cache=False, deterministic=True))
+        latencies.append(time.perf_counter() - start)
+    return outputs, latencies
+
+def _run_post_generator(texts):
+    # Greedy decoding, so the backends can be compared token for token.
+    from src.models import get_model
+    generator = get_model("post_generator")
+    outputs, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        result = generator(text, max_new_tokens=POST_TOKENS, do_sample=False, return_full_text=False)
+        outputs.append(result[0]["generated_text"])
+        latencies.append(time.perf_counter() - start)
+    return outputs, latencies
+
+RUNNERS = {"embedding": _run_embedding, "summarizer": _run_summarizer, "post_generator": _run_post_generator}
+
+def _measure(model, backend, texts, num_threads):
+    # Runs in a fresh process, so the load time and memory belong to this backend alone.
+    from src.backends import set_backend, set_num_threads, resident_memory_mb
+    from src.models import get_model, load_report
+    if num_threads:
+        set_num_threads(num_threads)
+    set_backend(model, backend)
+    before = resident_memory_mb()
+    get_model(model)
+    loaded = resident_memory_mb()
+    # Untimed warm-up call (first-call allocations, ONNX Runtime graph initialization).
+    RUNNERS[model](texts[:1])
+    outputs, latencies = RUNNERS[model](texts)
+    millis = np.asarray(latencies) * 1000
+    return {
+        "outputs": outputs,
+        "load_seconds": round(load_report()[model]["load_seconds"], 3),
+        "model_memory_mb": round(loaded - before, 1) if before is not None else None,
+        "resident_memory_mb": round(resident_memory_mb(), 1) if before is not None else None,
+        "latency_ms": {"mean": round(float(millis.mean()), 2), "p50": round(float(np.percentile(millis, 50)), 2),
+                       "p95": round(float(np.percentile(millis, 95)), 2)},
+    }
+
+def embedding_agreement(reference, candidate):
+    """
+    Cosine similarity between reference and candidate embeddings of the same texts.
+    """
+    reference, candidate = np.asarray(reference), np.asarray(candidate)
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1) + 1e-12)
+    return {"score": round(float(cosines.mean()), 6), "min_cosine": round(float(cosines.min()), 6)}
+
+def text_agreement(reference, candidate):
+    """
+    Word-sequence similarity (difflib ratio, 1.0 = identical) between reference
+    and candidate outputs for the same inputs, plus the fraction that match exactly.
+    """
+    ratios = [difflib.SequenceMatcher(None, a.split(), b.split()).ratio() for a, b in zip(reference, candidate)]
+    exact = [a.strip() == b.strip() for a, b in zip(reference, candidate)]
+    return {"score": round(float(np.mean(ratios)), 4), "min_similarity": round(float(np.min(ratios)), 4),
+            "exact_match": round(float(np.mean(exact)), 4)}
+
+def validate(models=MODELS, backends=("int8", "onnx"), texts=SAMPLE_TEXTS, num_threads=None):
+    """
+    Run each model on fp32 PyTorch and on each candidate backend (one fresh
+    process per run) and compare latency, load time, memory and output parity.
+
+    Returns:
+        dict: model -> backend -> measurements (plus "parity" and "passed" for candidates).
+    """
+    report = {}
+    context = multiprocessing.get_context("spawn")
+    for model in models:
+        report[model] = {}
+        reference = None
+        for backend in ("torch",) + tuple(b for b in backends if b != "torch"):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    result = executor.submit(_measure, model, backend, list(texts), num_threads).result()
+                except Exception as e:
+                    report[model][backend] = {"error": f"{type(e).__name__}: {e}"}
+                    continue
+            outputs = result.pop("outputs")
+            if backend == "torch":
+                reference = outputs
+            elif reference is not None:
+                agreement = embedding_agreement if model == "embedding" else text_agreement
+                result["parity"] = agreement(reference, outputs)
+                result["passed"] = result["parity"]["score"] >= PARITY_THRESHOLDS[model]
+            report[model][backend] = result
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the inference backends of each model against fp32 PyTorch.")
+    parser.add_argument("--models", default=",".join(MODELS), help=f"Comma-separated subset of {MODELS}.")
+    parser.add_argument("--backends", default="int8,onnx", help=f"Comma-separated subset of {BACKENDS}.")
+    parser.add_argument("--threads", type=int, help="Intra-op threads per model (default: library default).")
+    parser.add_argument("--data", help="Line-delimited JSON dataset to take texts from (default: built-in samples).")
+    parser.add_argument("--num-texts", type=int, default=16)
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout).")
+    args = parser.parse_args()
+
+    texts = load_texts(args.data, args.num_texts) if args.data else SAMPLE_TEXTS[:args.num_texts]
+    report = validate(models=tuple(args.models.split(",")), backends=tuple(args.backends.split(",")), texts=texts,
+                      num_threads=args.threads)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Backend report written to {args.output}")
+    else:
+        print(text)
+
+    failed = [f"{model}/{backend}" for model, results in report.items() for backend, result in results.items()
+              if result.get("passed") is False or "error" in result]
+    if failed:
+        print("Failed parity or errors: " + ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+# Allow running as `python scripts/validate_index_types.py` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from src.artifact_store import save_artifacts, load_artifacts
+from src.search import INDEX_TYPES, build_index, search
+
+def synthetic_store(num_vectors, dimension, seed=0):
+    """
+    Random unit-norm embeddings and matching article metadata (no models needed).
+    """
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    data = pd.DataFrame({
+        "link": [f"https://example.com/{i}" for i in range(num_vectors)],
+        "headline": [f"Article {i}" for i in range(num_vectors)],
+        "category": ["POLITICS" if i % 2 else "TECH" for i in range(num_vectors)],
+        "short_description": [f"Description {i}" for i in range(num_vectors)],
+        "authors": ["Staff"] * num_vectors,
+        "date": pd.to_datetime("2022-01-01") + pd.to_timedelta(np.arange(num_vectors) % 365, unit="D"),
+    })
+    return data, embeddings
+
+def check_index_type(index_type, data, embeddings, store_dir, num_queries=8, top_k=5):
+    """
+    Build an index of the given type, save it as an artifact store, reload it
+    both memory-mapped and in memory and compare the search results (plain and
+    with excluded ids) with those of the freshly built index.
+
+    Returns:
+        dict: "passed" and, per load mode, whether the results matched (or the error).
+    """
+    index = build_index(embeddings, index_type=index_type)
+    save_artifacts(store_dir, "validate", data, embeddings, index, index_type=index_type)
+    queries = embeddings[:num_queries]
+    excluded_ids = np.arange(0, len(embeddings), 3, dtype=np.int64)
+    expected = [search(index, query, top_k=top_k, excluded_ids=excluded) for query in queries
+                for excluded in (None, excluded_ids)]
+    result = {}
+    for mode, mmap in (("mmap", True), ("memory", False)):
+        try:
+            artifacts = load_artifacts(store_dir, index_type=index_type, mmap=mmap)
+            if artifacts is None:
+                raise RuntimeError("load_artifacts returned None")
+            _, _, loaded = artifacts
+            found = [search(loaded, query, top_k=top_k, excluded_ids=excluded) for query in queries
+                     for excluded in (None, excluded_ids)]
+            result[mode] = all(np.array_equal(a[0], b[0]) for a, b in zip(expected, found))
+        except Exception as e:
+            result[mode] = f"{type(e).__name__}: {e}"
+    result["passed"] = all(value is True for value in result.values())
+    return result
+
+def validate(index_types=INDEX_TYPES, num_vectors=5000, dimension=64):
+    """
+    Build and reload every index type through the artifact store.
+
+    Returns:
+        dict: index type -> result of check_index_type().
+    """
+    data, embeddings = synthetic_store(num_vectors, dimension)
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index_type in index_types:
+            report[index_type] = check_index_type(index_type, data, embeddings, os.path.join(tmp_dir, index_type))
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, save and reload every FAISS index type of the artifact store.")
+    parser.add_argument("--index-types", default=",".join(INDEX_TYPES), help=f"Comma-separated subset of {INDEX_TYPES}.")
+    parser.add_argument("--num-vectors", type=int, default=5000)
+    parser.add_argument("--dimension", type=int, default=64)
+    args = parser.parse_args()
+
+    report = validate(index_types=tuple(args.index_types.split(",")), num_vectors=args.num_vectors,
+                      dimension=args.dimension)
+    print(json.dumps(report, indent=2))
+    failed = [index_type for index_type, result in report.items() if not result["passed"]]
+    if failed:
+        print("Failed to reload: " + ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 # src/agent2.py
 
-from src.embedding import get_embedding
-from src.search import search
-from src.summarization import generate_summary_local
+import logging
+
+import numpy as np
+from src.embedding import get_query_embedding
+from src.search import search, distances_to_similarities
+from src.entity_index import boost_scores
+from src.summarization import generate_summaries_local
+from src.tracing import span
 
 # Attempt to import our HybridSearch class.
 try:
@@ -10,62 +15,151 @@ try:
 except ImportError:
     HybridSearch = None
 
-def retrieve_and_summarize(query: str, data, index, top_k: int = 3, use_hybrid: bool = False, alpha: float = 0.5) -> str:
+logger = logging.getLogger(__name__)
+
+# Keyword indexes built on demand, keyed by the dataset object they were fitted on.
+_hybrid_cache = {}
+
+def get_hybrid_search(data, tfidf_field="short_description"):
+    """
+    Return a shared HybridSearch for the dataset, fitting it only on first use.
+    """
+    key = (id(data), tfidf_field)
+    hs = _hybrid_cache.get(key)
+    if hs is None or hs.data is not data:
+        hs = HybridSearch(data, tfidf_field=tfidf_field)
+        _hybrid_cache.clear()
+        _hybrid_cache[key] = hs
+    return hs
+
+def retrieve_articles(query: str, data, index, top_k: int = 3, use_hybrid: bool = False, alpha: float = 0.5,
+                      excluded_ids=None, hybrid_search=None, allowed_ids=None, entity_index=None,
+                      rerank_embeddings=None) -> list:
+    """
+    Retrieve the indices of the most relevant articles for a query (the
+    retrieval half of retrieve_and_summarize).
+    
+    Parameters:
+        The same as retrieve_and_summarize.
+    
+    Returns:
+        list: Row indices into data, best match first.
+    """
+    # Generate an embedding for the query (once per request; repeated queries hit the cache).
+    with span("query_embedding"):
+        query_embedding = get_query_embedding(query)
+    
+    # Articles mentioning an entity of the query get a score boost (a dictionary lookup, no NER model).
+    boost_ids = None
+    if entity_index is not None:
+        with span("entity_match") as attributes:
+            entities = entity_index.match_query(query)
+            boost_ids = entity_index.select(entities)
+            attributes["entities"] = len(entities)
+    
+    # Retrieve candidate indices.
+    with span("retrieval", hybrid=bool(use_hybrid and HybridSearch is not None), top_k=top_k):
+        if use_hybrid and HybridSearch is not None:
+            # Reuse the keyword index built over the specified text field (e.g., "short_description").
+            hs = hybrid_search if hybrid_search is not None else get_hybrid_search(data, tfidf_field="short_description")
+            candidate_indices = hs.search(query, index, top_k=top_k, alpha=alpha, excluded_ids=excluded_ids,
+                                          query_embedding=query_embedding, allowed_ids=allowed_ids,
+                                          boost_ids=boost_ids, rerank_embeddings=rerank_embeddings)
+        elif boost_ids is not None:
+            # Semantic search with entity boosting: rerank a wider candidate set.
+            indices, distances = search(index, query_embedding, top_k * 3, excluded_ids=excluded_ids,
+                                        allowed_ids=allowed_ids, rerank_embeddings=rerank_embeddings)
+            valid = indices[0] >= 0
+            candidates = indices[0][valid]
+            scores = boost_scores(candidates, distances_to_similarities(index, distances)[0][valid], boost_ids)
+            order = np.argsort(-scores, kind="stable")[:top_k]
+            candidate_indices = candidates[order].tolist()
+        else:
+            # Use semantic search only.
+            indices, distances = search(index, query_embedding, top_k, excluded_ids=excluded_ids,
+                                        allowed_ids=allowed_ids, rerank_embeddings=rerank_embeddings)
+            # FAISS pads with -1 when fewer than top_k vectors are searchable.
+            candidate_indices = [idx for idx in indices[0].tolist() if idx >= 0]
+    
+    logger.debug("Retrieved indices: %s", candidate_indices)
+    return candidate_indices
+
+def summarize_articles(data, candidate_indices, deterministic: bool = False) -> list:
+    """
+    Summarize the short descriptions of the given articles in one batched pass
+    (the summarization half of retrieve_and_summarize).
+    
+    Parameters:
+        data (ArticleStore): The article metadata (see src.article_store).
+        candidate_indices (list): Row indices of the articles to summarize.
+        deterministic (bool): Summarize with beam search only (no sampling).
+    
+    Returns:
+        list: One summary per article (empty for articles without a description).
+    """
+    descriptions = []
+    # Fetch all retrieved rows in one batched gather.
+    articles = data.gather(candidate_indices, fields=["headline", "short_description"])
+    for idx, article in zip(candidate_indices, articles):
+        headline = article.get("headline", "No Headline")
+        short_description = article.get("short_description", "")
+        logger.debug("Processing article at index %s: headline=%r short_description=%r",
+                     idx, headline, short_description)
+        descriptions.append(short_description)
+    
+    # Summarize all retrieved short descriptions in one batched pass.
+    return generate_summaries_local(descriptions, deterministic=deterministic)
+
+def retrieve_and_summarize(query: str, data, index, top_k: int = 3, use_hybrid: bool = False, alpha: float = 0.5,
+                           excluded_ids=None, hybrid_search=None, deterministic: bool = False,
+                           allowed_ids=None, entity_index=None, rerank_embeddings=None) -> str:
     """
     Given a query, retrieve the most relevant news articles from the preprocessed data
     and generate a concatenated summary of their short descriptions.
     
     Parameters:
         query (str): The user query.
-        data (pandas.DataFrame): The preprocessed news dataset.
+        data (ArticleStore): The article metadata (see src.article_store).
         index (faiss.Index): The FAISS index built over article embeddings.
         top_k (int): Number of articles to retrieve.
         use_hybrid (bool): If True, use hybrid search (combining semantic and keyword-based retrieval);
                            if False, use semantic search only.
         alpha (float): Weight parameter for hybrid search. 
                        (alpha = 1.0: all semantic; alpha = 0.0: all keyword-based.)
+        excluded_ids (array-like): Optional index ids to skip (e.g. retracted articles).
+        hybrid_search (HybridSearch): A prebuilt keyword index to reuse. If None, a shared
+                                      one is fitted on first use and cached for later queries.
+        deterministic (bool): Summarize with beam search only (no sampling), so cached
+                              and pre-computed summaries are reproducible.
+        allowed_ids (numpy.ndarray): Optional mask of the only articles to search, e.g. from
+                                     src.metadata_filter.MetadataIndex.filter_for_query.
+        entity_index (EntityIndex): Optional entity index (see src.entity_index); articles
+                                    mentioning an entity named in the query rank higher.
+        rerank_embeddings (numpy.ndarray): Optional full-precision (memory-mapped) embeddings;
+                                           with a quantized index (src.search.QUANTIZED_INDEX_TYPES)
+                                           the candidates are re-ranked with exact distances.
     
     Returns:
         str: A combined summary string generated by summarizing the retrieved articles.
     """
-    # Generate an embedding for the query.
-    query_embedding = get_embedding(query)
-    
-    # Retrieve candidate indices.
-    if use_hybrid and HybridSearch is not None:
-        # Initialize hybrid search with the specified TF-IDF field (e.g., "short_description").
-        hs = HybridSearch(data, tfidf_field="short_description")
-        candidate_indices = hs.search(query, index, top_k=top_k, alpha=alpha)
-    else:
-        # Use semantic search only.
-        indices, distances = search(index, query_embedding, top_k)
-        candidate_indices = indices[0].tolist()
-    
-    # Debug: print out the retrieved indices.
-    print("DEBUG: Retrieved indices:", candidate_indices)
-    
-    summaries = []
-    # Loop through candidate indices.
-    for idx in candidate_indices:
-        article = data.iloc[idx]
-        headline = article.get("headline", "No Headline")
-        short_description = article.get("short_description", "")
-        
-        # Debug: print details about the retrieved article.
-        print(f"DEBUG: Processing article at index {idx}:")
-        print(f"         Headline: {headline}")
-        print(f"         Short Description: {short_description}")
-        
-        # Generate a summary for the article's short description.
-        summary = generate_summary_local(short_description)
-        summaries.append(summary)
+    candidate_indices = retrieve_articles(query, data, index, top_k=top_k, use_hybrid=use_hybrid, alpha=alpha,
+                                          excluded_ids=excluded_ids, hybrid_search=hybrid_search,
+                                          allowed_ids=allowed_ids, entity_index=entity_index,
+                                          rerank_embeddings=rerank_embeddings)
+    summaries = summarize_articles(data, candidate_indices, deterministic=deterministic)
     
     # Combine the summaries into one string.
-    combined_summary = " ".join(summaries)
-    print("DEBUG: Combined Summary:", combined_summary)
+    combined_summary = combine_summaries(summaries)
+    logger.debug("Combined summary: %s", combined_summary)
     
     return combined_summary
 
+def combine_summaries(summaries) -> str:
+    """
+    Join the non-empty article summaries into one string.
+    """
+    return " ".join(summary for summary in summaries if summary)
+
 if __name__ == '__main__':
     # not suitable for standalone
     pass
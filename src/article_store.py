@@ -0,0 +1,192 @@
+# src/article_store.py
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Arrow types of the known article fields. Categories repeat a few dozen
+# values, so they are dictionary-encoded; other columns keep their inferred type.
+FIELD_TYPES = {
+    "link": pa.string(),
+    "headline": pa.string(),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "short_description": pa.string(),
+    "authors": pa.string(),
+    "date": pa.timestamp("ms"),
+}
+
+def articles_to_table(data):
+    """
+    Convert a DataFrame of articles to an Arrow table with the FIELD_TYPES schema.
+    Known fields missing from the frame are added as nulls, so every part of a
+    store has the same columns.
+
+    Parameters:
+        data (pandas.DataFrame): The articles.
+
+    Returns:
+        pyarrow.Table: One row per article, in the same order.
+    """
+    columns = {}
+    for name, arrow_type in FIELD_TYPES.items():
+        if name not in data.columns:
+            columns[name] = pa.nulls(len(data), type=arrow_type)
+        elif name == "date":
+            dates = pd.to_datetime(data[name], errors="coerce")
+            columns[name] = pa.array(dates, type=arrow_type, from_pandas=True)
+        elif pa.types.is_dictionary(arrow_type):
+            values = pa.array(data[name].astype(object), type=pa.string(), from_pandas=True)
+            columns[name] = values.dictionary_encode()
+        else:
+            columns[name] = pa.array(data[name].astype(object), type=arrow_type, from_pandas=True)
+    for name in data.columns:
+        if name not in columns:
+            columns[name] = pa.array(data[name], from_pandas=True)
+    return pa.table(columns)
+
+def write_article_part(path, data):
+    """
+    Write articles to an uncompressed Arrow IPC file that ArticleStore.open() can memory-map.
+    """
+    table = articles_to_table(data.reset_index(drop=True))
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+class ArticleStore:
+    def __init__(self, tables):
+        """
+        Columnar, read-only article metadata made of one Arrow table per part
+        (build chunk or ingest batch). Row i of the store is index id i.
+
+        Strings live in Arrow's offset-indexed buffers rather than in per-row
+        Python objects, and parts opened with open() are memory-mapped, so the
+        resident size is what queries actually touch.
+
+        Parameters:
+            tables (list): Arrow tables, in index-id order.
+        """
+        self._parts = [table for table in tables if table.num_rows > 0]
+        sizes = [table.num_rows for table in self._parts]
+        # _starts[p] is the index id of the first row of part p.
+        self._starts = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+    @classmethod
+    def open(cls, paths):
+        """
+        Memory-map Arrow IPC parts written by write_article_part().
+
+        Parameters:
+            paths (list): Part files, in index-id order.
+        """
+        return cls([pa.ipc.open_file(pa.memory_map(path, "r")).read_all() for path in paths])
+
+    @classmethod
+    def from_dataframe(cls, data):
+        """
+        Build an in-memory store from a DataFrame.
+        """
+        return cls([articles_to_table(data.reset_index(drop=True))])
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    @property
+    def columns(self):
+        return self._parts[0].column_names if self._parts else list(FIELD_TYPES)
+
+    @property
+    def nbytes(self):
+        """
+        Size of the column buffers in bytes (mapped, not necessarily resident).
+        """
+        return sum(table.nbytes for table in self._parts)
+
+    def _locate(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) and (ids.min() < 0 or ids.max() >= len(self)):
+            raise IndexError(f"Article ids out of range for a store of {len(self)} rows.")
+        parts = np.searchsorted(self._starts, ids, side="right") - 1
+        return ids, parts
+
+    def get(self, idx, fields=None):
+        """
+        Return one article as a dict (O(1): a part lookup plus one row per column).
+
+        Parameters:
+            idx (int): Index id of the article.
+            fields (list): Columns to return (all if None).
+        """
+        ids, parts = self._locate([idx])
+        table = self._parts[parts[0]]
+        row = int(ids[0] - self._starts[parts[0]])
+        return {name: table.column(name)[row].as_py() for name in (fields or table.column_names)}
+
+    def gather(self, ids, fields=None):
+        """
+        Return several articles as dicts, e.g. the top-k results of a search,
+        with one Arrow take per part touched.
+
+        Parameters:
+            ids (array-like): Index ids, in the order wanted.
+            fields (list): Columns to return (all if None).
+
+        Returns:
+            list: One dict per id.
+        """
+        ids, parts = self._locate(ids)
+        rows = [None] * len(ids)
+        for part in np.unique(parts):
+            positions = np.flatnonzero(parts == part)
+            table = self._parts[part] if fields is None else self._parts[part].select(list(fields))
+            taken = table.take(pa.array(ids[positions] - self._starts[part])).to_pylist()
+            for position, row in zip(positions, taken):
+                rows[position] = row
+        return rows
+
+    def column(self, field):
+        """
+        Return a whole column as a pyarrow.ChunkedArray (one chunk per part, no copy).
+        """
+        return pa.chunked_array([table.column(field) for table in self._parts], type=FIELD_TYPES.get(field))
+
+    def texts(self, field, start=0, stop=None):
+        """
+        Return a text column as a list of strings (missing values become ""),
+        e.g. to build the keyword index.
+
+        Parameters:
+            field (str): Column name.
+            start (int): First index id.
+            stop (int): End index id (exclusive); the end of the store if None.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        texts = []
+        for part, table in enumerate(self._parts):
+            part_start, part_stop = self._starts[part], self._starts[part + 1]
+            if part_stop <= start or part_start >= stop:
+                continue
+            offset = max(start - part_start, 0)
+            length = min(stop, part_stop) - part_start - offset
+            values = table.column(field).slice(offset, length).to_pylist()
+            texts.extend(value if isinstance(value, str) else "" for value in values)
+        return texts
+
+    def to_pandas(self):
+        """
+        Materialize the whole store as a DataFrame (for offline analysis; not used at query time).
+        """
+        if not self._parts:
+            return pd.DataFrame(columns=self.columns)
+        return pa.concat_tables(self._parts).to_pandas()
+
+if __name__ == '__main__':
+    frame = pd.DataFrame({
+        "headline": ["French Spider-Man climbs a Paris tower", "Markets rally after rate cut"],
+        "short_description": ["He climbed without ropes.", None],
+        "category": ["WORLD NEWS", "BUSINESS"],
+        "date": ["2022-09-23", "2022-09-22"],
+    })
+    store = ArticleStore.from_dataframe(frame)
+    print("Rows:", len(store), "Columns:", store.columns)
+    print("Article 0:", store.get(0, fields=["headline", "category"]))
+    print("Gathered:", store.gather([1, 0], fields=["headline"]))
@@ -0,0 +1,428 @@
+# src/artifact_store.py
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from src.article_store import ArticleStore, write_article_part
+from src.embedding import MODEL_NAME
+from src.data_preprocessing import iter_data_chunks, drop_seen_duplicates, add_embeddings
+from src.search import ShardedIndex, build_index, add_vectors, IVF_INDEX_TYPES, TRAINED_INDEX_TYPES
+
+# File names inside an artifact directory.
+EMBEDDINGS_FILE = "embeddings.f32"  # raw row-major float32, shape recorded in the manifest
+INDEX_FILE = "index.faiss"
+METADATA_DIR = "metadata"  # one Arrow IPC part per build chunk/ingest batch (see src.article_store)
+KEYS_FILE = "keys.u64"  # raw uint64 dedupe key hash per row
+KEY_SET_FILE = "keys.sqlite"  # dedupe keys of the live (not retracted) rows, kept by src.ingest
+TOMBSTONES_FILE = "tombstones.i64"  # raw int64 ids of retracted rows
+KEYWORD_INDEX_FILE = "keyword_index.pkl"  # written by src.hybrid_search
+ENTITY_INDEX_FILE = "entity_index.pkl"  # written by src.entity_index
+SUMMARY_CACHE_FILE = "summaries.sqlite"  # src.summarization cache; keyed by content, so kept on rebuild
+RESPONSE_CACHE_FILE = "responses.sqlite"  # src.response_cache; entries of an older artifact_version() are dropped
+MANIFEST_FILE = "manifest.json"
+SHARDS_DIR = "shards"  # sharded index files (see src.sharding)
+SEGMENTS_DIR = "segments"  # small indexes of rows ingested since the last merge (see src.ingest)
+
+# Bump when the way artifacts are built changes, so older stores are rebuilt.
+STORE_VERSION = 2
+
+def compute_artifact_key(file_path, model_name=MODEL_NAME, chunk_size=1 << 20):
+    """
+    Compute the key that identifies the artifacts built from a dataset.
+
+    Parameters:
+        file_path (str): Path to the dataset file.
+        model_name (str): Name of the embedding model.
+        chunk_size (int): Number of bytes read per chunk while hashing.
+
+    Returns:
+        str: A SHA-256 hex digest of the dataset contents, the model name and STORE_VERSION.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    digest.update(model_name.encode("utf-8"))
+    digest.update(str(STORE_VERSION).encode("utf-8"))
+    return digest.hexdigest()
+
+def article_key_hashes(data):
+    """
+    Hash the dedupe key of every article: its link, or its headline if the
+    link is missing.
+
+    Parameters:
+        data (pandas.DataFrame): Articles with 'link' and/or 'headline' columns.
+
+    Returns:
+        numpy.ndarray: A uint64 array with one hash per row.
+    """
+    links = data["link"] if "link" in data.columns else pd.Series([None] * len(data), index=data.index)
+    headlines = data["headline"] if "headline" in data.columns else pd.Series([None] * len(data), index=data.index)
+    hashes = np.empty(len(data), dtype=np.uint64)
+    for i, (link, headline) in enumerate(zip(links, headlines)):
+        key = link if isinstance(link, str) and link.strip() else headline
+        key = str(key).strip() if key is not None else ""
+        hashes[i] = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return hashes
+
+def metadata_part_path(store_dir, start_row):
+    """
+    Path of the metadata part whose first row has the given index id.
+    """
+    return os.path.join(store_dir, METADATA_DIR, f"part-{start_row:012d}.arrow")
+
+def segment_path(store_dir, start_row):
+    """
+    Path of the segment index whose first row has the given index id.
+    """
+    return os.path.join(store_dir, SEGMENTS_DIR, f"segment-{start_row:012d}.faiss")
+
+def write_manifest(store_dir, manifest):
+    # Write to a temporary file first so a crash never leaves a half-written manifest.
+    tmp_path = os.path.join(store_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST_FILE))
+
+def read_manifest(store_dir):
+    """
+    Read the manifest of an artifact directory.
+
+    Returns:
+        dict: The manifest, or None if it does not exist or cannot be parsed.
+    """
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _reset_store(store_dir):
+    # Remove the old manifest first: from now on the directory is stale until the save completes.
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    np.empty(0, dtype=np.int64).tofile(os.path.join(store_dir, TOMBSTONES_FILE))
+    # The keyword and entity indexes cover the previous dataset's ids; they are rebuilt on next use.
+    for name in (KEYWORD_INDEX_FILE, ENTITY_INDEX_FILE, KEY_SET_FILE):
+        index_path = os.path.join(store_dir, name)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+    for name in (SHARDS_DIR, SEGMENTS_DIR):
+        if os.path.isdir(os.path.join(store_dir, name)):
+            shutil.rmtree(os.path.join(store_dir, name))
+    metadata_dir = os.path.join(store_dir, METADATA_DIR)
+    if os.path.isdir(metadata_dir):
+        shutil.rmtree(metadata_dir)
+    os.makedirs(metadata_dir)
+
+def open_article_store(store_dir):
+    """
+    Memory-map the metadata parts of an artifact directory as one ArticleStore.
+    """
+    return ArticleStore.open(sorted(glob.glob(os.path.join(store_dir, METADATA_DIR, "part-*.arrow"))))
+
+def save_artifacts(store_dir, key, data, embeddings, index, model_name=MODEL_NAME, index_type="flat"):
+    """
+    Persist the embeddings, FAISS index, article metadata and dedupe keys to
+    disk, replacing whatever the directory held before.
+
+    The manifest is written last, so an interrupted save is detected as stale
+    on the next load.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        key (str): Artifact key from compute_artifact_key().
+        data (pandas.DataFrame): The cleaned article metadata.
+        embeddings (numpy.ndarray): The float32 embedding matrix (one row per article).
+        index (faiss.Index): The FAISS index built over the embeddings.
+        model_name (str): Name of the embedding model.
+        index_type (str): The index type the index was built with (see src.search.INDEX_TYPES).
+    """
+    _reset_store(store_dir)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    embeddings.tofile(os.path.join(store_dir, EMBEDDINGS_FILE))
+    faiss.write_index(index, os.path.join(store_dir, INDEX_FILE))
+    article_key_hashes(data).tofile(os.path.join(store_dir, KEYS_FILE))
+    # Positions matter (index id i -> row i), so the pandas index is not stored.
+    write_article_part(metadata_part_path(store_dir, 0), data)
+
+    write_manifest(store_dir, {
+        "key": key,
+        "model_name": model_name,
+        "index_type": index_type,
+        "num_rows": int(embeddings.shape[0]),
+        "dimension": int(embeddings.shape[1]),
+    })
+    print(f"Artifacts saved to {store_dir}.")
+
+def build_artifacts(file_path, store_dir, key, text_column='short_description', batch_size=64,
+                    chunksize=10000, index_type="flat", num_shards=1, shard_by="hash", num_workers=None,
+                    **index_params):
+    """
+    Stream a dataset into the artifact store chunk by chunk, replacing whatever
+    the directory held before.
+
+    Each chunk is deduplicated against the rows kept so far (a set of row
+    hashes), embedded, appended to the embeddings and keys files, written as
+    its own metadata part and added to the index, so peak memory depends on
+    chunksize rather than on the dataset size. Index types that need training
+    (TRAINED_INDEX_TYPES) are built once all chunks are on disk, from the
+    memory-mapped embeddings.
+
+    With num_shards > 1 the chunks only write metadata and keys; the articles
+    are then split into shards that are embedded and indexed in parallel
+    worker processes (see src.sharding.build_shards).
+
+    Parameters:
+        file_path (str): Path to the line-delimited JSON dataset.
+        store_dir (str): Directory that holds the artifacts.
+        key (str): Artifact key from compute_artifact_key().
+        text_column (str): Column used to compute the embeddings.
+        batch_size (int): Batch size for embedding.
+        chunksize (int): Number of dataset rows read per chunk.
+        index_type (str): FAISS index type (see src.search.INDEX_TYPES).
+        num_shards (int): Number of index shards (1 = a single index).
+        shard_by (str): How articles are assigned to shards (see src.sharding.SHARD_BY).
+        num_workers (int): Shard build processes (default: one per shard, at most one per core).
+        **index_params: Extra build_index() settings (nlist, m, hnsw_m, ...).
+
+    Returns:
+        bool: True if the artifacts were built, False if the dataset could not be loaded.
+    """
+    _reset_store(store_dir)
+    embeddings_path = os.path.join(store_dir, EMBEDDINGS_FILE)
+    seen = set()
+    num_rows, dimension, index = 0, None, None
+    try:
+        with open(embeddings_path, "wb") as embeddings_file, \
+                open(os.path.join(store_dir, KEYS_FILE), "wb") as keys_file:
+            for chunk in iter_data_chunks(file_path, chunksize=chunksize):
+                chunk = drop_seen_duplicates(chunk, seen).reset_index(drop=True)
+                if len(chunk) == 0:
+                    continue
+                if num_shards > 1:
+                    # Embedding happens per shard, once every row is on disk.
+                    if text_column not in chunk.columns:
+                        print(f"Column '{text_column}' not found in data.")
+                        return False
+                    article_key_hashes(chunk).tofile(keys_file)
+                    write_article_part(metadata_part_path(store_dir, num_rows), chunk)
+                    num_rows += len(chunk)
+                    print(f"Processed {num_rows} rows.")
+                    continue
+                chunk, embeddings = add_embeddings(chunk, text_column=text_column, batch_size=batch_size)
+                if embeddings is None:
+                    return False
+                embeddings.tofile(embeddings_file)
+                article_key_hashes(chunk).tofile(keys_file)
+                write_article_part(metadata_part_path(store_dir, num_rows), chunk)
+                if index_type not in TRAINED_INDEX_TYPES:
+                    if index is None:
+                        index = build_index(embeddings, index_type=index_type, **index_params)
+                    else:
+                        add_vectors(index, embeddings)
+                num_rows += len(chunk)
+                dimension = embeddings.shape[1]
+                print(f"Processed {num_rows} rows.")
+    except Exception as e:
+        print("Error loading data:", e)
+        return False
+    if num_rows == 0:
+        print("No rows to index in", file_path)
+        return False
+
+    manifest = {
+        "key": key,
+        "model_name": MODEL_NAME,
+        "index_type": index_type,
+        "num_rows": num_rows,
+    }
+    if num_shards > 1:
+        from src.sharding import build_shards
+        category_shards = {}
+        try:
+            dimension = build_shards(store_dir, num_rows, num_shards, by=shard_by, text_column=text_column,
+                                     batch_size=batch_size, num_workers=num_workers, index_type=index_type,
+                                     category_shards=category_shards, **index_params)
+        except Exception as e:
+            print("Error building shards:", e)
+            return False
+        manifest["shards"] = {"num_shards": num_shards, "by": shard_by, "index_params": index_params,
+                              "categories": category_shards}
+    else:
+        if index is None:
+            embeddings = np.memmap(embeddings_path, dtype=np.float32, mode="r", shape=(num_rows, dimension))
+            index = build_index(embeddings, index_type=index_type, **index_params)
+            del embeddings
+        faiss.write_index(index, os.path.join(store_dir, INDEX_FILE))
+    manifest["dimension"] = int(dimension)
+    write_manifest(store_dir, manifest)
+    print(f"Artifacts saved to {store_dir}.")
+    return True
+
+def index_io_flags(index_type, mmap=True):
+    """
+    faiss.read_index flags for an index of the given type: memory-mapped and
+    read-only with mmap, 0 (read into memory) otherwise.
+
+    IO_FLAG_MMAP_IFC (newer FAISS) also maps the codes of flat, scalar-quantizer
+    and HNSW indexes instead of copying them; it cannot read IVF inverted lists,
+    so IVF indexes only get IO_FLAG_MMAP.
+    """
+    if not mmap:
+        return 0
+    io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    if index_type not in IVF_INDEX_TYPES:
+        io_flags |= getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    return io_flags
+
+def load_artifacts(store_dir, key=None, mmap=True, index_type=None, num_shards=None, shard_by=None):
+    """
+    Load the artifacts from disk.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        key (str): Expected artifact key. If given and it does not match the
+                   manifest, the artifacts are treated as stale.
+        mmap (bool): If True, memory-map the embeddings and the FAISS index
+                     (read-only) instead of reading them into memory. Use
+                     mmap=False for an index that will be modified.
+        index_type (str): Expected index type. If given and it differs from the
+                          stored one, the artifacts are treated as stale.
+        num_shards (int): Expected number of index shards (1 = unsharded); stale if it differs.
+        shard_by (str): Expected shard assignment of a sharded store; stale if it differs.
+
+    Returns:
+        tuple: (data, embeddings, index), or None if the artifacts are missing or stale.
+               data is a memory-mapped ArticleStore (see src.article_store).
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return None
+    if key is not None and manifest.get("key") != key:
+        print("Stored artifacts are stale (dataset or model changed).")
+        return None
+    if index_type is not None and manifest.get("index_type", "flat") != index_type:
+        print(f"Stored index is '{manifest.get('index_type', 'flat')}', '{index_type}' requested; rebuilding.")
+        return None
+    sharding = manifest.get("shards") or {"num_shards": 1}
+    if num_shards is not None and (sharding["num_shards"] != num_shards
+                                   or (num_shards > 1 and shard_by is not None and sharding["by"] != shard_by)):
+        print(f"Stored index has {sharding['num_shards']} shard(s) (by {sharding.get('by', 'hash')}), "
+              f"{num_shards} requested (by {shard_by or 'hash'}); rebuilding.")
+        return None
+
+    try:
+        num_rows, dimension = manifest["num_rows"], manifest["dimension"]
+        embeddings = np.memmap(os.path.join(store_dir, EMBEDDINGS_FILE), dtype=np.float32,
+                               mode="r", shape=(num_rows, dimension))
+        if not mmap:
+            embeddings = np.array(embeddings)
+        io_flags = index_io_flags(manifest.get("index_type", "flat"), mmap)
+        if sharding["num_shards"] > 1:
+            from src.sharding import read_shards
+            shards, shard_ids = read_shards(store_dir, sharding["num_shards"], io_flags)
+        else:
+            shards = [faiss.read_index(os.path.join(store_dir, INDEX_FILE), io_flags)]
+            shard_ids = [np.arange(shards[0].ntotal, dtype=np.int64)]
+        # Rows ingested since the last merge are searched in their own (flat) segment indexes.
+        for segment in manifest.get("segments", []):
+            shards.append(faiss.read_index(segment_path(store_dir, segment["start"]), index_io_flags("flat", mmap)))
+            shard_ids.append(np.arange(segment["start"], segment["start"] + segment["rows"], dtype=np.int64))
+        index = ShardedIndex(shards, shard_ids) if len(shards) > 1 or sharding["num_shards"] > 1 else shards[0]
+        data = open_article_store(store_dir)
+    except Exception as e:
+        print("Error loading artifacts:", e)
+        return None
+
+    if not (len(data) == index.ntotal == num_rows):
+        print("Stored artifacts are inconsistent; they will be rebuilt.")
+        return None
+
+    print(f"Artifacts loaded from {store_dir}. Rows: {len(data)}")
+    return data, embeddings, index
+
+def load_tombstones(store_dir):
+    """
+    Load the ids of retracted articles.
+
+    Returns:
+        numpy.ndarray: A sorted int64 array of tombstoned index ids (may be empty).
+    """
+    path = os.path.join(store_dir, TOMBSTONES_FILE)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.fromfile(path, dtype=np.int64))
+
+def artifact_version(store_dir):
+    """
+    Fingerprint of what searches over the store can return: the manifest (dataset
+    key, index type, row count, shards) and the number of tombstoned rows. It
+    changes on every rebuild, ingest and retraction.
+
+    Returns:
+        str: A SHA-256 hex digest (of an empty manifest if the store does not exist).
+    """
+    digest = hashlib.sha256(json.dumps(read_manifest(store_dir) or {}, sort_keys=True).encode("utf-8"))
+    tombstones_path = os.path.join(store_dir, TOMBSTONES_FILE)
+    digest.update(str(os.path.getsize(tombstones_path) if os.path.exists(tombstones_path) else 0).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_or_build(file_path, store_dir, text_column='short_description', batch_size=64, mmap=True,
+                  index_type="flat", chunksize=10000, num_shards=1, shard_by="hash", num_workers=None,
+                  **index_params):
+    """
+    Load the artifacts for a dataset, building and saving them first if they
+    are missing or stale.
+
+    Parameters:
+        file_path (str): Path to the line-delimited JSON dataset.
+        store_dir (str): Directory that holds the artifacts.
+        text_column (str): Column used to compute the embeddings.
+        batch_size (int): Batch size for embedding on a rebuild.
+        mmap (bool): Memory-map the loaded artifacts.
+        index_type (str): FAISS index type (see src.search.INDEX_TYPES).
+        chunksize (int): Number of dataset rows streamed per chunk on a rebuild (see build_artifacts).
+        num_shards (int): Number of index shards, searched in parallel (1 = a single index).
+        shard_by (str): How articles are assigned to shards (see src.sharding.SHARD_BY).
+        num_workers (int): Shard build processes on a rebuild.
+        **index_params: Extra build_index() settings (nlist, m, hnsw_m, ...) used on a rebuild.
+
+    Returns:
+        tuple: (data, embeddings, index), or None if the dataset could not be loaded.
+    """
+    try:
+        key = compute_artifact_key(file_path)
+    except OSError as e:
+        print("Error loading data:", e)
+        return None
+    artifacts = load_artifacts(store_dir, key=key, mmap=mmap, index_type=index_type, num_shards=num_shards,
+                               shard_by=shard_by)
+    if artifacts is not None:
+        return artifacts
+
+    print("Building artifacts from", file_path)
+    if not build_artifacts(file_path, store_dir, key, text_column=text_column, batch_size=batch_size,
+                           chunksize=chunksize, index_type=index_type, num_shards=num_shards, shard_by=shard_by,
+                           num_workers=num_workers, **index_params):
+        return None
+    # Reload so the returned objects are the memory-mapped ones.
+    return load_artifacts(store_dir, key=key, mmap=mmap, index_type=index_type, num_shards=num_shards,
+                          shard_by=shard_by)
+
+if __name__ == '__main__':
+    artifacts = load_or_build("data/sample.json", "data/artifacts")
+    if artifacts is not None:
+        data, embeddings, index = artifacts
+        print("Embeddings:", embeddings.shape, "Index size:", index.ntotal)
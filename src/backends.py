@@ -0,0 +1,174 @@
+# src/backends.py
+
+import logging
+import os
+
+from src.models import is_loaded
+
+logger = logging.getLogger(__name__)
+
+# Inference backends, selectable per model:
+#   torch: PyTorch fp32 (the default).
+#   int8:  PyTorch with dynamic int8 quantization of the linear layers (int8 weights,
+#          activations quantized on the fly); about 4x less weight memory for BART/GPT-2.
+#   onnx:  ONNX Runtime on CPU, through optimum (pip install "optimum[onnxruntime]").
+BACKENDS = ("torch", "int8", "onnx")
+DEFAULT_BACKEND = "torch"
+# Exported ONNX models are kept here, so the (slow) export runs once per model.
+ONNX_DIR = os.path.join("data", "onnx")
+# optimum class used to export and run each pipeline task.
+ONNX_MODEL_CLASSES = {
+    "summarization": "ORTModelForSeq2SeqLM",
+    "text-generation": "ORTModelForCausalLM",
+}
+
+# registry name -> backend chosen with set_backend()
+_backends = {}
+_num_threads = None
+
+def get_backend(name):
+    """
+    Return the backend of a model: the one chosen with set_backend(), else the
+    <NAME>_BACKEND environment variable (e.g. SUMMARIZER_BACKEND=int8), else torch.
+
+    Parameters:
+        name (str): Registry name of the model (see src.models).
+    """
+    backend = _backends.get(name) or os.environ.get(f"{name.upper()}_BACKEND", DEFAULT_BACKEND)
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' for model '{name}'. Expected one of {BACKENDS}.")
+    return backend
+
+def set_backend(name, backend):
+    """
+    Choose the backend of a model. It must be chosen before the model is loaded.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Expected one of {BACKENDS}.")
+    if is_loaded(name) and get_backend(name) != backend:
+        raise RuntimeError(f"Model '{name}' is already loaded with the '{get_backend(name)}' backend.")
+    _backends[name] = backend
+
+def get_num_threads():
+    """
+    Return the intra-op thread count for inference (set_num_threads() or the
+    INFERENCE_THREADS environment variable), or None for the library default.
+    """
+    if _num_threads is not None:
+        return _num_threads
+    value = os.environ.get("INFERENCE_THREADS")
+    return int(value) if value else None
+
+def set_num_threads(num_threads):
+    """
+    Set the intra-op thread count used by PyTorch and by ONNX Runtime sessions
+    created afterwards. On a shared CPU node, keep (model workers x threads)
+    at or below the number of cores.
+    """
+    global _num_threads
+    _num_threads = num_threads
+    configure_torch_threads()
+
+def configure_torch_threads():
+    """
+    Apply the configured thread count to PyTorch (called by the model loaders).
+    """
+    num_threads = get_num_threads()
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+def onnx_session_options():
+    """
+    Return ONNX Runtime session options with full graph optimization and the configured thread count.
+    """
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    num_threads = get_num_threads()
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    return options
+
+def _conv1d_to_linear(model):
+    # GPT-2 uses transformers' Conv1D (a transposed Linear), which dynamic quantization skips.
+    import torch
+    from transformers.pytorch_utils import Conv1D
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight = torch.nn.Parameter(child.weight.data.t().contiguous(), requires_grad=False)
+                linear.bias = torch.nn.Parameter(child.bias.data, requires_grad=False)
+                setattr(parent, child_name, linear)
+
+def quantize_dynamic(model):
+    """
+    Quantize the linear layers of a PyTorch model to int8 in place (dynamic quantization).
+
+    Returns:
+        The quantized model.
+    """
+    import torch
+    _conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def onnx_export_dir(model_id):
+    """
+    Directory under ONNX_DIR where the ONNX export of a model is kept.
+    """
+    return os.path.join(ONNX_DIR, model_id.strip("/").replace("/", "--"))
+
+def load_onnx_model(model_class, model_id):
+    """
+    Load an optimum ONNX Runtime model on the CPU, exporting it from the PyTorch
+    weights on first use and keeping the export under ONNX_DIR.
+
+    Parameters:
+        model_class (str): optimum.onnxruntime class name (e.g. "ORTModelForSeq2SeqLM").
+        model_id (str): Hugging Face model name or local path.
+    """
+    from optimum import onnxruntime as ort
+    model_cls = getattr(ort, model_class)
+    export_dir = onnx_export_dir(model_id)
+    kwargs = {"provider": "CPUExecutionProvider", "session_options": onnx_session_options()}
+    if os.path.isdir(export_dir):
+        return model_cls.from_pretrained(export_dir, **kwargs)
+    logger.info("Exporting '%s' to ONNX (once; saved to %s)...", model_id, export_dir)
+    model = model_cls.from_pretrained(model_id, export=True, **kwargs)
+    model.save_pretrained(export_dir)
+    return model
+
+def load_pipeline(task, model_id, backend):
+    """
+    Load a transformers pipeline on the given backend.
+
+    Parameters:
+        task (str): "summarization" or "text-generation".
+        model_id (str): Hugging Face model name or local path.
+        backend (str): One of BACKENDS.
+    """
+    from transformers import pipeline
+    configure_torch_threads()
+    if backend == "onnx":
+        from transformers import AutoTokenizer
+        model = load_onnx_model(ONNX_MODEL_CLASSES[task], model_id)
+        return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(model_id))
+    generator = pipeline(task, model=model_id)
+    if backend == "int8":
+        quantize_dynamic(generator.model)
+    return generator
+
+def resident_memory_mb():
+    """
+    Return the resident set size of this process in MB (None where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
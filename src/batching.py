@@ -0,0 +1,194 @@
+# src/batching.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# name -> batch function, registered by the modules that own each model.
+_batch_functions = {}
+# name -> running MicroBatcher (only while micro-batching is enabled).
+_batchers = {}
+_registry_lock = threading.Lock()
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10.0, name="batcher"):
+        """
+        Request-coalescing scheduler: items submitted from many threads are
+        collected for up to max_wait_ms (or until max_batch_size items arrive),
+        run through batch_fn as one batch, and the results are fanned back out.
+
+        Parameters:
+            batch_fn (callable): Takes a list of items and returns a list of results
+                                 in the same order.
+            max_batch_size (int): Maximum items per batch.
+            max_wait_ms (float): Maximum time the first item of a batch waits for others.
+            name (str): Name used in stats and the worker thread name.
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        # Guards _closed, so no item is queued behind the shutdown sentinel.
+        self._close_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._compute_total = 0.0
+        self._thread = threading.Thread(target=self._worker, name=f"microbatch-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Queue an item and return a Future for its result.
+
+        Raises:
+            RuntimeError: If the batcher has been closed.
+        """
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError(f"Micro-batcher '{self.name}' is closed.")
+            self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item):
+        """
+        Submit an item and block until its result is ready.
+        """
+        return self.submit(item).result()
+
+    def _collect(self, first):
+        batch = [first]
+        # The deadline counts from when the first item was submitted.
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Shutdown requested: finish this batch, then stop.
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+
+            start = time.perf_counter()
+            waits = [start - submitted for _, _, submitted in batch]
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch function of '{self.name}' returned {len(results)} results "
+                                       f"for {len(batch)} items.")
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            compute = time.perf_counter() - start
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._queue_wait_total += sum(waits)
+                self._queue_wait_max = max(self._queue_wait_max, max(waits))
+                self._compute_total += compute
+
+    def close(self):
+        """
+        Stop the worker thread after the queued items are processed. Later
+        submit() calls raise RuntimeError.
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """
+        Return batch counts, average batch size, and queue-wait vs. compute time.
+        """
+        with self._stats_lock:
+            batches, items = self._batches, self._items
+            return {
+                "batches": batches,
+                "items": items,
+                "avg_batch_size": items / batches if batches else 0.0,
+                "avg_queue_wait_ms": 1000 * self._queue_wait_total / items if items else 0.0,
+                "max_queue_wait_ms": 1000 * self._queue_wait_max,
+                "avg_compute_ms_per_batch": 1000 * self._compute_total / batches if batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
+
+def register_batch_function(name, batch_fn):
+    """
+    Register the batched implementation of a model call. Nothing runs through
+    it until enable_micro_batching() is called.
+
+    Parameters:
+        name (str): Name of the model call (e.g. "summarizer").
+        batch_fn (callable): Takes a list of items and returns a list of results.
+    """
+    with _registry_lock:
+        _batch_functions[name] = batch_fn
+
+def get_batcher(name):
+    """
+    Return the running MicroBatcher for a model call, or None if micro-batching
+    is disabled (callers then run the call directly).
+    """
+    return _batchers.get(name)
+
+def enable_micro_batching(max_batch_size=8, max_wait_ms=10.0, names=None):
+    """
+    Start micro-batching for the registered model calls.
+
+    Requests only coalesce if they arrive concurrently, so callers must run on
+    several threads (e.g. the server's model executor with several workers).
+
+    Parameters:
+        max_batch_size (int): Maximum items per batch.
+        max_wait_ms (float): Maximum time the first item of a batch waits for others.
+        names (list): Model calls to batch; all registered ones if None.
+    """
+    with _registry_lock:
+        for name in (names if names is not None else list(_batch_functions)):
+            if name in _batchers:
+                _batchers.pop(name).close()
+            _batchers[name] = MicroBatcher(_batch_functions[name], max_batch_size=max_batch_size,
+                                           max_wait_ms=max_wait_ms, name=name)
+
+def disable_micro_batching():
+    """
+    Stop all batchers; model calls run directly again.
+    """
+    with _registry_lock:
+        for name in list(_batchers):
+            _batchers.pop(name).close()
+
+def batching_stats():
+    """
+    Return the stats of every running batcher.
+
+    Returns:
+        dict: name -> MicroBatcher.stats()
+    """
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
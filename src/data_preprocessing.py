@@ -2,7 +2,7 @@
 
 import pandas as pd
 import numpy as np
-from src.embedding import get_embedding  # Import the function from embedding.py
+from src.embedding import get_embedding, get_embeddings  # Import the functions from embedding.py
 from src.search import build_index, search # Importing the function from the search.py
 
 
@@ -19,6 +19,47 @@ def load_data(file_path):
         data = None
     return data
 
+def iter_data_chunks(file_path, chunksize=10000):
+    """
+    Stream a line-delimited JSON file as DataFrames of at most chunksize rows,
+    so only one chunk is held in memory at a time.
+    """
+    with pd.read_json(file_path, lines=True, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+def row_hashes(data, key_columns=None):
+    """
+    64-bit hash of every row over the key columns (all columns, in name order, if None).
+
+    Returns:
+        numpy.ndarray: A uint64 array with one hash per row.
+    """
+    columns = list(key_columns) if key_columns is not None else sorted(data.columns)
+    return pd.util.hash_pandas_object(data[columns], index=False).to_numpy()
+
+def drop_seen_duplicates(chunk, seen, key_columns=None):
+    """
+    Streaming counterpart of clean_data: drop rows that repeat a row of this
+    chunk or of an earlier one, keeping only a set of row hashes between chunks.
+
+    Parameters:
+        chunk (pandas.DataFrame): The next chunk of rows.
+        seen (set): Hashes of the rows kept so far; updated in place.
+        key_columns (list): Columns that identify a row (all columns if None).
+
+    Returns:
+        pandas.DataFrame: The rows of the chunk that were not seen before.
+    """
+    keep = np.zeros(len(chunk), dtype=bool)
+    for i, row_hash in enumerate(row_hashes(chunk, key_columns).tolist()):
+        if row_hash not in seen:
+            seen.add(row_hash)
+            keep[i] = True
+    if not keep.all():
+        print(f"Removed {int((~keep).sum())} duplicate rows.")
+    return chunk[keep]
+
 def clean_data(data):
     """
     Clean the data. This includes removing duplicates.
@@ -29,18 +70,45 @@ def clean_data(data):
     print(f"Removed {initial_rows - final_rows} duplicate rows.")
     return data
 
-def add_embeddings(data, text_column='short_description'):
+def embedding_texts(data, text_column='short_description', fallback_column='headline'):
     """
-    Add a new column 'embedding' to the DataFrame by applying get_embedding()
-    on the specified text column.
+    Return the texts add_embeddings() encodes: text_column, with rows whose
+    text is missing or empty taken from fallback_column.
+
+    Returns:
+        pandas.Series: One text per row, or None if text_column is missing.
     """
     if text_column not in data.columns:
         print(f"Column '{text_column}' not found in data.")
-        return data
+        return None
 
-    # Create the 'embedding' column by applying get_embedding() on each row's text
-    data['embedding'] = data[text_column].apply(lambda text: get_embedding(text))
-    return data
+    texts = data[text_column]
+    if fallback_column is not None and fallback_column in data.columns:
+        empty = ~texts.map(lambda text: isinstance(text, str) and bool(text.strip()))
+        if empty.any():
+            print(f"Using '{fallback_column}' for {int(empty.sum())} rows without '{text_column}'.")
+            texts = texts.where(~empty, data[fallback_column])
+    return texts
+
+def add_embeddings(data, text_column='short_description', batch_size=64, fallback_column='headline'):
+    """
+    Compute embeddings for the specified text column in batches.
+
+    Rows whose text is missing or empty are embedded from fallback_column
+    instead (a zero vector would sit at a fixed distance from every query and
+    outrank real matches). Rows with neither text get a zero vector, so every
+    row keeps its position in the returned matrix (row i belongs to row i of data).
+
+    Returns:
+        data (pandas.DataFrame): The input DataFrame.
+        embeddings (numpy.ndarray): A contiguous float32 matrix of shape (n_rows, dimension),
+                                    or None if the column is missing.
+    """
+    texts = embedding_texts(data, text_column=text_column, fallback_column=fallback_column)
+    if texts is None:
+        return data, None
+    embeddings = get_embeddings(texts, batch_size=batch_size)
+    return data, embeddings
 
 if __name__ == '__main__':
     # Path to the full dataset file
@@ -48,11 +116,7 @@ if __name__ == '__main__':
     data = load_data(file_path)
     if data is not None:
         data = clean_data(data)
-        data = add_embeddings(data, text_column='short_description')
-        
-        # Convert the list of embeddings to a NumPy array
-        embeddings_list = data['embedding'].tolist()
-        embeddings_np = np.vstack(embeddings_list)
+        data, embeddings_np = add_embeddings(data, text_column='short_description')
         print("Embeddings array shape:", embeddings_np.shape)
         
         # Build the FAISS index with the embeddings
@@ -1,8 +1,48 @@
 
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+from collections import OrderedDict
 
-# Initialize the SentenceTransformer model only once for efficiency.
-model = SentenceTransformer('all-MiniLM-L6-v2')
+import numpy as np
+
+from src.models import register_model, get_model
+from src.backends import get_backend, configure_torch_threads, onnx_export_dir, onnx_session_options, quantize_dynamic
+from src.batching import register_batch_function, get_batcher
+from src.tracing import increment
+
+# Name of the embedding model; also used to key on-disk artifacts.
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+def _load_embedding_model(backend=None):
+    from sentence_transformers import SentenceTransformer
+    backend = backend or get_backend("embedding")
+    configure_torch_threads()
+    if backend == "onnx":
+        # sentence-transformers exports the model with optimum and runs it on ONNX Runtime;
+        # the export is saved so later loads skip it.
+        export_dir = onnx_export_dir(MODEL_NAME)
+        model = SentenceTransformer(export_dir if os.path.isdir(export_dir) else MODEL_NAME, backend="onnx",
+                                    model_kwargs={"provider": "CPUExecutionProvider",
+                                                  "session_options": onnx_session_options()})
+        if not os.path.isdir(export_dir):
+            model.save(export_dir)
+        return model
+    model = SentenceTransformer(MODEL_NAME)
+    if backend == "int8":
+        quantize_dynamic(model)
+    return model
+
+# The SentenceTransformer model is loaded only once, on first use (see src.models);
+# EMBEDDING_BACKEND selects torch, int8 or onnx (see src.backends). Stored article embeddings
+# are keyed by MODEL_NAME only: the backends agree to within the parity check of
+# scripts/validate_backends.py, so query embeddings from any backend search the same index.
+register_model("embedding", _load_embedding_model)
+
+def __getattr__(name):
+    # Keeps `from src.embedding import model` working without loading at import time.
+    if name == "model":
+        return get_model("embedding")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_embedding(text):
     """
@@ -16,14 +56,153 @@ def get_embedding(text):
     """
     # Check if the text is valid
     if text and isinstance(text, str):
-        return model.encode(text)
+        return get_model("embedding").encode(text)
     return None
 
+def get_embeddings(texts, batch_size=64, show_progress=False):
+    """
+    Converts a sequence of texts into a contiguous float32 embedding matrix
+    using batched model.encode calls.
+
+    Texts are sorted by length before batching so each batch pads to a similar
+    length, and the results are scattered back into the original order.
+    Null, non-string or empty texts are not sent to the model; their rows are
+    left as zero vectors.
+
+    Parameters:
+        texts (iterable): The texts to be encoded (e.g. a pandas Series).
+        batch_size (int): Number of texts per model.encode call.
+        show_progress (bool): If True, print progress after every batch.
+
+    Returns:
+        numpy.ndarray: A C-contiguous float32 array of shape (len(texts), dimension).
+    """
+    texts = list(texts)
+    model = get_model("embedding")
+    dimension = model.get_sentence_embedding_dimension()
+    embeddings = np.zeros((len(texts), dimension), dtype=np.float32)
+
+    # Only encode valid texts; everything else keeps its zero row.
+    valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+    skipped = len(texts) - len(valid)
+    if skipped:
+        print(f"Skipping {skipped} empty or missing texts (zero vectors used).")
+
+    # Length-sorted bucketing keeps padding waste low inside each batch.
+    valid.sort(key=lambda i: len(texts[i]))
+    for start in range(0, len(valid), batch_size):
+        batch_ids = valid[start:start + batch_size]
+        batch_vectors = model.encode(
+            [texts[i] for i in batch_ids],
+            batch_size=batch_size,
+            convert_to_numpy=True
+        )
+        embeddings[batch_ids] = batch_vectors
+        if show_progress:
+            print(f"Encoded {min(start + batch_size, len(valid))}/{len(valid)} texts.")
+
+    return embeddings
+
+def _encode_batch(texts):
+    # Batched query encoding; used by the "embedding" micro-batcher (see src.batching).
+    vectors = np.asarray(get_model("embedding").encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+    return list(vectors)
+
+register_batch_function("embedding", _encode_batch)
+
+def normalize_query(text):
+    """
+    Normalize a query for cache lookups: collapse whitespace and lowercase
+    (the MiniLM tokenizer is uncased, so this does not change the embedding).
+    """
+    return " ".join(text.split()).lower()
+
+class QueryEncoder:
+    def __init__(self, max_size=4096):
+        """
+        Memoizing query encoder: a bounded LRU of query embeddings keyed on the
+        normalized query text.
+        
+        Parameters:
+            max_size (int): Maximum number of cached query embeddings.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def encode(self, text):
+        """
+        Return the embedding of the query, encoding it only on a cache miss.
+        The returned array is read-only because it is shared between callers.
+        """
+        if not (text and isinstance(text, str)):
+            return None
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                increment("query_embedding_cache_lookups", result="hit")
+                return embedding
+            self.misses += 1
+        increment("query_embedding_cache_lookups", result="miss")
+        
+        # With micro-batching enabled, misses from concurrent requests share one encode call.
+        batcher = get_batcher("embedding")
+        if batcher is not None:
+            embedding = batcher(key)
+        else:
+            embedding = np.asarray(get_model("embedding").encode(key), dtype=np.float32)
+        embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = embedding
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return embedding
+    
+    def clear(self):
+        """
+        Drop all cached embeddings and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return hit/miss counters and the hit rate.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries)}
+
+# Shared query encoder used by the retrieval path.
+query_encoder = QueryEncoder()
+
+def get_query_embedding(text):
+    """
+    Embed a search query through the shared memoizing query encoder.
+    
+    Parameters:
+        text (str): The query text.
+    
+    Returns:
+        numpy.ndarray: The (read-only) query embedding, or None for an empty query.
+    """
+    return query_encoder.encode(text)
+
 if __name__ == '__main__':
     
     sample_text = "Breaking news: Major breakthrough in AI technology."
     embedding_vector = get_embedding(sample_text)
-    
+
     print("Embedding vector obtained:")
     print(embedding_vector)
- 
+    
+    embedding_matrix = get_embeddings([sample_text, "", None, "Markets rally after rate cut."], batch_size=2)
+    print("Batched embedding matrix shape:", embedding_matrix.shape, embedding_matrix.dtype)
+
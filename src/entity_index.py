@@ -0,0 +1,201 @@
+# src/entity_index.py
+
+import logging
+import os
+import pickle
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Entity types worth indexing for retrieval; dates, numbers and quantities match too many articles.
+INDEXED_LABELS = ("PERSON", "ORG", "GPE", "LOC", "NORP", "FAC", "EVENT", "PRODUCT", "WORK_OF_ART", "LAW")
+# Fields tagged per article; their entities are merged.
+ENTITY_FIELDS = ("headline", "short_description")
+# Score multiplier added to candidates that mention an entity of the query (see boost_scores).
+ENTITY_BOOST = 0.25
+WORD_PATTERN = re.compile(r"[\w.&'-]+")
+
+def normalize_entity(text):
+    """
+    Lookup key of an entity mention: lowercase words without surrounding
+    punctuation or a possessive "'s" ("Joe Biden's" -> "joe biden").
+    """
+    words = [word.strip(".,'-") for word in WORD_PATTERN.findall(text.lower().replace("’", "'"))]
+    words = [word[:-2] if word.endswith("'s") else word for word in words]
+    return " ".join(word for word in words if word)
+
+def boost_scores(candidates, scores, boost_ids, boost=ENTITY_BOOST):
+    """
+    Multiply the scores of candidates inside boost_ids by (1 + boost). Works for
+    any non-negative, higher-is-better score (weighted fusion, RRF, similarities).
+
+    Parameters:
+        candidates (numpy.ndarray): Index ids.
+        scores (numpy.ndarray): Their scores.
+        boost_ids (numpy.ndarray): Boolean mask over the index ids (e.g. from EntityIndex.select).
+        boost (float): Relative boost.
+    """
+    # Articles ingested after the mask was made are not boosted.
+    boosted = np.zeros(len(candidates), dtype=bool)
+    inside = candidates < len(boost_ids)
+    boosted[inside] = boost_ids[candidates[inside]]
+    return np.where(boosted, scores * (1 + boost), scores)
+
+class EntityIndex:
+    def __init__(self, entities_per_document=()):
+        """
+        Inverted index from named entities to the articles that mention them,
+        built once from the output of src.ner.extract_entities_batch, so
+        entity lookups at query time are dictionary lookups instead of spaCy calls.
+
+        Parameters:
+            entities_per_document (iterable): (entity_text, entity_label) lists; document i gets id i.
+        """
+        self.num_documents = 0
+        # entity key -> sorted int64 array of document ids
+        self.postings = {}
+        # entity key -> most frequent label
+        self.labels = {}
+        self.max_words = 0
+        self.add_documents(entities_per_document)
+
+    def add_documents(self, entities_per_document):
+        """
+        Append documents (ids continue from num_documents).
+        """
+        new_postings, label_counts = {}, {}
+        for entities in entities_per_document:
+            keys = set()
+            for text, label in entities:
+                if label not in INDEXED_LABELS:
+                    continue
+                key = normalize_entity(text)
+                if key:
+                    keys.add(key)
+                    counts = label_counts.setdefault(key, {})
+                    counts[label] = counts.get(label, 0) + 1
+            for key in keys:
+                new_postings.setdefault(key, []).append(self.num_documents)
+            self.num_documents += 1
+
+        for key, ids in new_postings.items():
+            ids = np.asarray(ids, dtype=np.int64)
+            old = self.postings.get(key)
+            self.postings[key] = ids if old is None else np.concatenate([old, ids])
+            self.max_words = max(self.max_words, key.count(" ") + 1)
+        for key, counts in label_counts.items():
+            self.labels.setdefault(key, max(counts, key=counts.get))
+
+    def lookup(self, entity):
+        """
+        Return the sorted ids of the articles that mention the entity.
+        """
+        return self.postings.get(normalize_entity(entity), np.zeros(0, dtype=np.int64))
+
+    def match_query(self, query):
+        """
+        Find the indexed entities mentioned in a query by looking up its word
+        n-grams (longest match first, left to right). No NER model is involved.
+
+        Returns:
+            list: Entity keys, in query order.
+        """
+        words = normalize_entity(query).split()
+        matches = []
+        start = 0
+        while start < len(words):
+            for length in range(min(self.max_words, len(words) - start), 0, -1):
+                key = " ".join(words[start:start + length])
+                if key in self.postings:
+                    matches.append(key)
+                    start += length
+                    break
+            else:
+                start += 1
+        return matches
+
+    def select(self, entities):
+        """
+        Boolean mask of the articles that mention any of the entities, in the
+        form src.search and HybridSearch accept as allowed_ids (entity-restricted
+        retrieval) or boost_ids.
+
+        Returns:
+            numpy.ndarray: The mask, or None if no entity is given.
+        """
+        if not entities:
+            return None
+        mask = np.zeros(self.num_documents, dtype=bool)
+        for entity in entities:
+            mask[self.lookup(entity)] = True
+        return mask
+
+    def save(self, path):
+        """
+        Save the index to disk.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save().
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+def _article_texts(data, start=0):
+    fields = [data.texts(field, start=start) for field in ENTITY_FIELDS if field in data.columns]
+    return [". ".join(text for text in texts if text) for texts in zip(*fields)]
+
+def build_entity_index(data, batch_size=256, n_process=1, start=0, entity_index=None):
+    """
+    Run NER over the articles (headline and short description) and index the entities.
+
+    Parameters:
+        data (ArticleStore): The article metadata (see src.article_store).
+        batch_size (int): Texts per nlp.pipe batch.
+        n_process (int): spaCy worker processes (-1 = one per CPU).
+        start (int): First article to tag (to extend entity_index).
+        entity_index (EntityIndex): Index to extend; a new one if None.
+
+    Returns:
+        EntityIndex: The index.
+    """
+    # Imported here so loading a saved index does not require spaCy.
+    from src.ner import extract_entities_batch
+    entity_index = entity_index if entity_index is not None else EntityIndex()
+    entity_index.add_documents(extract_entities_batch(_article_texts(data, start), batch_size=batch_size,
+                                                      n_process=n_process))
+    return entity_index
+
+def load_entity_index(data, path, batch_size=256, n_process=1):
+    """
+    Load the entity index saved by scripts/build_entity_index.py. Articles
+    ingested since it was built are tagged and added (and the index saved).
+
+    Returns:
+        EntityIndex: The index, or None if it was never built (or no longer matches the data).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        entity_index = EntityIndex.load(path)
+    except Exception as e:
+        logger.warning("Error loading entity index: %s", e)
+        return None
+    if entity_index.num_documents > len(data):
+        logger.warning("Entity index covers %d articles but the store has %d; rebuild it.",
+                       entity_index.num_documents, len(data))
+        return None
+    if entity_index.num_documents < len(data):
+        logger.info("Adding %d new documents to the entity index.", len(data) - entity_index.num_documents)
+        build_entity_index(data, batch_size=batch_size, n_process=n_process, start=entity_index.num_documents,
+                           entity_index=entity_index)
+        entity_index.save(path)
+    return entity_index
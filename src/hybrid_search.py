@@ -1,66 +1,257 @@
 # src/hybrid_search.py
 
+import logging
+import os
+import pickle
+
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from src.search import search  # FAISS-based semantic search import
+from src.keyword_index import BM25Index
+from src.search import search, batch_search, distances_to_similarities  # FAISS-based semantic search import
+from src.entity_index import boost_scores, ENTITY_BOOST
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Fusion methods accepted by HybridSearch.search().
+FUSION_METHODS = ("weighted", "rrf")
+
+def _field_texts(data, field, start=0):
+    # Missing descriptions become empty documents so row i stays index id i.
+    return data.texts(field, start=start)
 
 class HybridSearch:
     def __init__(self, data, tfidf_field="short_description"):
         """
         Initialize the hybrid search object.
         
+        Keyword retrieval uses a BM25 inverted index (src.keyword_index). Building
+        it is a full pass over the corpus, so build this object once (or load it
+        with load_or_build_hybrid_search()) and share it across queries.
+        
         Parameters:
-            data (pandas.DataFrame): The dataset containing the articles.
+            data (ArticleStore): The article metadata (see src.article_store).
             tfidf_field (str): The field to use for keyword-based retrieval.
         """
         self.data = data
         self.tfidf_field = tfidf_field
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        # Fit TF-IDF on the document texts.
-        self.doc_texts = data[tfidf_field].tolist()
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.doc_texts)
+        # Index the document texts.
+        self.keyword_index = BM25Index(_field_texts(data, tfidf_field))
+    
+    @property
+    def num_documents(self) -> int:
+        return self.keyword_index.num_documents
+    
+    def add_documents(self, data):
+        """
+        Append newly ingested articles to the keyword index.
+        
+        The new rows go into a new posting-list segment, so the cost scales
+        with the number of new rows.
+        
+        Parameters:
+            data (ArticleStore): The full dataset; rows past num_documents are added.
+        """
+        if len(data) > self.num_documents:
+            self.keyword_index.add_documents(_field_texts(data, self.tfidf_field, start=self.num_documents))
+        self.data = data
+    
+    def save(self, path):
+        """
+        Save the keyword index to disk.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "tfidf_field": self.tfidf_field,
+                "keyword_index": self.keyword_index,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path, data):
+        """
+        Load a keyword index saved with save(), without rebuilding it.
+        
+        Parameters:
+            path (str): The file written by save().
+            data (ArticleStore): The dataset the index was built from.
+        
+        Returns:
+            HybridSearch: The loaded object.
+        """
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        hs = cls.__new__(cls)
+        hs.data = data
+        hs.tfidf_field = state["tfidf_field"]
+        hs.keyword_index = state["keyword_index"]
+        return hs
     
-    def search(self, query: str, index, top_k: int = 5, alpha: float = 0.5) -> list:
+    def search(self, query: str, index, top_k: int = 5, alpha: float = 0.5, excluded_ids=None,
+               fusion: str = "weighted", rrf_k: int = 60, query_embedding=None, allowed_ids=None,
+               boost_ids=None, entity_boost: float = ENTITY_BOOST, rerank_embeddings=None) -> list:
         """
         Perform hybrid search combining semantic and keyword-based retrieval.
         
+        Both retrievers return their own top_k*3 candidates, so keyword-only hits
+        are not lost. The union is scored by both sides and fused with NumPy.
+        
         Parameters:
             query (str): The user query.
             index: The FAISS index built from semantic embeddings.
             top_k (int): The number of top articles to return.
-            alpha (float): Weight parameter between keyword (TF-IDF) and semantic search.
+            alpha (float): Weight parameter between keyword (BM25) and semantic search.
                            0.0 means only keyword search, 1.0 means only semantic search.
+            excluded_ids (array-like): Optional index ids to skip (e.g. retracted articles).
+            fusion (str): "weighted" for a weighted sum of semantic similarity and
+                          max-normalized BM25, or "rrf" for alpha-weighted reciprocal rank fusion.
+            rrf_k (int): Rank offset for reciprocal rank fusion.
+            query_embedding (numpy.ndarray): The precomputed query embedding, if the
+                                             caller already has one; otherwise it is
+                                             taken from the shared query encoder.
+            allowed_ids (array-like): Optional boolean mask or ids of the only articles to
+                                      search (e.g. from src.metadata_filter); applied inside
+                                      both the FAISS scan and the BM25 scorer.
+            boost_ids (numpy.ndarray): Optional boolean mask of articles mentioning an
+                                       entity of the query (see src.entity_index); their
+                                       fused scores are multiplied by (1 + entity_boost).
+            entity_boost (float): Relative boost for boost_ids.
+            rerank_embeddings (numpy.ndarray): Optional full-precision embeddings to re-rank
+                                               the semantic candidates of a quantized index
+                                               exactly (see src.search.rerank).
         
         Returns:
             List of document indices (e.g., sorted by combined relevance score).
         """
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion '{fusion}'. Expected one of {FUSION_METHODS}.")
+        
         # 1. Semantic Search Score (using your existing search function)
         #    Assume search(index, query_embedding, top_k) returns (indices, distances)
-        from src.embedding import get_embedding
-        query_embedding = get_embedding(query)
-        semantic_indices, semantic_distances = search(index, query_embedding, top_k=top_k*3)
+        if query_embedding is None:
+            from src.embedding import get_query_embedding
+            query_embedding = get_query_embedding(query)
+        semantic_indices, semantic_distances = search(index, query_embedding, top_k=top_k*3, excluded_ids=excluded_ids,
+                                                      allowed_ids=allowed_ids, rerank_embeddings=rerank_embeddings)
         
         # Convert distances to similarities (note: lower distance = more similar)
-        # Here, we assume a simple inversion: semantic_similarity = 1 / (1 + distance)
-        semantic_similarities = 1 / (1 + semantic_distances.astype(np.float32))
-        semantic_similarities = semantic_similarities[0]  # 1D array
+        # L2 distances use a simple inversion: semantic_similarity = 1 / (1 + distance);
+        # inner-product (flat_ip) scores are already similarities.
+        semantic_similarities = distances_to_similarities(index, semantic_distances)[0]
+        return self._fuse(query, semantic_indices[0], semantic_similarities, top_k, alpha,
+                          excluded_ids, fusion, rrf_k, allowed_ids, boost_ids, entity_boost)
+    
+    def batch_search(self, queries, index, top_k: int = 5, alpha: float = 0.5, excluded_ids=None,
+                     fusion: str = "weighted", rrf_k: int = 60, batch_size: int = 1024,
+                     num_threads=None, allowed_ids=None, boost_ids=None, entity_boost: float = ENTITY_BOOST,
+                     rerank_embeddings=None) -> list:
+        """
+        Hybrid search for many queries: the semantic side is one batched encode
+        and FAISS search (see src.search.batch_search); keyword scoring and
+        fusion then run per query.
+        
+        Parameters:
+            queries (list): The query strings.
+            batch_size (int): Queries per encode call and per FAISS call.
+            num_threads (int): If set, the number of OpenMP threads FAISS may use.
+            boost_ids (list): Optional per-query boost masks (None entries for no boost).
+            The other parameters are the same as in search().
+        
+        Returns:
+            list: One list of document indices per query.
+        """
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion '{fusion}'. Expected one of {FUSION_METHODS}.")
+        semantic_indices, semantic_distances = batch_search(index, queries, top_k=top_k*3, batch_size=batch_size,
+                                                            excluded_ids=excluded_ids, num_threads=num_threads,
+                                                            allowed_ids=allowed_ids,
+                                                            rerank_embeddings=rerank_embeddings)
+        semantic_similarities = distances_to_similarities(index, semantic_distances)
+        return [
+            self._fuse(query, semantic_indices[i], semantic_similarities[i], top_k, alpha,
+                       excluded_ids, fusion, rrf_k, allowed_ids, boost_ids[i] if boost_ids else None, entity_boost)
+            for i, query in enumerate(queries)
+        ]
+    
+    def _fuse(self, query, semantic_indices, semantic_similarities, top_k, alpha, excluded_ids, fusion, rrf_k,
+              allowed_ids=None, boost_ids=None, entity_boost=ENTITY_BOOST):
+        # FAISS pads with -1 when fewer than top_k*3 vectors are searchable.
+        valid = semantic_indices >= 0
+        semantic_indices, semantic_similarities = semantic_indices[valid], semantic_similarities[valid]
         
-        # 2. Keyword-based Search Score via TF-IDF
-        query_tfidf = self.vectorizer.transform([query])
-        keyword_similarities = cosine_similarity(query_tfidf, self.tfidf_matrix).flatten()
+        # 2. Keyword-based candidates from the BM25 posting lists.
+        with span("bm25_search", top_k=top_k*3):
+            keyword_indices, _ = self.keyword_index.search(query, top_k=top_k*3, excluded_ids=excluded_ids,
+                                                           allowed_ids=allowed_ids)
+        
+        candidates = np.union1d(semantic_indices, keyword_indices)
+        if len(candidates) == 0:
+            return []
+        semantic_positions = np.searchsorted(candidates, semantic_indices)
+        with span("bm25_score", candidates=len(candidates)):
+            keyword_scores = self.keyword_index.score(query, candidates)
         
         # 3. Combine the scores.
-        # For each candidate index, get the semantic and keyword score, and do a weighted sum.
-        combined_scores = {}
-        # Let's consider candidates from the semantic search result
-        for idx, sem_sim in zip(semantic_indices[0], semantic_similarities):
-            key_sim = keyword_similarities[idx]
-            # Combine with weight alpha for semantic, (1-alpha) for keyword.
-            combined_score = alpha * sem_sim + (1 - alpha) * key_sim
-            combined_scores[idx] = combined_score
-        
-        # Sort candidate indices by combined score in descending order.
-        sorted_indices = sorted(combined_scores, key=combined_scores.get, reverse=True)
-        # Return top_k indices.
-        return sorted_indices[:top_k]
+        with span("fusion", method=fusion):
+            if fusion == "rrf":
+                # Ranks start at 1; a candidate missing from a list gets no contribution from it.
+                semantic_ranks = np.full(len(candidates), np.inf)
+                semantic_ranks[semantic_positions] = np.arange(1, len(semantic_indices) + 1)
+                keyword_ranks = np.full(len(candidates), np.inf)
+                keyword_order = np.argsort(-keyword_scores, kind="stable")
+                keyword_ranks[keyword_order] = np.arange(1, len(candidates) + 1)
+                keyword_ranks[keyword_scores <= 0] = np.inf
+                combined_scores = alpha / (rrf_k + semantic_ranks) + (1 - alpha) / (rrf_k + keyword_ranks)
+            else:
+                # Keyword-only hits fall below the semantic cut-off, so they get the weakest
+                # retrieved semantic similarity as an upper bound.
+                floor = semantic_similarities.min() if len(semantic_similarities) else 0.0
+                semantic_scores = np.full(len(candidates), floor, dtype=np.float32)
+                semantic_scores[semantic_positions] = semantic_similarities
+                max_keyword = keyword_scores.max()
+                if max_keyword > 0:
+                    keyword_scores = keyword_scores / max_keyword
+                # Combine with weight alpha for semantic, (1-alpha) for keyword.
+                combined_scores = alpha * semantic_scores + (1 - alpha) * keyword_scores
+            # Candidates mentioning an entity of the query move up.
+            if boost_ids is not None:
+                combined_scores = boost_scores(candidates, combined_scores, boost_ids, entity_boost)
+            
+            # Sort candidate indices by combined score in descending order and return top_k.
+            order = np.argsort(-combined_scores, kind="stable")[:top_k]
+            return candidates[order].tolist()
+
+def load_or_build_hybrid_search(data, path, tfidf_field="short_description"):
+    """
+    Load the keyword index from disk, or fit and save it if it is missing.
+    
+    If the dataset has grown since the index was saved (incremental ingest),
+    only the new rows are added. If it has shrunk or uses a different field,
+    the index is refitted.
+    
+    Parameters:
+        data (ArticleStore): The article metadata (see src.article_store).
+        path (str): Where the keyword index is stored.
+        tfidf_field (str): The field to use for keyword-based retrieval.
+    
+    Returns:
+        HybridSearch: A ready-to-query object.
+    """
+    hs = None
+    if os.path.exists(path):
+        try:
+            hs = HybridSearch.load(path, data)
+        except Exception as e:
+            logger.warning("Error loading keyword index: %s", e)
+    
+    if hs is not None and hs.tfidf_field == tfidf_field and hs.num_documents <= len(data):
+        if hs.num_documents < len(data):
+            logger.info("Adding %d new documents to the keyword index.", len(data) - hs.num_documents)
+            hs.add_documents(data)
+            hs.save(path)
+        return hs
+    
+    logger.info("Building keyword index...")
+    hs = HybridSearch(data, tfidf_field=tfidf_field)
+    hs.save(path)
+    return hs
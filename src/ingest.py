@@ -0,0 +1,274 @@
+# src/ingest.py
+
+import os
+import shutil
+import sqlite3
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from src.article_store import write_article_part
+from src.artifact_store import (
+    EMBEDDINGS_FILE, INDEX_FILE, KEYS_FILE, KEY_SET_FILE, SEGMENTS_DIR, TOMBSTONES_FILE,
+    article_key_hashes, load_tombstones, metadata_part_path, open_article_store, read_manifest, segment_path,
+    write_manifest,
+)
+from src.data_preprocessing import load_data, add_embeddings
+from src.search import build_index, add_vectors
+from src.sharding import add_to_shards
+
+# Ingested rows go to a new segment index each time; once there are more segments
+# than this, they are merged into the main index (or the shards).
+MAX_SEGMENTS = 8
+
+# SQLite limits the number of parameters of one statement.
+_QUERY_CHUNK = 500
+
+def _truncate(path, num_bytes):
+    # Drop bytes left behind by an interrupted ingest so appends line up with the manifest.
+    if os.path.exists(path) and os.path.getsize(path) > num_bytes:
+        os.truncate(path, num_bytes)
+
+def _as_sqlite(keys):
+    # SQLite integers are signed 64-bit; the uint64 hashes are stored bit for bit.
+    return np.ascontiguousarray(keys, dtype=np.uint64).view(np.int64).tolist()
+
+class KeySet:
+    def __init__(self, store_dir, num_rows):
+        """
+        The dedupe keys of the stored, non-retracted articles and their index ids,
+        kept in SQLite (indexed by key) so checking a delta or resolving retracted
+        links costs O(k * log n) instead of a scan of keys.u64. Rows the set does
+        not cover yet (a store built before it existed, or an ingest interrupted
+        after its manifest was written) are added on open.
+
+        Parameters:
+            store_dir (str): Directory that holds the artifacts.
+            num_rows (int): Number of rows in the manifest.
+        """
+        self._db = sqlite3.connect(os.path.join(store_dir, KEY_SET_FILE))
+        created = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'live_rows'").fetchone() is None
+        self._db.execute("CREATE TABLE IF NOT EXISTS live_rows (id INTEGER PRIMARY KEY, key INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS live_rows_key ON live_rows (key)")
+        # user_version holds the number of store rows the set covers.
+        covered = 0 if created else self._db.execute("PRAGMA user_version").fetchone()[0]
+        if covered > num_rows:
+            self._db.execute("DELETE FROM live_rows")
+            covered = 0
+        if covered < num_rows:
+            keys = np.fromfile(os.path.join(store_dir, KEYS_FILE), dtype=np.uint64, count=num_rows - covered,
+                               offset=covered * 8)
+            ids = np.arange(covered, num_rows, dtype=np.int64)
+            live = ~np.isin(ids, load_tombstones(store_dir))
+            self.add(keys[live], ids[live], num_rows)
+
+    def _select(self, column, keys):
+        keys = _as_sqlite(keys)
+        for start in range(0, len(keys), _QUERY_CHUNK):
+            chunk = keys[start:start + _QUERY_CHUNK]
+            yield from self._db.execute(
+                f"SELECT {column} FROM live_rows WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+
+    def contains(self, keys):
+        """
+        Return a boolean array: True where the key is in the set.
+        """
+        found = {key for key, in self._select("key", keys)}
+        return np.array([key in found for key in _as_sqlite(keys)], dtype=bool)
+
+    def ids(self, keys):
+        """
+        Return the sorted int64 index ids of the live rows with any of the keys.
+        """
+        return np.unique(np.array([row_id for row_id, in self._select("id", keys)], dtype=np.int64))
+
+    def add(self, keys, ids, num_rows):
+        """
+        Add the keys of newly stored rows and their index ids; num_rows is the
+        store size once they are in.
+        """
+        self._db.executemany("INSERT OR IGNORE INTO live_rows (id, key) VALUES (?, ?)",
+                             zip(np.asarray(ids, dtype=np.int64).tolist(), _as_sqlite(keys)))
+        self._db.execute(f"PRAGMA user_version = {int(num_rows)}")
+        self._db.commit()
+
+    def discard(self, keys):
+        """
+        Remove keys, so those articles can be ingested again.
+        """
+        self._db.executemany("DELETE FROM live_rows WHERE key = ?", [(key,) for key in _as_sqlite(keys)])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+def merge_segments(store_dir):
+    """
+    Merge the segment indexes written by ingest_delta() into the main index (or,
+    in a sharded store, into the shards the rows belong to) and delete them.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+
+    Returns:
+        int: Number of rows merged.
+    """
+    manifest = read_manifest(store_dir)
+    segments = manifest.get("segments") if manifest else None
+    if not segments:
+        return 0
+    # Segments cover consecutive rows, from the first one to the end of the store.
+    start, num_rows, dimension = segments[0]["start"], manifest["num_rows"], manifest["dimension"]
+    embeddings = np.fromfile(os.path.join(store_dir, EMBEDDINGS_FILE), dtype=np.float32,
+                             count=(num_rows - start) * dimension, offset=start * dimension * 4)
+    embeddings = embeddings.reshape(-1, dimension)
+
+    if manifest.get("shards"):
+        keys = np.fromfile(os.path.join(store_dir, KEYS_FILE), dtype=np.uint64, count=num_rows - start,
+                           offset=start * 8)
+        data = open_article_store(store_dir)
+        if "category" in data.columns:
+            categories = data.column("category").slice(start, num_rows - start).to_pylist()
+        else:
+            categories = [None] * (num_rows - start)
+        add_to_shards(store_dir, manifest, start, keys, categories, embeddings)
+    else:
+        index_path = os.path.join(store_dir, INDEX_FILE)
+        index = faiss.read_index(index_path)
+        add_vectors(index, embeddings)
+        faiss.write_index(index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+
+    del manifest["segments"]
+    write_manifest(store_dir, manifest)
+    shutil.rmtree(os.path.join(store_dir, SEGMENTS_DIR), ignore_errors=True)
+    print(f"Merged {len(segments)} segments ({num_rows - start} rows).")
+    return num_rows - start
+
+def ingest_delta(delta_path, store_dir, text_column='short_description', batch_size=64,
+                 max_segments=MAX_SEGMENTS):
+    """
+    Append newly published articles to an existing artifact store.
+
+    Only the delta is read and embedded. Articles whose link (or headline, if
+    the link is missing) is already stored, or repeated within the delta, are
+    skipped; retracted articles are not, so they can be ingested again (as new
+    rows). The new rows get the next index ids, so existing ids stay valid.
+
+    The new rows are indexed in a segment of their own instead of rewriting the
+    main index, so an ingest costs O(len(delta)); segments are searched next to
+    the main index and merged into it once there are more than max_segments.
+
+    Parameters:
+        delta_path (str): Path to a line-delimited JSON file with the new articles.
+        store_dir (str): Directory that holds the artifacts (see src.artifact_store).
+        text_column (str): Column used to compute the embeddings.
+        batch_size (int): Batch size for embedding the new rows.
+        max_segments (int): Segments allowed before they are merged (see merge_segments()).
+
+    Returns:
+        int: Number of articles added (0 if nothing was new or the delta could not be loaded).
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        print(f"No artifacts found in {store_dir}; build them first.")
+        return 0
+
+    delta = load_data(delta_path)
+    if delta is None or len(delta) == 0:
+        return 0
+
+    key_set = KeySet(store_dir, manifest["num_rows"])
+    try:
+        # Dedupe against the stored key hashes and within the delta itself.
+        delta_keys = article_key_hashes(delta)
+        _, first_positions = np.unique(delta_keys, return_index=True)
+        is_new = np.zeros(len(delta), dtype=bool)
+        is_new[first_positions] = True
+        is_new &= ~key_set.contains(delta_keys)
+        delta = delta[is_new].reset_index(drop=True)
+        delta_keys = delta_keys[is_new]
+        print(f"Ingesting {len(delta)} new articles ({int((~is_new).sum())} duplicates skipped).")
+        if len(delta) == 0:
+            return 0
+        added = _append_rows(store_dir, manifest, delta, delta_keys, text_column, batch_size)
+        if added:
+            key_set.add(delta_keys, np.arange(manifest["num_rows"] - added, manifest["num_rows"]),
+                        manifest["num_rows"])
+    finally:
+        key_set.close()
+    if added and len(manifest.get("segments", [])) > max_segments:
+        merge_segments(store_dir)
+    return added
+
+def _append_rows(store_dir, manifest, delta, delta_keys, text_column, batch_size):
+    num_rows, dimension = manifest["num_rows"], manifest["dimension"]
+    keys_path = os.path.join(store_dir, KEYS_FILE)
+
+    delta, embeddings = add_embeddings(delta, text_column=text_column, batch_size=batch_size)
+    if embeddings is None:
+        return 0
+    if embeddings.shape[1] != dimension:
+        print(f"Embedding dimension {embeddings.shape[1]} does not match the store ({dimension}).")
+        return 0
+
+    # Append the new rows; the manifest is updated last so a crash leaves the old state readable.
+    embeddings_path = os.path.join(store_dir, EMBEDDINGS_FILE)
+    _truncate(embeddings_path, num_rows * dimension * 4)
+    _truncate(keys_path, num_rows * 8)
+    with open(embeddings_path, "ab") as f:
+        embeddings.tofile(f)
+    with open(keys_path, "ab") as f:
+        delta_keys.tofile(f)
+    write_article_part(metadata_part_path(store_dir, num_rows), delta)
+
+    # A small exact index with the main index's metric; its results merge with the main index's.
+    segment = build_index(embeddings, index_type="flat_ip" if manifest.get("index_type") == "flat_ip" else "flat")
+    path = segment_path(store_dir, num_rows)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    faiss.write_index(segment, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+    manifest.setdefault("segments", []).append({"start": num_rows, "rows": len(delta)})
+    manifest["num_rows"] = num_rows + len(delta)
+    write_manifest(store_dir, manifest)
+    print(f"Store now holds {manifest['num_rows']} articles.")
+    return len(delta)
+
+def retract_articles(store_dir, links):
+    """
+    Tombstone retracted articles so they are no longer returned by searches.
+
+    Rows keep their index ids; the tombstoned ids are excluded inside the FAISS
+    scan (see load_tombstones() and the excluded_ids argument of src.search.search).
+    Their keys leave the dedupe set, so a corrected article with the same link
+    can be ingested again.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        links (list): Links (or headlines, for articles without a link) of the retracted articles.
+
+    Returns:
+        numpy.ndarray: The index ids that were tombstoned.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None or not links:
+        return np.empty(0, dtype=np.int64)
+
+    retracted = article_key_hashes(pd.DataFrame({"link": list(links)}))
+    key_set = KeySet(store_dir, manifest["num_rows"])
+    try:
+        # Resolved through the key set, so the cost depends on len(links), not on the corpus.
+        ids = key_set.ids(retracted)
+        with open(os.path.join(store_dir, TOMBSTONES_FILE), "ab") as f:
+            ids.tofile(f)
+        key_set.discard(retracted)
+    finally:
+        key_set.close()
+    print(f"Tombstoned {len(ids)} articles.")
+    return ids
+
+if __name__ == '__main__':
+    added = ingest_delta("data/delta.json", "data/artifacts")
+    print("Articles added:", added)
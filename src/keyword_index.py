@@ -0,0 +1,222 @@
+# src/keyword_index.py
+
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from src.search import allowed_mask
+
+# Same token rule as scikit-learn's default: words of two or more word characters.
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+def tokenize(text):
+    """
+    Lowercase the text and split it into tokens, dropping English stop words.
+    """
+    if not isinstance(text, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in ENGLISH_STOP_WORDS]
+
+class BM25Index:
+    def __init__(self, texts=(), k1=1.5, b=0.75, max_segments=8):
+        """
+        Build an inverted index with BM25 scoring.
+
+        Postings are stored per segment in CSR form (term -> sorted doc ids and
+        term frequencies). Adding documents creates a new segment, so ingest cost
+        scales with the new documents; segments are merged once there are more
+        than max_segments of them.
+
+        Parameters:
+            texts (iterable): The document texts; document i gets id i.
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 document-length normalization.
+            max_segments (int): Number of segments kept before they are compacted.
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.vocabulary = {}
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.total_length = 0
+        # Each segment is (indptr, doc_ids, term_freqs) over the term ids known when it was built.
+        self.segments = []
+        self.add_documents(texts)
+
+    @property
+    def num_documents(self) -> int:
+        return len(self.doc_lengths)
+
+    def _term_ids(self, tokens, grow=False):
+        ids = []
+        for token in tokens:
+            term_id = self.vocabulary.get(token)
+            if term_id is None and grow:
+                term_id = len(self.vocabulary)
+                self.vocabulary[token] = term_id
+            if term_id is not None:
+                ids.append(term_id)
+        return ids
+
+    def add_documents(self, texts):
+        """
+        Append documents to the index as a new segment.
+
+        Parameters:
+            texts (iterable): Texts of the new documents, which get the next ids.
+        """
+        first_id = self.num_documents
+        term_ids, doc_ids, lengths = [], [], []
+        for offset, text in enumerate(texts):
+            ids = self._term_ids(tokenize(text), grow=True)
+            term_ids.extend(ids)
+            doc_ids.extend([first_id + offset] * len(ids))
+            lengths.append(len(ids))
+        if not lengths:
+            return
+
+        num_terms = len(self.vocabulary)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+
+        # Count (term, doc) pairs and lay them out term-major with ascending doc ids.
+        num_new = len(lengths)
+        pairs, term_freqs = np.unique(term_ids * num_new + (doc_ids - first_id), return_counts=True)
+        pair_terms = pairs // num_new
+        pair_docs = pairs % num_new + first_id
+        indptr = np.zeros(num_terms + 1, dtype=np.int64)
+        np.add.at(indptr, pair_terms + 1, 1)
+        np.cumsum(indptr, out=indptr)
+
+        self.segments.append((indptr, pair_docs.astype(np.int32), term_freqs.astype(np.float32)))
+        self.doc_freq = np.concatenate([self.doc_freq, np.zeros(num_terms - len(self.doc_freq), dtype=np.int64)])
+        self.doc_freq += np.diff(indptr)
+        self.doc_lengths = np.concatenate([self.doc_lengths, np.asarray(lengths, dtype=np.float32)])
+        self.total_length += sum(lengths)
+
+        if len(self.segments) > self.max_segments:
+            self.compact()
+
+    def compact(self):
+        """
+        Merge all segments into one.
+        """
+        if len(self.segments) <= 1:
+            return
+        num_terms = len(self.vocabulary)
+        terms, docs, freqs = [], [], []
+        for indptr, doc_ids, term_freqs in self.segments:
+            counts = np.diff(indptr)
+            terms.append(np.repeat(np.arange(len(counts), dtype=np.int64), counts))
+            docs.append(doc_ids)
+            freqs.append(term_freqs)
+        terms, docs, freqs = np.concatenate(terms), np.concatenate(docs), np.concatenate(freqs)
+        order = np.lexsort((docs, terms))
+        indptr = np.zeros(num_terms + 1, dtype=np.int64)
+        np.add.at(indptr, terms + 1, 1)
+        np.cumsum(indptr, out=indptr)
+        self.segments = [(indptr, docs[order], freqs[order])]
+
+    def _postings(self, term_id):
+        # Concatenate the posting lists of one term across segments (ids stay ascending).
+        docs, freqs = [], []
+        for indptr, doc_ids, term_freqs in self.segments:
+            if term_id + 1 < len(indptr):
+                start, end = indptr[term_id], indptr[term_id + 1]
+                docs.append(doc_ids[start:end])
+                freqs.append(term_freqs[start:end])
+        if not docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return np.concatenate(docs), np.concatenate(freqs)
+
+    def _term_weights(self, tf, doc_ids, idf):
+        avg_length = max(self.total_length / max(self.num_documents, 1), 1e-9)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_ids] / avg_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def _query_terms(self, query):
+        # Unique known query terms with their IDF weights.
+        term_ids = np.unique(np.asarray(self._term_ids(tokenize(query)), dtype=np.int64))
+        df = self.doc_freq[term_ids]
+        idf = np.log(1 + (self.num_documents - df + 0.5) / (df + 0.5))
+        return term_ids, idf
+
+    def search(self, query, top_k=10, excluded_ids=None, allowed_ids=None):
+        """
+        Return the top_k documents for the query, reading only the posting
+        lists of the query terms.
+
+        Parameters:
+            query (str): The query text.
+            top_k (int): Number of documents to return.
+            excluded_ids (array-like): Optional document ids to skip.
+            allowed_ids (array-like): Optional boolean mask or ids of the only documents
+                                      to score (e.g. from src.metadata_filter); postings
+                                      outside it are dropped before BM25 weighting.
+
+        Returns:
+            doc_ids (numpy.ndarray): Matching document ids, best first (may be fewer than top_k).
+            scores (numpy.ndarray): Their BM25 scores.
+        """
+        mask = allowed_mask(allowed_ids, self.num_documents) if allowed_ids is not None else None
+        all_docs, all_weights = [], []
+        for term_id, idf in zip(*self._query_terms(query)):
+            docs, tf = self._postings(term_id)
+            if mask is not None:
+                keep = mask[docs]
+                docs, tf = docs[keep], tf[keep]
+            all_docs.append(docs)
+            all_weights.append(self._term_weights(tf, docs, idf))
+        if not all_docs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # Sum per-term contributions over the union of the posting lists.
+        doc_ids, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_weights)).astype(np.float32)
+        if excluded_ids is not None and len(excluded_ids) > 0:
+            keep = ~np.isin(doc_ids, excluded_ids)
+            doc_ids, scores = doc_ids[keep], scores[keep]
+
+        if len(doc_ids) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            doc_ids, scores = doc_ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return doc_ids[order].astype(np.int64), scores[order]
+
+    def score(self, query, candidate_ids):
+        """
+        BM25 scores of the query for a given set of candidate documents.
+
+        Parameters:
+            query (str): The query text.
+            candidate_ids (array-like): Document ids to score.
+
+        Returns:
+            numpy.ndarray: One score per candidate, in the order given.
+        """
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        scores = np.zeros(len(candidate_ids), dtype=np.float32)
+        for term_id, idf in zip(*self._query_terms(query)):
+            docs, tf = self._postings(term_id)
+            if len(docs) == 0:
+                continue
+            # Posting lists are sorted by doc id, so membership is a binary search.
+            positions = np.minimum(np.searchsorted(docs, candidate_ids), len(docs) - 1)
+            found = docs[positions] == candidate_ids
+            if found.any():
+                scores[found] += self._term_weights(tf[positions[found]], candidate_ids[found], idf)
+        return scores
+
+if __name__ == '__main__':
+    documents = [
+        "French Spider-Man climbs a Paris tower without ropes.",
+        "Markets rally after the central bank cuts interest rates.",
+        "Joe Biden announces new vaccine initiatives.",
+        "A climber scaled the tower and was met by police.",
+    ]
+    keyword_index = BM25Index(documents)
+    keyword_index.add_documents(["Police arrest the Spider-Man climber in France."])
+    print("Top matches:", keyword_index.search("spider man tower climber", top_k=3))
+    print("Candidate scores:", keyword_index.score("spider man tower climber", [0, 1, 4]))
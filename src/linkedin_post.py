@@ -1,93 +1,319 @@
 # src/linkedin_post.py
 
-from transformers import pipeline
+import logging
+import warnings
 
-# Initialize the text-generation pipeline with GPT-2.
-post_generator = pipeline(
-    "text-generation",
-    model="gpt2"
-)
+from src.models import register_model, get_model
+from src.backends import get_backend, load_pipeline
+from src.batching import register_batch_function, get_batcher
+from src.tracing import span, increment
+from src.streaming import StreamedCall
+
+logger = logging.getLogger(__name__)
+
+# Name of the post generation model.
+POST_MODEL_NAME = "gpt2"
+
+def _load_post_generator(backend=None):
+    generator = load_pipeline("text-generation", POST_MODEL_NAME, backend or get_backend("post_generator"))
+    # GPT-2 has no pad token; batched prompts are left-padded with EOS.
+    generator.tokenizer.pad_token_id = generator.model.config.eos_token_id
+    generator.tokenizer.padding_side = "left"
+    return generator
+
+# The text-generation pipeline with GPT-2 is loaded on first use (see src.models);
+# POST_GENERATOR_BACKEND selects torch, int8 or onnx (see src.backends).
+register_model("post_generator", _load_post_generator)
+
+def __getattr__(name):
+    # Keeps `from src.linkedin_post import post_generator` working without loading at import time.
+    if name == "post_generator":
+        return get_model("post_generator")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# First-pass token budget of a post, and the tokens added per continuation when
+# the post stops mid-sentence. Generation per post is bounded by
+# max_new_tokens + (max_iterations - 1) * continuation_tokens.
+POST_MAX_NEW_TOKENS = 160
+CONTINUATION_TOKENS = 40
+# A post is complete once it has this many sentences and ends on a sentence boundary.
+MIN_SENTENCES = 3
+SENTENCE_END = ('.', '!', '?')
 
 def is_complete(text: str) -> bool:
     """
     Check if the text appears to end with proper sentence-ending punctuation.
     """
-    return text.strip().endswith(('.', '!', '?'))
+    return text.strip().endswith(SENTENCE_END)
 
-def generate_linkedin_post(text: str, mode: str = "default", initial_max_length: int = 250, max_iterations: int = 3) -> str:
+def is_post_complete(text: str, min_sentences: int = MIN_SENTENCES) -> bool:
     """
-    Generate a LinkedIn post based on the provided input.
+    Check if the text has at least min_sentences sentences and ends on a sentence boundary.
+    """
+    sentences = [s.strip() for s in text.split('.') if s.strip()]
+    return len(sentences) >= min_sentences and is_complete(text)
+
+def _stopping_criteria(tokenizer, start):
+    # Stops each row of a generate call as soon as its text from column `start` on is a
+    # complete post. The full decode only runs when the newest token ends a sentence.
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+    
+    class PostComplete(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            done = [
+                is_complete(tokenizer.decode(row[-1:])) and
+                is_post_complete(tokenizer.decode(row[start:], skip_special_tokens=True))
+                for row in input_ids
+            ]
+            return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+    
+    return StoppingCriteriaList([PostComplete()])
+
+def _generate_tokens(token_ids, max_new_tokens, past_key_values=None, start=None, streamer=None):
+    """
+    One sampled GPT-2 generate call over left-padded token id lists.
     
     Parameters:
-        text (str): The content to base the LinkedIn post on.
-            - In dynamic mode, 'text' should be a combination of the user query and extra details.
-            - In default mode, 'text' is a news summary retrieved from the database.
-        mode (str): "dynamic" to generate from user-provided combined input; 
-                    "default" to generate from a retrieved summary.
-        initial_max_length (int): Initial maximum token length for generation.
-        max_iterations (int): Maximum attempts if the output seems incomplete.
+        token_ids (list): Input token ids per row.
+        max_new_tokens (int): Most tokens added to each row.
+        past_key_values: The KV cache of a previous call whose output is token_ids[0]
+                         (single row only); only the uncached tokens are recomputed.
+        start (int): Column where the post text begins, for the stopping criterion
+                     (default: the end of the input).
+        streamer: Optional transformers streamer that receives the tokens as they are generated.
     
     Returns:
-        str: The generated LinkedIn post.
+        new_ids (list): The tokens generated for each row (padding removed).
+        past_key_values: The KV cache after the call, or None if it no longer
+                         matches prompt + new_ids (rows stopped early and were padded).
     """
-    max_length = initial_max_length
-    post = ""
+    import torch
+    generator = get_model("post_generator")
+    tokenizer, model = generator.tokenizer, generator.model
+    pad_token_id = tokenizer.pad_token_id
+    width = max(len(ids) for ids in token_ids)
+    input_ids = torch.tensor([[pad_token_id] * (width - len(ids)) + list(ids) for ids in token_ids])
+    attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in token_ids])
+    with torch.inference_mode():
+        output = model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            temperature=0.7,
+            top_p=0.9,
+            pad_token_id=pad_token_id,
+            stopping_criteria=_stopping_criteria(tokenizer, width if start is None else start),
+            streamer=streamer,
+            return_dict_in_generate=True
+        )
     
+    new_ids = []
+    padded = False
+    for row in output.sequences[:, width:].tolist():
+        # Rows that stopped before the others are padded (GPT-2 pads with EOS).
+        length = len(row)
+        while length and row[length - 1] == pad_token_id:
+            length -= 1
+        padded = padded or length < len(row)
+        new_ids.append(row[:length])
+    return new_ids, None if padded or len(token_ids) > 1 else output.past_key_values
+
+def _prompt_ids(prompt, reserved_tokens):
+    # Truncate the prompt so prompt + generated tokens fit in GPT-2's context window.
+    generator = get_model("post_generator")
+    limit = getattr(generator.model.config, "n_positions", 1024) - reserved_tokens
+    return generator.tokenizer(prompt, truncation=True, max_length=max(limit, 1))["input_ids"]
+
+def _generate_batch(items):
+    """
+    Run the first pass of several posts over (prompt_ids, max_new_tokens) items,
+    one left-padded generate call per distinct max_new_tokens. Each row stops
+    as soon as it holds a complete post. The prompts are already truncated
+    (see _prompt_ids), with the same budget as an unbatched first pass.
+    
+    Returns:
+        list: The generated token ids for each item, in the input order.
+    """
+    results = [None] * len(items)
+    groups = {}
+    for i, (_, max_new_tokens) in enumerate(items):
+        groups.setdefault(max_new_tokens, []).append(i)
+    
+    for max_new_tokens, ids in groups.items():
+        new_ids, _ = _generate_tokens([items[i][0] for i in ids], max_new_tokens)
+        for i, row in zip(ids, new_ids):
+            results[i] = row
+    return results
+
+# Used by the "post_generator" micro-batcher (see src.batching).
+register_batch_function("post_generator", _generate_batch)
+
+def _post_prompt(text, mode):
     if mode == "dynamic":
         # dynamic mode
-        prompt = (
+        return (
             f"Write a detailed, professional, and engaging LinkedIn post about the following topics: {text}. "
             "The post should be at least three sentences long, offering insights and a clear call-to-action."
         )
-    else:
-        # In default mode, assume text is a retrieved news summary.
-        prompt = (
-            f"Based on the following news summary, generate a comprehensive and engaging LinkedIn post that clearly reflects its key points and implications. "
-            f"News Summary: {text}\n\nLinkedIn Post:"
-        )
+    # In default mode, assume text is a retrieved news summary.
+    return (
+        f"Based on the following news summary, generate a comprehensive and engaging LinkedIn post that clearly reflects its key points and implications. "
+        f"News Summary: {text}\n\nLinkedIn Post:"
+    )
+
+def _generate_post(text, mode, max_new_tokens, continuation_tokens, max_iterations, stream):
+    """
+    The attempt loop shared by generate_linkedin_post and stream_linkedin_post.
     
-    for i in range(max_iterations):
-        output = post_generator(
-            prompt,
-            max_length=max_length,
-            do_sample=True,
-            temperature=0.7,
-            top_p=0.9,
-            truncation=True
-        )
-        full_text = output[0]['generated_text'].strip()
-        
-        # In default mode, try to extract the text after our marker (if present)
-        if mode == "default" and "LinkedIn Post:" in full_text:
-            post = full_text.split("LinkedIn Post:")[-1].strip()
-        else:
-            post = full_text
+    With stream=True, yields the post text as it is generated; text already
+    shown cannot be taken back, so an unfinished last sentence is kept. With
+    stream=False, nothing is yielded.
+    
+    Returns:
+        tuple: (post, stats), as the generator's return value.
+    
+    Raises:
+        ValueError: If max_iterations is below 1.
+    """
+    if max_iterations < 1:
+        raise ValueError(f"max_iterations must be at least 1, got {max_iterations}.")
+    tokenizer = get_model("post_generator").tokenizer
+    prompt = _post_prompt(text, mode)
+    prompt_ids = _prompt_ids(prompt, max_new_tokens + (max_iterations - 1) * continuation_tokens)
+    new_ids, past_key_values = [], None
+    complete = False
+    shown = False
+    with span("linkedin_post", mode=mode, prompt_tokens=len(prompt_ids), streamed=stream) as stats:
+        for i in range(max_iterations):
+            budget = max_new_tokens if i == 0 else continuation_tokens
+            with span("linkedin_attempt", attempt=i + 1, max_new_tokens=budget,
+                      cached=past_key_values is not None) as attributes:
+                batcher = get_batcher("post_generator")
+                if stream:
+                    call = StreamedCall(_generate_tokens, tokenizer, [prompt_ids + new_ids], budget,
+                                        past_key_values, start=len(prompt_ids))
+                    for chunk in call:
+                        # The post is stripped, so leading whitespace is not shown either.
+                        chunk = chunk if shown else chunk.lstrip()
+                        if chunk:
+                            shown = True
+                            yield chunk
+                    (more,), past_key_values = call.result
+                elif i == 0 and batcher is not None:
+                    # With micro-batching enabled, first passes from concurrent requests share forward passes.
+                    more = batcher((prompt_ids, budget))
+                else:
+                    (more,), past_key_values = _generate_tokens([prompt_ids + new_ids], budget, past_key_values,
+                                                                start=len(prompt_ids))
+                new_ids = new_ids + more
+                post = tokenizer.decode(new_ids, skip_special_tokens=True).strip()
+                complete = attributes["complete"] = is_post_complete(post)
+                attributes["new_tokens"] = len(more)
+            if complete:
+                break
+            if i + 1 < max_iterations:
+                increment("linkedin_post_retries", mode=mode)
+                logger.info("Output seems incomplete after %d tokens. Continuing for up to %d more...",
+                            len(new_ids), continuation_tokens)
         
-        sentences = [s.strip() for s in post.split('.') if s.strip()]
-        if len(sentences) >= 3 and is_complete(post):
-            break
-        else:
-            max_length += 20
-            print(f"Output seems incomplete. Increasing max_length to {max_length} and regenerating...")
+        discarded = 0
+        cut = max(post.rfind(mark) for mark in SENTENCE_END) + 1
+        if not complete and cut > 0 and not stream:
+            # Drop the unfinished last sentence.
+            discarded = len(tokenizer(post[cut:], add_special_tokens=False)["input_ids"])
+            post = post[:cut]
+        stats.update(generated_tokens=len(new_ids), discarded_tokens=discarded, attempts=i + 1, complete=complete)
+    increment("linkedin_post_tokens", len(new_ids), kind="generated")
+    increment("linkedin_post_tokens", discarded, kind="discarded")
+    return post, dict(stats)
+
+def generate_linkedin_post(text: str, mode: str = "default", max_new_tokens: int = POST_MAX_NEW_TOKENS,
+                           continuation_tokens: int = CONTINUATION_TOKENS, max_iterations: int = 3,
+                           return_stats: bool = False, initial_max_length: int = None):
+    """
+    Generate a LinkedIn post based on the provided input.
+    
+    The first pass generates up to max_new_tokens and stops as soon as the
+    post is complete. If it stops mid-sentence, generation continues from the
+    previous output (reusing its KV cache) for up to continuation_tokens more,
+    so no earlier tokens are thrown away and recomputed. If the last attempt
+    still ends mid-sentence, the unfinished sentence is cut off.
+    
+    Parameters:
+        text (str): The content to base the LinkedIn post on.
+            - In dynamic mode, 'text' should be a combination of the user query and extra details.
+            - In default mode, 'text' is a news summary retrieved from the database.
+        mode (str): "dynamic" to generate from user-provided combined input; 
+                    "default" to generate from a retrieved summary.
+        max_new_tokens (int): Token budget of the first pass.
+        continuation_tokens (int): Tokens added per continuation.
+        max_iterations (int): Maximum attempts (first pass + continuations) if the output seems
+                              incomplete; at least 1 (ValueError otherwise).
+        return_stats (bool): Also return the token accounting.
+        initial_max_length (int): Deprecated; used as max_new_tokens (with a DeprecationWarning).
+                                  It used to bound prompt + post, so the post may now be longer.
     
+    Returns:
+        str: The generated LinkedIn post.
+        dict: Only if return_stats: prompt_tokens, generated_tokens, discarded_tokens
+              (generated but cut from the post), attempts and complete.
+    """
+    if initial_max_length is not None:
+        warnings.warn("initial_max_length is deprecated and will be removed; pass max_new_tokens instead.",
+                      DeprecationWarning, stacklevel=2)
+        max_new_tokens = initial_max_length
+    # Without streaming the generator yields nothing; its return value is the result.
+    try:
+        next(_generate_post(text, mode, max_new_tokens, continuation_tokens, max_iterations, stream=False))
+    except StopIteration as stop:
+        post, stats = stop.value
+    if return_stats:
+        return post, stats
     return post
 
+def stream_linkedin_post(text: str, mode: str = "default", max_new_tokens: int = POST_MAX_NEW_TOKENS,
+                         continuation_tokens: int = CONTINUATION_TOKENS, max_iterations: int = 3):
+    """
+    Streaming variant of generate_linkedin_post: yields the post text as GPT-2
+    produces it (including continuations), so the first words can be shown
+    right away. Text already shown is never withdrawn, so if the last attempt
+    ends mid-sentence, the unfinished sentence is kept rather than cut off.
+    
+    Each call generates on its own thread (micro-batching does not apply).
+    
+    Parameters:
+        The same as generate_linkedin_post.
+    
+    Yields:
+        str: The next piece of the post.
+    
+    Returns:
+        dict: The token accounting (see generate_linkedin_post), as the generator's return value.
+    """
+    _, stats = yield from _generate_post(text, mode, max_new_tokens, continuation_tokens, max_iterations,
+                                         stream=True)
+    return stats
+
 if __name__ == '__main__':
     # Test dynamic mode: user provides extra data
     dynamic_input = "I want a LinkedIn post on Joe Biden. Additional details: Joe Biden and lady Biden."
-    linkedin_post_dynamic = generate_linkedin_post(dynamic_input, mode="dynamic", initial_max_length=250, max_iterations=3)
+    linkedin_post_dynamic, stats = generate_linkedin_post(dynamic_input, mode="dynamic", return_stats=True)
     
     print("=== Dynamic Mode Output ===")
     print("Input (User Query + Additional Data):")
     print(dynamic_input)
     print("\nGenerated LinkedIn Post:")
     print(linkedin_post_dynamic)
+    print("Tokens:", stats)
     
     # Test default mode: using a retrieved summary 
     default_input = (
         "Joe Biden recently announced new vaccine initiatives and measures to bolster public health, leading to mixed reactions among experts and the public."
     )
-    linkedin_post_default = generate_linkedin_post(default_input, mode="default", initial_max_length=250, max_iterations=3)
+    linkedin_post_default = generate_linkedin_post(default_input, mode="default")
     
     print("\n=== Default Mode Output ===")
     print("Input (Retrieved Summary):")
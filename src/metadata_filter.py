@@ -0,0 +1,184 @@
+# src/metadata_filter.py
+
+import re
+
+import numpy as np
+import pyarrow as pa
+
+MS_PER_DAY = 86_400_000
+# Keyword arguments accepted by MetadataIndex.select().
+FILTER_FIELDS = ("categories", "date_from", "date_to", "authors")
+# Year phrases recognized in free-text queries, e.g. "from 2022", "since 2019", "before 2020".
+YEAR_PATTERN = re.compile(r"\b(in|from|during|of|since|after|before)\s+((?:19|20)\d{2})\b")
+# Words that mark a category name in a query as a filter ("politics news", "the tech section").
+CATEGORY_NOUNS = r"(?:news|articles?|stories|headlines|section|category)"
+
+def category_pattern(category):
+    """
+    Regex matching a category named as a filter: followed by one of CATEGORY_NOUNS
+    ("politics news", "in tech articles") or after "category"/"section" ("category: sports").
+    Names that already end in one ("world news") match on their own. A bare mention
+    ("tech layoffs", "politics of climate change") does not match.
+    """
+    name = r"\s+".join(re.escape(word) for word in category.lower().split())
+    if re.search(rf"\s{CATEGORY_NOUNS}$", category.lower()):
+        return re.compile(rf"(?<!\w){name}(?!\w)")
+    return re.compile(rf"(?<!\w)(?:(?:category|section)\s*:?\s*{name}(?!\w)|{name}\s+{CATEGORY_NOUNS}(?!\w))")
+
+def to_day(value):
+    """
+    Days since 1970-01-01 of a date given as a string, date, datetime or numpy.datetime64.
+    """
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+def split_authors(text):
+    """
+    Split an authors field ("A, B and C") into lowercase author names.
+    """
+    if not isinstance(text, str):
+        return []
+    return [name.strip().lower() for name in re.split(r",|\band\b", text) if name.strip()]
+
+def _postings(keys_per_row):
+    postings = {}
+    for row, keys in enumerate(keys_per_row):
+        for key in keys:
+            postings.setdefault(key, []).append(row)
+    return {key: np.asarray(ids, dtype=np.int64) for key, ids in postings.items()}
+
+class MetadataIndex:
+    def __init__(self, data):
+        """
+        Precomputed lookups for filtered retrieval: a sorted id list per
+        category and per author, and the article ids sorted by date so a date
+        range is one binary search. select() turns filters into a boolean mask
+        that src.search and the BM25 scorer apply inside their scans.
+
+        Parameters:
+            data (ArticleStore): The article metadata (see src.article_store).
+        """
+        self.num_documents = len(data)
+        columns = data.columns
+        categories = data.texts("category") if "category" in columns else []
+        self.category_ids = _postings([[category.strip().upper()] if category.strip() else []
+                                       for category in categories])
+        self.category_patterns = {category: category_pattern(category) for category in self.category_ids}
+        authors = data.texts("authors") if "authors" in columns else []
+        self.author_ids = _postings([split_authors(text) for text in authors])
+
+        days = np.zeros(0, dtype=np.int64)
+        if "date" in columns and self.num_documents:
+            missing = np.iinfo(np.int64).min
+            millis = data.column("date").cast(pa.int64()).fill_null(missing).to_numpy()
+            days = np.where(millis == missing, missing, millis // MS_PER_DAY)
+        dated = np.flatnonzero(days != np.iinfo(np.int64).min)
+        order = np.argsort(days[dated], kind="stable")
+        self.ids_by_date = dated[order]
+        self.sorted_days = days[dated][order]
+
+    @property
+    def categories(self):
+        return sorted(self.category_ids)
+
+    def _union(self, postings, keys):
+        lists = [postings[key] for key in keys if key in postings]
+        return np.concatenate(lists) if lists else np.zeros(0, dtype=np.int64)
+
+    def select(self, categories=None, date_from=None, date_to=None, authors=None):
+        """
+        Resolve filters to the searchable subset. Filters of different kinds are
+        combined with AND; several categories or authors match any of them.
+
+        Parameters:
+            categories (list): Category names (case-insensitive, e.g. "politics").
+            date_from: First publication date to include (str, date or datetime).
+            date_to: Last publication date to include.
+            authors (list): Author names (case-insensitive).
+
+        Returns:
+            numpy.ndarray: A boolean mask over the index ids (True = searchable),
+                           or None if no filter was given.
+        """
+        selections = []
+        if categories:
+            selections.append(self._union(self.category_ids, [c.strip().upper() for c in categories]))
+        if authors:
+            selections.append(self._union(self.author_ids, [a.strip().lower() for a in authors]))
+        if date_from is not None or date_to is not None:
+            start = 0 if date_from is None else np.searchsorted(self.sorted_days, to_day(date_from), side="left")
+            stop = len(self.sorted_days) if date_to is None else np.searchsorted(self.sorted_days, to_day(date_to),
+                                                                                 side="right")
+            selections.append(self.ids_by_date[start:stop])
+        if not selections:
+            return None
+
+        # Different kinds of filters must all match.
+        mask = np.zeros(self.num_documents, dtype=bool)
+        mask[selections[0]] = True
+        for ids in selections[1:]:
+            hit = np.zeros(self.num_documents, dtype=bool)
+            hit[ids] = True
+            mask &= hit
+        return mask
+
+    def extract_filters(self, query):
+        """
+        Detect filters mentioned in a free-text query: category names used as
+        such ("politics news", "in the tech section"; see category_pattern()) and
+        years after a preposition ("from 2022", "since 2019", "before 2020").
+        Other mentions of a category word or a year do not filter.
+
+        Returns:
+            dict: select() keyword arguments (empty if the query mentions none).
+        """
+        text = query.lower()
+        filters = {}
+        categories = [category for category, pattern in self.category_patterns.items() if pattern.search(text)]
+        if categories:
+            filters["categories"] = categories
+        for word, year in YEAR_PATTERN.findall(text):
+            year = int(year)
+            if word in ("since", "after"):
+                filters["date_from"] = f"{year + (word == 'after')}-01-01"
+            elif word == "before":
+                filters["date_to"] = f"{year - 1}-12-31"
+            else:
+                filters["date_from"], filters["date_to"] = f"{year}-01-01", f"{year}-12-31"
+        return filters
+
+    def filter_for_query(self, query, filters=None):
+        """
+        Resolve explicit filters, or the ones detected in the query text, to a mask.
+        Filters detected automatically are dropped if they match no article.
+
+        Parameters:
+            query (str): The user query.
+            filters (dict): Explicit select() arguments; if None, they are extracted from the query.
+
+        Returns:
+            filters (dict): The filters applied (empty if none).
+            allowed_ids (numpy.ndarray): The mask for src.search / HybridSearch, or None.
+        """
+        explicit = filters is not None
+        filters = filters if explicit else self.extract_filters(query)
+        allowed_ids = self.select(**filters)
+        if allowed_ids is not None and not explicit and not allowed_ids.any():
+            return {}, None
+        return filters, allowed_ids
+
+if __name__ == '__main__':
+    import pandas as pd
+    from src.article_store import ArticleStore
+
+    frame = pd.DataFrame({
+        "headline": ["Senate passes budget", "New phone released", "Election results are in"],
+        "category": ["POLITICS", "TECH", "POLITICS"],
+        "authors": ["Jane Doe, AP", "John Roe", "Jane Doe"],
+        "date": ["2021-05-01", "2022-03-02", "2022-11-09"],
+    })
+    metadata_index = MetadataIndex(ArticleStore.from_dataframe(frame))
+    filters = metadata_index.extract_filters("politics news from 2022")
+    print("Filters:", filters)
+    print("Bare mention:", metadata_index.extract_filters("tech policy debates in politics"))
+    print("Matching ids:", np.flatnonzero(metadata_index.select(**filters)))
+    print("By author:", np.flatnonzero(metadata_index.select(authors=["jane doe"])))
@@ -0,0 +1,96 @@
+# src/models.py
+
+import logging
+import threading
+import time
+
+# name -> loader callable, registered by the modules that own each model.
+_loaders = {}
+# name -> loaded model object.
+_models = {}
+# name -> seconds spent in the loader (library import + weights).
+_load_seconds = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+def register_model(name, loader):
+    """
+    Register a loader for a model. Nothing is loaded until get_model() is called.
+
+    Parameters:
+        name (str): Registry name of the model (e.g. "embedding").
+        loader (callable): Zero-argument function that imports the library and
+                           returns the loaded model. Heavy imports belong inside it.
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+def get_model(name):
+    """
+    Return the model, loading it on first use. The loaded model is shared by
+    every module that asks for it, and concurrent first calls load it once.
+
+    Parameters:
+        name (str): Registry name of the model.
+
+    Returns:
+        The loaded model object.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+    if name not in _loaders:
+        raise KeyError(f"No model registered under '{name}'. Registered: {sorted(_loaders)}")
+
+    with _locks[name]:
+        # Another thread may have finished loading while we waited.
+        if name in _models:
+            return _models[name]
+        logger.info("Loading model '%s'...", name)
+        start = time.perf_counter()
+        model = _loaders[name]()
+        _load_seconds[name] = time.perf_counter() - start
+        _models[name] = model
+        logger.info("Model '%s' loaded in %.2fs.", name, _load_seconds[name])
+        return model
+
+def is_loaded(name):
+    """
+    True if the model has already been loaded.
+    """
+    return name in _models
+
+def warmup(names=None):
+    """
+    Load models ahead of the first request.
+
+    Parameters:
+        names (list): Registry names to load; all registered models if None.
+    """
+    for name in (names if names is not None else list(_loaders)):
+        get_model(name)
+
+def load_report():
+    """
+    Return per-model load status and load time in seconds.
+
+    Returns:
+        dict: name -> {"loaded": bool, "load_seconds": float or None}
+    """
+    return {
+        name: {"loaded": name in _models, "load_seconds": _load_seconds.get(name)}
+        for name in sorted(_loaders)
+    }
+
+def print_load_report():
+    """
+    Print which models were loaded and how long each one took.
+    """
+    for name, info in load_report().items():
+        if info["loaded"]:
+            print(f"Model '{name}': loaded in {info['load_seconds']:.2f}s")
+        else:
+            print(f"Model '{name}': not loaded")
@@ -1,9 +1,25 @@
 # src/ner.py
 
-import spacy
+from src.models import register_model, get_model
 
-# Load the English model
-nlp = spacy.load("en_core_web_sm")
+def _load_nlp():
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+# The English spaCy model is loaded on first use (see src.models).
+register_model("ner", _load_nlp)
+
+def __getattr__(name):
+    # Keeps `from src.ner import nlp` working without loading at import time.
+    if name == "nlp":
+        return get_model("ner")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Pipeline components NER does not need (en_core_web_sm's ner has its own tok2vec listener).
+UNUSED_COMPONENTS = ("tagger", "parser", "attribute_ruler", "lemmatizer", "senter")
+
+def _disabled(nlp):
+    return [name for name in UNUSED_COMPONENTS if name in nlp.pipe_names]
 
 def extract_entities(text: str) -> list:
     """
@@ -15,10 +31,30 @@ def extract_entities(text: str) -> list:
     Returns:
         list: A list of tuples (entity_text, entity_label).
     """
-    doc = nlp(text)
+    nlp = get_model("ner")
+    doc = nlp(text, disable=_disabled(nlp))
     entities = [(ent.text, ent.label_) for ent in doc.ents]
     return entities
 
+def extract_entities_batch(texts, batch_size=256, n_process=1):
+    """
+    Extract named entities from many texts with nlp.pipe: texts are processed
+    in batches, optionally in n_process worker processes, with only the
+    components NER needs enabled.
+    
+    Parameters:
+        texts (iterable): The texts (missing values are treated as empty).
+        batch_size (int): Texts per batch.
+        n_process (int): Worker processes (-1 = one per CPU).
+    
+    Yields:
+        list: The (entity_text, entity_label) tuples of each text, in the input order.
+    """
+    nlp = get_model("ner")
+    texts = (text if isinstance(text, str) else "" for text in texts)
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=_disabled(nlp)):
+        yield [(ent.text, ent.label_) for ent in doc.ents]
+
 if __name__ == '__main__':
     test_text = (
         "Joe Biden announced new vaccine initiatives at the White House on March 15, 2023, "
@@ -28,3 +64,5 @@ if __name__ == '__main__':
     print("Extracted Entities:")
     for ent in entities:
         print(ent)
+    
+    print("Batched:", list(extract_entities_batch([test_text, "Pfizer and Moderna shares rose."], batch_size=2)))
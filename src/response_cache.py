@@ -0,0 +1,266 @@
+# src/response_cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.tracing import span, increment
+
+# Minimum cosine similarity between two queries for one to reuse the other's response.
+# Paraphrases ("latest political news" / "recent politics updates") score above it
+# with all-MiniLM-L6-v2; queries about different subjects stay well below.
+SIMILARITY_THRESHOLD = 0.9
+
+def response_scope(agent, filters=None, **params):
+    """
+    The part of a cache key that must match exactly: the agent, the applied
+    metadata filters and any retrieval parameter that changes the response.
+    Only queries with the same scope are compared by similarity.
+    """
+    return json.dumps({"agent": agent, "filters": filters or {}, **params}, sort_keys=True, default=str)
+
+def response_cache_version(store_dir):
+    """
+    Version of the responses a store can produce: changes whenever the index
+    (build, ingest, retraction) or the summarization model/backend changes.
+    """
+    from src.artifact_store import artifact_version
+    from src.summarization import summary_model_key
+    return hashlib.sha256(f"{artifact_version(store_dir)}|{summary_model_key()}".encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, max_size=1024, ttl=3600, threshold=SIMILARITY_THRESHOLD, version=None, db_path=None,
+                 cache_posts=True):
+        """
+        Semantic cache of end-to-end responses (retrieved indices, article summaries
+        and optionally the LinkedIn post), keyed by the query embedding. A lookup
+        returns the response of the most similar cached query with the same scope
+        if their cosine similarity reaches the threshold, skipping retrieval, BART
+        and GPT-2.
+
+        Parameters:
+            max_size (int): Maximum number of cached responses (least recently used are evicted).
+            ttl (float): Seconds after which a response expires (None = never).
+            threshold (float): Minimum cosine similarity for a hit.
+            version (str): Version of the index the responses come from (see
+                           response_cache_version); entries of another version are dropped.
+            db_path (str): SQLite file that keeps responses across restarts (None = memory only).
+            cache_posts (bool): Also cache LinkedIn posts (if False, a hit reuses the
+                                articles and summaries and the post is generated again).
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = version
+        self.cache_posts = cache_posts
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        # slot -> (scope, response, compute_seconds, created_at, row_id), least recently used first
+        self._entries = OrderedDict()
+        # scope -> slots; the normalized query embedding of slot i is row i of _embeddings
+        self._scopes = {}
+        self._embeddings = None
+        # Slots freed by expired entries, reused before the LRU entry is evicted.
+        self._free = []
+        self._db = None
+        if db_path is not None:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (id INTEGER PRIMARY KEY AUTOINCREMENT, version TEXT, "
+                "scope TEXT NOT NULL, embedding BLOB NOT NULL, response TEXT NOT NULL, "
+                "compute_seconds REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._load()
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _load(self):
+        # Drop responses of another index version or past their TTL, then load the newest ones.
+        self._db.execute("DELETE FROM responses WHERE version IS NOT ?", (self.version,))
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT id, scope, embedding, response, compute_seconds, created_at FROM responses ORDER BY id DESC LIMIT ?",
+            (self.max_size,)).fetchall()
+        for row_id, scope, embedding, response, compute_seconds, created_at in reversed(rows):
+            self._remember(scope, np.frombuffer(embedding, dtype=np.float32), json.loads(response), compute_seconds,
+                           created_at, row_id)
+
+    def _remember(self, scope, embedding, response, compute_seconds, created_at, row_id=None):
+        if self._embeddings is None or self._embeddings.shape[1] != len(embedding):
+            self._embeddings = np.zeros((self.max_size, len(embedding)), dtype=np.float32)
+            self._entries.clear()
+            self._scopes.clear()
+            self._free.clear()
+        if self._free:
+            slot = self._free.pop()
+        elif len(self._entries) < self.max_size:
+            slot = len(self._entries)
+        else:
+            slot, (old_scope, *_) = self._entries.popitem(last=False)
+            self._forget_slot(old_scope, slot)
+        self._embeddings[slot] = embedding
+        self._entries[slot] = (scope, response, compute_seconds, created_at, row_id)
+        self._scopes.setdefault(scope, []).append(slot)
+
+    def _forget_slot(self, scope, slot):
+        slots = self._scopes[scope]
+        slots.remove(slot)
+        if not slots:
+            del self._scopes[scope]
+
+    @staticmethod
+    def _normalize(query_embedding):
+        embedding = np.asarray(query_embedding, dtype=np.float32).ravel()
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def lookup(self, query_embedding, scope):
+        """
+        Return the cached response of the most similar query with this scope.
+
+        Parameters:
+            query_embedding (numpy.ndarray): Embedding of the new query.
+            scope (str): See response_scope().
+
+        Returns:
+            tuple: (response, similarity, compute_seconds) on a hit, or None.
+        """
+        query = self._normalize(query_embedding)
+        with self._lock:
+            match = None
+            slots = list(self._scopes.get(scope, ()))
+            if slots and self._embeddings.shape[1] == len(query):
+                # Expired entries are removed on the way.
+                for slot in [slot for slot in slots if self._expired(self._entries[slot][3])]:
+                    del self._entries[slot]
+                    self._forget_slot(scope, slot)
+                    self._free.append(slot)
+                    slots.remove(slot)
+                if slots:
+                    similarities = self._embeddings[slots] @ query
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        match = slots[best], float(similarities[best])
+            if match is None:
+                self.misses += 1
+                increment("response_cache_lookups", result="miss")
+                return None
+            slot, similarity = match
+            self._entries.move_to_end(slot)
+            _, response, compute_seconds, _, _ = self._entries[slot]
+            self.hits += 1
+            self.seconds_saved += compute_seconds
+        increment("response_cache_lookups", result="hit")
+        increment("response_cache_seconds_saved", compute_seconds)
+        return response, similarity, compute_seconds
+
+    def lookup_query(self, query, scope):
+        """
+        Embed a query through the shared query encoder (so retrieval reuses the
+        embedding) and look it up.
+
+        Returns:
+            tuple: (query_embedding, hit), hit as returned by lookup(); (None, None) for an empty query.
+        """
+        from src.embedding import get_query_embedding
+        query_embedding = get_query_embedding(query)
+        if query_embedding is None:
+            return None, None
+        with span("response_cache") as attributes:
+            hit = self.lookup(query_embedding, scope)
+            attributes["hit"] = hit is not None
+        return query_embedding, hit
+
+    def put(self, query_embedding, scope, indices, summaries, compute_seconds, post=None, post_seconds=0.0):
+        """
+        Cache the response to a query.
+
+        Parameters:
+            query_embedding (numpy.ndarray): Embedding of the query.
+            scope (str): See response_scope().
+            indices (list): Retrieved article ids.
+            summaries (list): Their summaries.
+            compute_seconds (float): Time spent on retrieval and summarization (reported as saved on hits).
+            post (str): The LinkedIn post, if one was generated (kept only with cache_posts).
+            post_seconds (float): Time spent generating the post.
+        """
+        response = {"indices": [int(idx) for idx in indices], "summaries": list(summaries)}
+        if post is not None and self.cache_posts:
+            response["post"] = post
+            compute_seconds += post_seconds
+        embedding = self._normalize(query_embedding)
+        created_at = time.time()
+        with self._lock:
+            row_id = None
+            if self._db is not None:
+                row_id = self._db.execute(
+                    "INSERT INTO responses (version, scope, embedding, response, compute_seconds, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.version, scope, embedding.tobytes(), json.dumps(response), compute_seconds, created_at)
+                ).lastrowid
+                self._db.execute("DELETE FROM responses WHERE id NOT IN "
+                                 "(SELECT id FROM responses ORDER BY id DESC LIMIT ?)", (self.max_size,))
+                self._db.commit()
+            self._remember(scope, embedding, response, compute_seconds, created_at, row_id)
+
+    def add_post(self, response, post, post_seconds=0.0):
+        """
+        Store the LinkedIn post generated for a cached response (returned by
+        lookup()) that had none, keeping its articles, summaries and creation
+        time, so that later hits skip GPT-2 as well. Does nothing if cache_posts
+        is off or the entry has been evicted or invalidated meanwhile.
+
+        Parameters:
+            response (dict): The response, as returned by lookup().
+            post (str): The generated post.
+            post_seconds (float): Time spent generating it (added to the compute time saved by later hits).
+        """
+        if not self.cache_posts:
+            return
+        with self._lock:
+            for slot, (scope, cached, compute_seconds, created_at, row_id) in self._entries.items():
+                if cached is response:
+                    break
+            else:
+                return
+            cached = dict(cached, post=post)
+            compute_seconds += post_seconds
+            self._entries[slot] = (scope, cached, compute_seconds, created_at, row_id)
+            if self._db is not None and row_id is not None:
+                self._db.execute("UPDATE responses SET response = ?, compute_seconds = ? WHERE id = ?",
+                                 (json.dumps(cached), compute_seconds, row_id))
+                self._db.commit()
+
+    def invalidate(self, version=None):
+        """
+        Drop every cached response, e.g. after the index changed in this process.
+
+        Parameters:
+            version (str): The new index version (see response_cache_version).
+        """
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+            self._scopes.clear()
+            self._free.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        """
+        Return hit/miss counters, the hit rate and the compute time saved by hits.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries), "compute_seconds_saved": round(self.seconds_saved, 3),
+                "threshold": self.threshold}
@@ -1,45 +1,577 @@
 # src/search.py
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import faiss
 import numpy as np
 
-def build_index(embeddings):
+from src.tracing import span, run_in_context
+
+# Index types accepted by build_index().
+#   flat     - exact L2 scan (IndexFlatL2), the baseline.
+#   flat_ip  - exact inner-product scan over L2-normalized vectors (cosine similarity).
+#   ivf_flat - inverted lists over k-means cells; only nprobe cells are scanned per query.
+#   ivf_pq   - inverted lists with product-quantized codes (m bytes per vector at nbits=8).
+#   hnsw     - hierarchical navigable small-world graph (IndexHNSWFlat); no training needed.
+#   sq8      - exact L2 scan over 8-bit scalar-quantized vectors (IndexScalarQuantizer): 1 byte per dimension.
+#   sq_fp16  - exact L2 scan over float16 vectors: 2 bytes per dimension, no training needed.
+INDEX_TYPES = ("flat", "flat_ip", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16")
+# Index types that must be trained on a sample of the corpus before vectors are added.
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq", "sq8")
+# Index types that keep their vectors in IVF inverted lists (probed with nprobe).
+IVF_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+# Index types that store compressed vectors, so their distances are approximate; searches
+# can re-rank their candidates with the full-precision embeddings (see rerank()).
+QUANTIZED_INDEX_TYPES = ("ivf_pq", "sq8", "sq_fp16")
+# Upper bound for the HNSW search depth when it is scaled up for a selective filter.
+MAX_FILTERED_EF_SEARCH = 1024
+SCALAR_QUANTIZERS = {"sq8": faiss.ScalarQuantizer.QT_8bit, "sq_fp16": faiss.ScalarQuantizer.QT_fp16}
+# Candidates fetched per result when re-ranking (top_k * RERANK_FACTOR).
+RERANK_FACTOR = 4
+
+def default_nlist(num_vectors):
+    """
+    Number of IVF cells for a corpus: about 4 * sqrt(n), capped so that every
+    cell gets at least 39 training points (the minimum FAISS k-means asks for).
+    """
+    return max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+
+def is_inner_product(index):
+    """
+    True if the index ranks by inner product (higher is better) instead of L2 distance.
+    """
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+def add_vectors(index, embeddings):
+    """
+    Add embeddings to an index, normalizing them first for inner-product indexes.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if is_inner_product(index):
+        embeddings = embeddings.copy()
+        faiss.normalize_L2(embeddings)
+    index.add(embeddings)
+
+def build_index(embeddings, index_type="flat", nlist=None, m=None, nbits=8, hnsw_m=32,
+                ef_construction=200, train_size=None, seed=0):
     """
     Build a FAISS index from the provided embeddings.
 
     Parameters:
         embeddings (numpy.ndarray): A 2D array of shape (n_samples, embedding_dimension)
+        index_type (str): One of INDEX_TYPES. "flat" (the default) is an exact L2 scan.
+        nlist (int): Number of IVF cells (ivf_flat / ivf_pq). Defaults to default_nlist(n).
+        m (int): Number of PQ sub-quantizers (ivf_pq); must divide the dimension.
+                 Defaults to dimension // 8.
+        nbits (int): Bits per PQ code (ivf_pq); lowered automatically so that the
+                     2**nbits * 39 training points PQ needs are available.
+        hnsw_m (int): Neighbors per HNSW node.
+        ef_construction (int): HNSW build-time search depth.
+        train_size (int): Number of vectors sampled to train IVF/PQ. Defaults to
+                          max(nlist * 256, 2**nbits * 39), capped at n. For sq8 (which
+                          only learns each dimension's range), defaults to min(n, 100000).
+        seed (int): Random seed for the training sample.
 
     Returns:
         index: A FAISS index object with the embeddings added.
     """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index_type '{index_type}'. Expected one of {INDEX_TYPES}.")
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
     # Determine embedding dimension
-    dimension = embeddings.shape[1]
-    # Create a FAISS index using L2 (Euclidean) distance metric
-    index = faiss.IndexFlatL2(dimension)
+    num_vectors, dimension = embeddings.shape
+
+    if index_type == "flat":
+        # Create a FAISS index using L2 (Euclidean) distance metric
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "flat_ip":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    elif index_type in SCALAR_QUANTIZERS:
+        index = faiss.IndexScalarQuantizer(dimension, SCALAR_QUANTIZERS[index_type], faiss.METRIC_L2)
+        if not index.is_trained:
+            train_size = min(num_vectors, train_size or 100000)
+            sample_ids = np.random.default_rng(seed).choice(num_vectors, size=train_size, replace=False)
+            index.train(embeddings[np.sort(sample_ids)])
+    else:
+        nlist = nlist or default_nlist(num_vectors)
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+            min_train = nlist * 39
+        else:
+            m = m or max(1, dimension // 8)
+            if dimension % m != 0:
+                raise ValueError(f"m={m} must divide the embedding dimension {dimension}.")
+            # k-means over the 2**nbits centroids of each sub-quantizer wants 39 points per centroid.
+            nbits = max(1, min(nbits, int(np.log2(max(2, num_vectors // 39)))))
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, nbits)
+            min_train = max(nlist, 2 ** nbits) * 39
+
+        # Train on a random sample rather than the whole corpus.
+        train_size = min(num_vectors, max(train_size or 0, min_train, nlist * 256))
+        rng = np.random.default_rng(seed)
+        sample_ids = rng.choice(num_vectors, size=train_size, replace=False)
+        index.train(embeddings[np.sort(sample_ids)])
+        # Default probe count; override per query with search(..., nprobe=...).
+        index.nprobe = max(1, nlist // 16)
+
     # Add embeddings to the index
-    index.add(embeddings)
+    add_vectors(index, embeddings)
     print(f"FAISS index built with {index.ntotal} vectors.")
     return index
 
-def search(index, query_embedding, top_k=5):
+def estimate_index_memory(num_vectors, dimension, index_type="flat", nlist=None, m=None, nbits=8, hnsw_m=32):
+    """
+    Estimate the resident size of an index in bytes (vectors, codes, ids and
+    graph links; small constant overheads are ignored).
+
+    Parameters:
+        num_vectors (int): Number of indexed vectors.
+        dimension (int): Embedding dimension.
+        index_type (str): One of INDEX_TYPES.
+        nlist, m, nbits, hnsw_m: The same settings as build_index().
+
+    Returns:
+        int: Estimated size in bytes.
+    """
+    vector_bytes = num_vectors * dimension * 4
+    if index_type in ("flat", "flat_ip"):
+        return vector_bytes
+    if index_type == "sq8":
+        return num_vectors * dimension
+    if index_type == "sq_fp16":
+        return num_vectors * dimension * 2
+    if index_type == "hnsw":
+        # Level 0 stores 2 * hnsw_m int32 links per node; upper levels add about 1/hnsw_m of that.
+        links = num_vectors * 2 * hnsw_m * 4 * (1 + 1 / hnsw_m)
+        return int(vector_bytes + links)
+    nlist = nlist or default_nlist(num_vectors)
+    centroids = nlist * dimension * 4
+    ids = num_vectors * 8
+    if index_type == "ivf_flat":
+        return vector_bytes + centroids + ids
+    m = m or max(1, dimension // 8)
+    codes = num_vectors * int(np.ceil(m * nbits / 8))
+    codebooks = m * (2 ** nbits) * (dimension // m) * 4
+    return codes + centroids + ids + codebooks
+
+def allowed_mask(allowed_ids, num_vectors):
+    """
+    Boolean mask of length num_vectors from allowed ids given as a mask or an id array.
+    A mask of the right length is returned as is (not copied).
+    """
+    allowed_ids = np.asarray(allowed_ids)
+    if allowed_ids.dtype == bool and len(allowed_ids) == num_vectors:
+        return allowed_ids
+    mask = np.zeros(num_vectors, dtype=bool)
+    if allowed_ids.dtype == bool:
+        count = min(len(allowed_ids), num_vectors)
+        mask[:count] = allowed_ids[:count]
+        return mask
+    allowed_ids = allowed_ids.astype(np.int64)
+    mask[allowed_ids[(allowed_ids >= 0) & (allowed_ids < num_vectors)]] = True
+    return mask
+
+def make_id_selector(excluded_ids=None, allowed_ids=None, num_vectors=None):
+    """
+    Build a FAISS ID selector that skips the given ids (e.g. tombstoned articles)
+    and, if allowed_ids is given, everything outside the allowed subset (e.g. a
+    metadata filter, see src.metadata_filter).
+
+    Parameters:
+        excluded_ids (array-like): Index ids that must never be returned.
+        allowed_ids (array-like): Boolean mask or ids of the searchable subset (None = all).
+        num_vectors (int): Number of vectors in the index; required with allowed_ids.
+
+    Returns:
+        faiss.IDSelector: The selector, or None if there is nothing to filter.
+    """
+    if allowed_ids is not None:
+        # A bitmap makes the membership test O(1) per id inside the scan.
+        mask = allowed_mask(allowed_ids, num_vectors)
+        if excluded_ids is not None and len(excluded_ids) > 0:
+            excluded_ids = np.asarray(excluded_ids, dtype=np.int64)
+            mask = mask.copy()
+            mask[excluded_ids[(excluded_ids >= 0) & (excluded_ids < num_vectors)]] = False
+        return faiss.IDSelectorBitmap(np.packbits(mask, bitorder="little"))
+    if excluded_ids is None or len(excluded_ids) == 0:
+        return None
+    excluded_ids = np.ascontiguousarray(excluded_ids, dtype=np.int64)
+    return faiss.IDSelectorNot(faiss.IDSelectorBatch(excluded_ids))
+
+def make_search_params(index, selector=None, nprobe=None, ef_search=None, allowed_fraction=1.0):
+    """
+    Build per-query FAISS search parameters for the given index type.
+
+    With a selective filter, the index's default nprobe and efSearch are scaled
+    by 1 / allowed_fraction, so about as many allowed vectors are visited as an
+    unfiltered search visits vectors (capped at nlist and MAX_FILTERED_EF_SEARCH).
+    Values passed by the caller are used as they are.
+
+    Parameters:
+        index: A FAISS index object.
+        selector (faiss.IDSelector): Optional id filter.
+        nprobe (int): IVF cells to scan (IVF indexes only; default: index.nprobe, scaled).
+        ef_search (int): HNSW search depth (HNSW indexes only; default: index.hnsw.efSearch, scaled).
+        allowed_fraction (float): Fraction of the vectors the selector lets through.
+
+    Returns:
+        faiss.SearchParameters: The parameters, or None if all defaults apply.
+    """
+    if selector is None and nprobe is None and ef_search is None:
+        return None
+    kwargs = {}
+    if selector is not None:
+        kwargs["sel"] = selector
+    scale = 1.0 / max(allowed_fraction, 1e-9)
+    # Parameter objects carry their own defaults (nprobe=1, efSearch=16), so the
+    # index's settings are copied in unless the caller overrides them.
+    if isinstance(index, faiss.IndexIVF):
+        if nprobe is None:
+            nprobe = min(index.nlist, int(np.ceil(index.nprobe * scale)))
+        return faiss.SearchParametersIVF(nprobe=nprobe, **kwargs)
+    if isinstance(index, faiss.IndexHNSW):
+        if ef_search is None:
+            ef_search = max(index.hnsw.efSearch, min(MAX_FILTERED_EF_SEARCH, int(np.ceil(index.hnsw.efSearch * scale))))
+        return faiss.SearchParametersHNSW(efSearch=ef_search, **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
+def _search_with_selector(index, queries, k, selector, allowed_fraction=1.0, nprobe=None, ef_search=None):
+    # One FAISS call with the filter applied inside the scan.
+    params = make_search_params(index, selector, nprobe=nprobe, ef_search=ef_search, allowed_fraction=allowed_fraction)
+    if params is None:
+        return index.search(queries, k)
+    distances, indices = index.search(queries, k, params=params)
+    # The allowed vectors can sit in other cells than the probed ones (filters follow topics);
+    # if a filtered IVF search came back short, probe every cell, which is exact over the subset.
+    if (allowed_fraction < 1 and nprobe is None and isinstance(index, faiss.IndexIVF)
+            and params.nprobe < index.nlist and (indices < 0).any()):
+        params.nprobe = index.nlist
+        distances, indices = index.search(queries, k, params=params)
+    return distances, indices
+
+def prepare_queries(index, query_embeddings):
+    """
+    Convert query embeddings to the 2D float32 layout FAISS expects,
+    normalizing them for inner-product indexes.
+    """
+    queries = np.array(query_embeddings, dtype=np.float32).reshape(-1, index.d)
+    if is_inner_product(index):
+        faiss.normalize_L2(queries)
+    return queries
+
+def distances_to_similarities(index, distances):
+    """
+    Map FAISS scores to similarities where higher is better.
+
+    Inner-product scores already are similarities; L2 distances are inverted
+    as 1 / (1 + distance).
+    """
+    distances = np.asarray(distances, dtype=np.float32)
+    if is_inner_product(index):
+        return distances
+    return 1 / (1 + distances)
+
+class ShardedIndex:
+    def __init__(self, shards, shard_ids, max_workers=None):
+        """
+        Scatter-gather search over several FAISS indexes (shards) that each hold
+        a disjoint part of the vectors (see src.sharding). A query is sent to
+        every shard in parallel threads (FAISS releases the GIL while it
+        searches) and the per-shard top-k lists are merged with faiss.ResultHeap.
+        search() and batch_search() accept it in place of a FAISS index.
+
+        Parameters:
+            shards (list): FAISS indexes of the same dimension and metric, using local ids.
+            shard_ids (list): Per shard, the int64 array mapping local id j to its global id.
+            max_workers (int): Threads searching shards at the same time (default: one per shard).
+        """
+        self.shards = list(shards)
+        self.shard_ids = [np.asarray(ids, dtype=np.int64) for ids in shard_ids]
+        self.d = self.shards[0].d
+        self.metric_type = self.shards[0].metric_type
+        self.ntotal = sum(shard.ntotal for shard in self.shards)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.shards), thread_name_prefix="shard")
+
+    @property
+    def num_shards(self):
+        return len(self.shards)
+
+    def _search_shard(self, position, queries, k, mask, nprobe, ef_search):
+        shard, ids = self.shards[position], self.shard_ids[position]
+        selector = None
+        if mask is not None:
+            local_mask = mask[ids]
+            if not local_mask.any():
+                return None
+            if not local_mask.all():
+                selector = faiss.IDSelectorBitmap(np.packbits(local_mask, bitorder="little"))
+        allowed_fraction = float(local_mask.mean()) if mask is not None else 1.0
+        with span("faiss_shard_search", shard=position):
+            distances, indices = _search_with_selector(shard, queries, k, selector, allowed_fraction, nprobe=nprobe,
+                                                       ef_search=ef_search)
+        # Map local ids to global ones; -1 padding stays -1.
+        return distances, np.where(indices >= 0, ids[np.maximum(indices, 0)], -1)
+
+    def search(self, queries, k, excluded_ids=None, allowed_ids=None, nprobe=None, ef_search=None):
+        """
+        Search every shard and merge the results.
+
+        Parameters:
+            queries (numpy.ndarray): Prepared float32 queries, shape (q, d).
+            k (int): Results per query.
+            excluded_ids, allowed_ids: Global ids, as in src.search.search().
+            nprobe, ef_search: Per-shard search settings, as in src.search.search().
+
+        Returns:
+            distances, indices: Arrays of shape (q, k) with global ids, padded like FAISS.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        # One global mask of searchable ids; each shard takes its slice.
+        mask = None
+        if allowed_ids is not None:
+            mask = allowed_mask(allowed_ids, self.ntotal).copy()
+        if excluded_ids is not None and len(excluded_ids) > 0:
+            mask = np.ones(self.ntotal, dtype=bool) if mask is None else mask
+            excluded_ids = np.asarray(excluded_ids, dtype=np.int64)
+            mask[excluded_ids[(excluded_ids >= 0) & (excluded_ids < self.ntotal)]] = False
+        futures = [
+            self._executor.submit(run_in_context(self._search_shard, position, queries, k, mask, nprobe, ef_search))
+            for position in range(self.num_shards)
+        ]
+        heap = faiss.ResultHeap(len(queries), k, keep_max=is_inner_product(self))
+        for future in futures:
+            result = future.result()
+            if result is not None:
+                heap.add_result(np.ascontiguousarray(result[0]), np.ascontiguousarray(result[1]))
+        heap.finalize()
+        return heap.D, heap.I
+
+def _search_index(index, queries, k, excluded_ids=None, allowed_ids=None, nprobe=None, ef_search=None):
+    # One FAISS call (or one scatter-gather over the shards of a ShardedIndex).
+    if isinstance(index, ShardedIndex):
+        return index.search(queries, k, excluded_ids=excluded_ids, allowed_ids=allowed_ids, nprobe=nprobe,
+                            ef_search=ef_search)
+    selector = make_id_selector(excluded_ids, allowed_ids, index.ntotal)
+    allowed_fraction = float(allowed_mask(allowed_ids, index.ntotal).mean()) if allowed_ids is not None else 1.0
+    return _search_with_selector(index, queries, k, selector, allowed_fraction, nprobe=nprobe, ef_search=ef_search)
+
+def _is_filtered(excluded_ids, allowed_ids):
+    return allowed_ids is not None or (excluded_ids is not None and len(excluded_ids) > 0)
+
+def rerank(index, embeddings, queries, indices, top_k):
+    """
+    Re-score candidates with exact distances computed from the full-precision
+    embeddings (typically the memory-mapped embeddings file, so only the
+    candidate rows are read) and keep the best top_k per query.
+
+    Parameters:
+        index: The FAISS index the candidates came from (for its metric).
+        embeddings (numpy.ndarray): Float32 embeddings, row i = index id i.
+        queries (numpy.ndarray): Prepared query embeddings (see prepare_queries), shape (q, d).
+        indices (numpy.ndarray): Candidate ids, shape (q, c); -1 marks padding.
+        top_k (int): Results to keep per query.
+
+    Returns:
+        indices, distances: Arrays of shape (q, top_k), padded like FAISS (-1 ids).
+    """
+    inner_product = is_inner_product(index)
+    padding = -np.finfo(np.float32).max if inner_product else np.finfo(np.float32).max
+    reranked_indices = np.full((len(queries), top_k), -1, dtype=np.int64)
+    reranked_distances = np.full((len(queries), top_k), padding, dtype=np.float32)
+    for row, (query, candidates) in enumerate(zip(queries, indices)):
+        # Rows are gathered in id order, which keeps memory-mapped reads sequential.
+        candidates = np.sort(candidates[candidates >= 0])
+        if len(candidates) == 0:
+            continue
+        vectors = np.asarray(embeddings[candidates], dtype=np.float32)
+        if inner_product:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            distances = vectors @ query
+            order = np.argsort(-distances, kind="stable")[:top_k]
+        else:
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            order = np.argsort(distances, kind="stable")[:top_k]
+        reranked_indices[row, :len(order)] = candidates[order]
+        reranked_distances[row, :len(order)] = distances[order]
+    return reranked_indices, reranked_distances
+
+def search(index, query_embedding, top_k=5, excluded_ids=None, nprobe=None, ef_search=None, allowed_ids=None,
+           rerank_embeddings=None, rerank_factor=RERANK_FACTOR):
     """
     Search the FAISS index for the top_k nearest neighbors to the query embedding.
     
     Parameters:
-        index: A FAISS index object.
+        index: A FAISS index object (or a ShardedIndex).
         query_embedding (numpy.ndarray): The embedding of the query text, as a 1D array.
         top_k (int): Number of nearest neighbors to retrieve.
+        excluded_ids (array-like): Optional index ids to skip inside the FAISS scan
+                                   (e.g. retracted articles).
+        allowed_ids (array-like): Optional boolean mask or ids of the only vectors to
+                                  search (e.g. from src.metadata_filter). Vectors outside
+                                  it are skipped before their distance is computed.
+                                  The default nprobe (IVF) and ef_search (HNSW) are
+                                  scaled up by the inverse of the allowed fraction (see
+                                  make_search_params), and an IVF search that still
+                                  returns fewer than fetch_k results is repeated over all
+                                  cells, so selective filters do not lose results. HNSW
+                                  depth is capped at MAX_FILTERED_EF_SEARCH; pass a larger
+                                  ef_search for very selective filters.
+        nprobe (int): IVF cells to scan for this query (IVF indexes only; not scaled if given).
+        ef_search (int): HNSW search depth for this query (HNSW indexes only; not scaled if given).
+        rerank_embeddings (numpy.ndarray): Optional full-precision embeddings (e.g. the
+                                           memory-mapped embeddings file). If given,
+                                           top_k * rerank_factor candidates are fetched
+                                           and re-ranked exactly (see rerank()); useful
+                                           with QUANTIZED_INDEX_TYPES.
+        rerank_factor (int): Candidates fetched per result when re-ranking.
     
     Returns:
         indices: Indices of the retrieved nearest neighbors.
-        distances: Distance values corresponding to the retrieved neighbors.
+        distances: Distance values corresponding to the retrieved neighbors
+                   (inner-product scores for flat_ip indexes).
     """
     # Ensure query_embedding is a 2D array as FAISS expects shape (1, dimension)
-    query_embedding = np.array(query_embedding).reshape(1, -1)
-    distances, indices = index.search(query_embedding, top_k)
+    query_embedding = prepare_queries(index, query_embedding)
+    fetch_k = top_k * rerank_factor if rerank_embeddings is not None else top_k
+    with span("faiss_search", top_k=fetch_k, filtered=_is_filtered(excluded_ids, allowed_ids)):
+        distances, indices = _search_index(index, query_embedding, fetch_k, excluded_ids, allowed_ids,
+                                           nprobe=nprobe, ef_search=ef_search)
+    if rerank_embeddings is not None:
+        with span("exact_rerank", candidates=fetch_k):
+            indices, distances = rerank(index, rerank_embeddings, query_embedding, indices, top_k)
+    return indices, distances
+
+def set_num_threads(num_threads):
+    """
+    Set the number of OpenMP threads FAISS uses for searches and index builds.
+    """
+    faiss.omp_set_num_threads(num_threads)
+
+def batch_search(index, queries, top_k=5, batch_size=1024, excluded_ids=None, nprobe=None,
+                 ef_search=None, num_threads=None, allowed_ids=None, rerank_embeddings=None,
+                 rerank_factor=RERANK_FACTOR):
+    """
+    Search the FAISS index for many queries at once.
+
+    Query strings are encoded in batches with src.embedding.get_embeddings, and
+    each chunk of batch_size queries is answered by a single FAISS call.
+
+    Parameters:
+        index: A FAISS index object (or a ShardedIndex).
+        queries (list or numpy.ndarray): Query strings, or a 2D array of query embeddings.
+        top_k (int): Number of nearest neighbors to retrieve per query.
+        batch_size (int): Queries per encode call and per FAISS call.
+        excluded_ids (array-like): Optional index ids to skip inside the FAISS scan.
+        nprobe (int): IVF cells to scan (IVF indexes only).
+        ef_search (int): HNSW search depth (HNSW indexes only).
+        num_threads (int): If set, the number of OpenMP threads FAISS may use.
+        allowed_ids (array-like): Optional boolean mask or ids of the only vectors to search.
+        rerank_embeddings (numpy.ndarray): Optional full-precision embeddings for exact re-ranking (see search()).
+        rerank_factor (int): Candidates fetched per result when re-ranking.
+
+    Returns:
+        indices: Array of shape (num_queries, top_k); row i holds the results of query i.
+        distances: Array of shape (num_queries, top_k) with the matching distances.
+    """
+    if num_threads is not None:
+        set_num_threads(num_threads)
+
+    if len(queries) > 0 and isinstance(queries[0], str):
+        # Imported here so index-only callers do not load the embedding model.
+        from src.embedding import get_embeddings
+        query_embeddings = get_embeddings(queries, batch_size=batch_size)
+    else:
+        query_embeddings = queries
+    query_embeddings = prepare_queries(index, query_embeddings)
+
+    fetch_k = top_k * rerank_factor if rerank_embeddings is not None else top_k
+    indices = np.empty((len(query_embeddings), top_k), dtype=np.int64)
+    distances = np.empty((len(query_embeddings), top_k), dtype=np.float32)
+    for start in range(0, len(query_embeddings), batch_size):
+        chunk = query_embeddings[start:start + batch_size]
+        with span("faiss_batch_search", queries=len(chunk), top_k=fetch_k):
+            chunk_distances, chunk_indices = _search_index(index, chunk, fetch_k, excluded_ids, allowed_ids,
+                                                           nprobe=nprobe, ef_search=ef_search)
+        if rerank_embeddings is not None:
+            with span("exact_rerank", queries=len(chunk), candidates=fetch_k):
+                chunk_indices, chunk_distances = rerank(index, rerank_embeddings, chunk, chunk_indices, top_k)
+        indices[start:start + len(chunk)] = chunk_indices
+        distances[start:start + len(chunk)] = chunk_distances
     return indices, distances
 
+def compare_index_modes(embeddings, query_embeddings, top_k=10, modes=INDEX_TYPES, nprobe=None, ef_search=None,
+                        rerank_factor=RERANK_FACTOR):
+    """
+    Report recall@k and latency of each index mode against the exact flat baseline.
+
+    Parameters:
+        embeddings (numpy.ndarray): Corpus embeddings, shape (n, d).
+        query_embeddings (numpy.ndarray): Query embeddings, shape (q, d).
+        top_k (int): k for recall@k.
+        modes (tuple): Index types to compare.
+        nprobe (int): IVF cells to scan per query.
+        ef_search (int): HNSW search depth.
+        rerank_factor (int): If set, quantized modes (QUANTIZED_INDEX_TYPES) get a second
+                             "<mode>+rerank" row with exact re-ranking of top_k * rerank_factor
+                             candidates from the full-precision embeddings.
+
+    Returns:
+        list: One dict per mode with build_seconds, ms_per_query, recall_at_k, memory_mb
+              (for this corpus) and mb_per_million (index memory per million vectors).
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+    num_vectors, dimension = embeddings.shape
+
+    # Exact ground truth, in the metric each mode ranks by.
+    ground_truth = {}
+    for metric_mode in ("flat", "flat_ip"):
+        exact = build_index(embeddings, index_type=metric_mode)
+        ground_truth[metric_mode] = exact.search(prepare_queries(exact, query_embeddings), top_k)[1]
+
+    report = []
+    for mode in modes:
+        start = time.perf_counter()
+        index = build_index(embeddings, index_type=mode)
+        build_seconds = time.perf_counter() - start
+
+        queries = prepare_queries(index, query_embeddings)
+        truth = ground_truth["flat_ip" if mode == "flat_ip" else "flat"]
+        variants = [(mode, None)]
+        if rerank_factor and mode in QUANTIZED_INDEX_TYPES:
+            variants.append((f"{mode}+rerank", embeddings))
+        for name, rerank_embeddings in variants:
+            retrieved = []
+            start = time.perf_counter()
+            # One query at a time, as in the interactive request path.
+            for query in queries:
+                indices, _ = search(index, query, top_k, nprobe=nprobe, ef_search=ef_search,
+                                    rerank_embeddings=rerank_embeddings, rerank_factor=rerank_factor)
+                retrieved.append(indices[0])
+            ms_per_query = (time.perf_counter() - start) * 1000 / len(queries)
+
+            hits = sum(len(set(truth[i]) & set(retrieved[i])) for i in range(len(queries)))
+            report.append({
+                "index_type": name,
+                "build_seconds": round(build_seconds, 4),
+                "ms_per_query": round(ms_per_query, 4),
+                "recall_at_k": round(hits / (len(queries) * top_k), 4),
+                "memory_mb": round(estimate_index_memory(num_vectors, dimension, mode) / 1e6, 2),
+                "mb_per_million": round(estimate_index_memory(10**6, dimension, mode) / 1e6, 1),
+            })
+
+    print(f"{'index_type':<14} {'build_s':>9} {'ms/query':>9} {'recall@' + str(top_k):>10} {'mem_MB':>9} "
+          f"{'MB/1M':>8}")
+    for row in report:
+        print(f"{row['index_type']:<14} {row['build_seconds']:>9} {row['ms_per_query']:>9} "
+              f"{row['recall_at_k']:>10} {row['memory_mb']:>9} {row['mb_per_million']:>8}")
+    return report
+
 if __name__ == '__main__':
     # test purposes:
     
@@ -54,5 +586,13 @@ if __name__ == '__main__':
     
     print("Retrieved indices:", indices)
     print("Distances:", distances)
+    
+    # Recall@k vs. latency of the approximate index modes against the flat baseline.
+    dummy_queries = np.random.rand(100, 384).astype('float32')
+    compare_index_modes(dummy_embeddings, dummy_queries, top_k=10)
+    
+    # Many queries answered by one FAISS call.
+    batch_indices, batch_distances = batch_search(index, dummy_queries, top_k=top_k)
+    print("Batch search result shape:", batch_indices.shape)
 
 
@@ -0,0 +1,571 @@
+# src/server.py
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from src.artifact_store import (
+    load_or_build, load_tombstones, KEYWORD_INDEX_FILE, ENTITY_INDEX_FILE, SUMMARY_CACHE_FILE, RESPONSE_CACHE_FILE,
+)
+from src.agent2 import retrieve_articles, summarize_articles, combine_summaries
+from src.linkedin_post import generate_linkedin_post, stream_linkedin_post
+from src.router import route_request
+from src.summarization import set_summary_cache, SummaryCache, stream_summary_local
+from src.models import warmup, load_report
+from src.batching import enable_micro_batching, batching_stats
+from src.metadata_filter import MetadataIndex, FILTER_FIELDS
+from src.tracing import start_trace, span, run_in_context, metrics_snapshot, export_prometheus
+from src.streaming import iterate_in_thread
+from src.entity_index import load_entity_index
+from src.backends import set_num_threads
+from src.search import QUANTIZED_INDEX_TYPES
+from src.sharding import SHARD_BY
+from src.response_cache import ResponseCache, SIMILARITY_THRESHOLD, response_scope, response_cache_version
+
+# Hybrid search is optional (it needs scikit-learn).
+try:
+    from src.hybrid_search import load_or_build_hybrid_search
+except ImportError:
+    load_or_build_hybrid_search = None
+
+# Largest request body accepted, in bytes.
+MAX_BODY_BYTES = 1 << 20
+# Content type of the Prometheus text exposition format (GET /metrics).
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+class ServiceBusy(Exception):
+    """Raised when the request queue is full."""
+
+class QueryService:
+    def __init__(self, data, index, excluded_ids=None, hybrid_search=None, retrieval_workers=4,
+                 model_workers=1, max_concurrency=8, max_queue=64, entity_index=None, rerank_embeddings=None,
+                 response_cache=None):
+        """
+        Resident query service: keeps the dataset, FAISS index, keyword index and
+        loaded models in memory and answers requests through route_request.
+
+        Retrieval (query embedding, FAISS, BM25) and model inference (BART, GPT-2)
+        run on separate bounded thread pools, so slow generation does not block
+        retrieval for other requests.
+
+        Parameters:
+            data (ArticleStore): The article metadata (see src.article_store).
+            index (faiss.Index): The FAISS index over the article embeddings.
+            excluded_ids (array-like): Tombstoned index ids.
+            hybrid_search (HybridSearch): Prebuilt keyword index (None = semantic only).
+            retrieval_workers (int): Threads for retrieval.
+            model_workers (int): Threads for summarization and post generation.
+            max_concurrency (int): Requests processed at the same time.
+            max_queue (int): Requests accepted (processing + waiting) before new ones are rejected.
+            entity_index (EntityIndex): Precomputed entity index used to boost articles
+                                        mentioning the query's entities (None = no boost).
+            rerank_embeddings (numpy.ndarray): Memory-mapped float32 embeddings used to re-rank
+                                               the candidates of a quantized index exactly.
+            response_cache (ResponseCache): Semantic cache of whole responses (None = off);
+                                            near-paraphrases of an earlier query reuse its
+                                            articles, summaries and post.
+        """
+        self.data = data
+        self.index = index
+        self.excluded_ids = excluded_ids
+        self.hybrid_search = hybrid_search
+        self.entity_index = entity_index
+        self.rerank_embeddings = rerank_embeddings
+        self.response_cache = response_cache
+        self.metadata_index = MetadataIndex(data)
+        self.max_queue = max_queue
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="retrieval")
+        self.model_executor = ThreadPoolExecutor(max_workers=model_workers, thread_name_prefix="model")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.pending = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0  # requests that raised (counted once, not in completed)
+        self.rejected = 0
+
+    @classmethod
+    def from_store(cls, file_path, store_dir, index_type="flat", num_shards=1, shard_by="hash", build_workers=None,
+                   response_cache_size=1024, response_cache_ttl=3600, response_cache_threshold=SIMILARITY_THRESHOLD,
+                   **kwargs):
+        """
+        Load (or build) the artifacts the same way main.py does and wrap them in a service.
+        num_shards, shard_by and build_workers are passed to load_or_build (see src.sharding).
+        The response cache (see src.response_cache) keeps up to response_cache_size
+        responses for response_cache_ttl seconds (size 0 disables it).
+
+        Returns:
+            QueryService: The service, or None if the data could not be loaded.
+        """
+        artifacts = load_or_build(file_path, store_dir, text_column='short_description', index_type=index_type,
+                                  num_shards=num_shards, shard_by=shard_by, num_workers=build_workers)
+        if artifacts is None:
+            return None
+        data, embeddings, index = artifacts
+        hybrid_search = None
+        if load_or_build_hybrid_search is not None:
+            hybrid_search = load_or_build_hybrid_search(data, os.path.join(store_dir, KEYWORD_INDEX_FILE),
+                                                        tfidf_field="short_description")
+        set_summary_cache(SummaryCache(max_size=1024, ttl=7 * 24 * 3600,
+                                       db_path=os.path.join(store_dir, SUMMARY_CACHE_FILE)))
+        # Built by scripts/build_entity_index.py; without it retrieval has no entity boost.
+        entity_index = load_entity_index(data, os.path.join(store_dir, ENTITY_INDEX_FILE))
+        response_cache = None
+        if response_cache_size > 0:
+            # Responses cached by an earlier run over a different index are dropped on open.
+            response_cache = ResponseCache(max_size=response_cache_size, ttl=response_cache_ttl,
+                                           threshold=response_cache_threshold,
+                                           version=response_cache_version(store_dir),
+                                           db_path=os.path.join(store_dir, RESPONSE_CACHE_FILE))
+        return cls(data, index, excluded_ids=load_tombstones(store_dir), hybrid_search=hybrid_search,
+                   entity_index=entity_index, response_cache=response_cache,
+                   rerank_embeddings=embeddings if index_type in QUANTIZED_INDEX_TYPES else None, **kwargs)
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Spans opened in the worker thread are recorded in this request's trace.
+        return await loop.run_in_executor(executor, run_in_context(func, *args, **kwargs))
+
+    async def _cached_response(self, user_query, scope):
+        # Returns (query embedding, cache hit or None); the embedding is reused by retrieval and put().
+        if self.response_cache is None:
+            return None, None
+        return await self._run(self.retrieval_executor, self.response_cache.lookup_query, user_query, scope)
+
+    def _cache_response(self, embedding, scope, indices, summaries, compute_seconds, post=None, post_seconds=0.0):
+        if self.response_cache is not None and embedding is not None:
+            self.response_cache.put(embedding, scope, indices, summaries, compute_seconds, post=post,
+                                    post_seconds=post_seconds)
+
+    def _cache_post(self, hit, post, post_seconds):
+        # Stores the post generated for a cache hit that had none in the hit's entry.
+        if self.response_cache is not None:
+            self.response_cache.add_post(hit[0], post, post_seconds)
+
+    def _articles(self, indices, summaries):
+        articles = self.data.gather(indices, fields=["headline", "short_description"])
+        return [
+            {
+                "index": int(idx),
+                "headline": article.get("headline", "No Headline"),
+                "short_description": article.get("short_description", ""),
+                "summary": summary,
+            }
+            for idx, article, summary in zip(indices, articles, summaries)
+        ]
+
+    async def handle_query(self, user_query, extra_data="", filters=None, trace=False):
+        """
+        Answer one query. Mirrors the branches of main.main().
+
+        Parameters:
+            user_query (str): The user's query.
+            extra_data (str): Additional data for LinkedIn post generation (empty if none).
+            filters (dict): Explicit metadata filters (see MetadataIndex.select); if None,
+                            filters named in the query text are applied (see MetadataIndex.extract_filters).
+            trace (bool): Add the per-stage timings of this request (src.tracing) to the result.
+
+        Returns:
+            dict: The agent used, the filters applied ({} if none) and its result.
+        """
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise ServiceBusy()
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    with start_trace("request") as request_trace:
+                        response = await self._answer(user_query, extra_data, filters)
+                    if trace:
+                        response["trace"] = request_trace.to_dict()
+                finally:
+                    self.in_flight -= 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return response
+
+    async def stream_query(self, user_query, extra_data="", filters=None):
+        """
+        Answer one query as a stream of events, so clients can show the first
+        words of summaries and posts while the rest is generated.
+
+        Yields:
+            dict: {"type": "agent", "agent", "filters"} first; then
+                  {"type": "article", "index", "headline", "short_description"} per article,
+                  {"type": "summary", "index", "text"} and {"type": "post", "text"} per piece
+                  of streamed text; {"type": "done"} last. Responses served from the response
+                  cache add "cached_similarity" to the article events and send each summary
+                  and the post as a single piece.
+        """
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise ServiceBusy()
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    async for event in self._stream_answer(user_query, extra_data, filters):
+                        yield event
+                finally:
+                    self.in_flight -= 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+
+    async def _stream_answer(self, user_query, extra_data, filters=None):
+        agent, data_provided, applied_filters, allowed_ids = self._route(user_query, extra_data, filters)
+        yield {"type": "agent", "agent": agent, "filters": applied_filters}
+
+        if agent == "Agent2":
+            # Only this opt-in route streams summaries; they are single-beam, so they are
+            # cached apart from the batched beam-search ones of the JSON route.
+            scope = response_scope(agent, applied_filters, top_k=3, streamed=True)
+            embedding, hit = await self._cached_response(user_query, scope)
+            if hit is not None:
+                # A cached response is sent as whole summaries instead of streamed pieces.
+                cached, similarity, _ = hit
+                for article in self._articles(cached["indices"], cached["summaries"]):
+                    summary = article.pop("summary")
+                    yield {"type": "article", "cached_similarity": round(similarity, 4), **article}
+                    yield {"type": "summary", "index": article["index"], "text": summary}
+            else:
+                start = time.perf_counter()
+                indices = await self._run(self.retrieval_executor, retrieve_articles, user_query, self.data,
+                                          self.index, top_k=3, excluded_ids=self.excluded_ids, allowed_ids=allowed_ids,
+                                          entity_index=self.entity_index, rerank_embeddings=self.rerank_embeddings)
+                summaries = []
+                for article in self._articles(indices, [""] * len(indices)):
+                    del article["summary"]
+                    yield {"type": "article", **article}
+                    chunks = stream_summary_local(article["short_description"], deterministic=True)
+                    pieces = []
+                    async for text in iterate_in_thread(chunks, self.model_executor):
+                        pieces.append(text)
+                        yield {"type": "summary", "index": article["index"], "text": text}
+                    summaries.append("".join(pieces))
+                self._cache_response(embedding, scope, indices, summaries, time.perf_counter() - start)
+        else:
+            embedding, hit, post = None, None, None
+            if data_provided:
+                post_input, mode = f"{user_query}. Additional details: {extra_data}", "dynamic"
+            else:
+                scope = response_scope(agent, applied_filters, top_k=2, alpha=0.5)
+                embedding, hit = await self._cached_response(user_query, scope)
+                start = time.perf_counter()
+                if hit is not None:
+                    cached, similarity, _ = hit
+                    indices, summaries, post = cached["indices"], cached["summaries"], cached.get("post")
+                else:
+                    indices = await self._run(self.retrieval_executor, retrieve_articles, user_query, self.data,
+                                              self.index, top_k=2, use_hybrid=True, alpha=0.5,
+                                              excluded_ids=self.excluded_ids, hybrid_search=self.hybrid_search,
+                                              allowed_ids=allowed_ids, entity_index=self.entity_index,
+                                              rerank_embeddings=self.rerank_embeddings)
+                    summaries = await self._run(self.model_executor, summarize_articles, self.data, indices,
+                                                deterministic=True)
+                compute_seconds = time.perf_counter() - start
+                for article in self._articles(indices, summaries):
+                    if hit is not None:
+                        article["cached_similarity"] = round(similarity, 4)
+                    yield {"type": "article", **article}
+                post_input, mode = combine_summaries(summaries), "default"
+            if post is not None:
+                yield {"type": "post", "text": post}
+            else:
+                start = time.perf_counter()
+                pieces = []
+                chunks = stream_linkedin_post(post_input, mode=mode, max_iterations=3)
+                async for text in iterate_in_thread(chunks, self.model_executor):
+                    pieces.append(text)
+                    yield {"type": "post", "text": text}
+                if hit is not None:
+                    self._cache_post(hit, "".join(pieces), time.perf_counter() - start)
+                elif embedding is not None:
+                    self._cache_response(embedding, scope, indices, summaries, compute_seconds, post="".join(pieces),
+                                         post_seconds=time.perf_counter() - start)
+        yield {"type": "done"}
+
+    def _route(self, user_query, extra_data, filters=None):
+        data_provided = bool(extra_data)
+        with span("router") as attributes:
+            agent = attributes["agent"] = route_request(user_query, data_provided)
+        with span("metadata_filter"):
+            applied_filters, allowed_ids = self.metadata_index.filter_for_query(user_query, filters)
+        return agent, data_provided, applied_filters, allowed_ids
+
+    async def _answer(self, user_query, extra_data, filters=None):
+        agent, data_provided, applied_filters, allowed_ids = self._route(user_query, extra_data, filters)
+        # The filters are always reported, so clients can tell a filtered answer from an unfiltered one.
+        response = {"agent": agent, "filters": applied_filters}
+
+        if agent == "Agent2":
+            scope = response_scope(agent, applied_filters, top_k=3, streamed=False)
+            embedding, hit = await self._cached_response(user_query, scope)
+            if hit is not None:
+                cached, similarity, _ = hit
+                indices, summaries = cached["indices"], cached["summaries"]
+                response["cached_similarity"] = round(similarity, 4)
+            else:
+                start = time.perf_counter()
+                indices = await self._run(self.retrieval_executor, retrieve_articles, user_query, self.data,
+                                          self.index, top_k=3, excluded_ids=self.excluded_ids, allowed_ids=allowed_ids,
+                                          entity_index=self.entity_index, rerank_embeddings=self.rerank_embeddings)
+                summaries = await self._run(self.model_executor, summarize_articles, self.data, indices,
+                                            deterministic=True)
+                self._cache_response(embedding, scope, indices, summaries, time.perf_counter() - start)
+            response["articles"] = self._articles(indices, summaries)
+        elif data_provided:
+            combined_input = f"{user_query}. Additional details: {extra_data}"
+            response["post"] = await self._run(self.model_executor, generate_linkedin_post, combined_input,
+                                               mode="dynamic", max_iterations=3)
+        else:
+            scope = response_scope(agent, applied_filters, top_k=2, alpha=0.5)
+            embedding, hit = await self._cached_response(user_query, scope)
+            post = None
+            start = time.perf_counter()
+            if hit is not None:
+                cached, similarity, _ = hit
+                indices, summaries, post = cached["indices"], cached["summaries"], cached.get("post")
+                response["cached_similarity"] = round(similarity, 4)
+            else:
+                indices = await self._run(self.retrieval_executor, retrieve_articles, user_query, self.data,
+                                          self.index, top_k=2, use_hybrid=True, alpha=0.5,
+                                          excluded_ids=self.excluded_ids, hybrid_search=self.hybrid_search,
+                                          allowed_ids=allowed_ids, entity_index=self.entity_index,
+                                          rerank_embeddings=self.rerank_embeddings)
+                summaries = await self._run(self.model_executor, summarize_articles, self.data, indices,
+                                            deterministic=True)
+            compute_seconds = time.perf_counter() - start
+            response["articles"] = self._articles(indices, summaries)
+            if post is None:
+                start = time.perf_counter()
+                post = await self._run(self.model_executor, generate_linkedin_post, combine_summaries(summaries),
+                                       mode="default", max_iterations=3)
+                if hit is not None:
+                    self._cache_post(hit, post, time.perf_counter() - start)
+                else:
+                    self._cache_response(embedding, scope, indices, summaries, compute_seconds, post=post,
+                                         post_seconds=time.perf_counter() - start)
+            response["post"] = post
+        return response
+
+    def stats(self):
+        """
+        Return queue and concurrency counters, micro-batching stats, response cache
+        hit rate and compute saved, stage timings and counters (src.tracing) and the
+        model load report.
+        """
+        return {
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "max_queue": self.max_queue,
+            "batching": batching_stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache is not None else None,
+            "metrics": metrics_snapshot(),
+            "models": load_report(),
+        }
+
+async def _read_request(reader):
+    # Minimal HTTP/1.1 request parsing: request line, headers and a Content-Length body.
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        return None
+    method, path, _ = request_line.split(" ", 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large.")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, body
+
+def _response(status, payload, content_type="application/json"):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+    # Strings are sent as they are (e.g. Prometheus text); everything else as JSON.
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+    else:
+        body = json.dumps(payload, default=str).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    return head.encode("latin-1") + body
+
+def _chunk(event):
+    # One NDJSON line as an HTTP/1.1 chunk.
+    line = json.dumps(event, default=str).encode("utf-8") + b"\n"
+    return f"{len(line):X}\r\n".encode("latin-1") + line + b"\r\n"
+
+async def _write_stream(writer, events):
+    # The first event is awaited before the headers are sent, so a full queue still gets a 503.
+    try:
+        try:
+            event = await anext(events)
+        except ServiceBusy:
+            writer.write(_response(503, {"error": "Too many queued requests; try again later."}))
+            return
+        except Exception as e:
+            logger.exception("Error handling query: %s", e)
+            writer.write(_response(500, {"error": str(e)}))
+            return
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        try:
+            while True:
+                writer.write(_chunk(event))
+                await writer.drain()
+                event = await anext(events)
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            logger.exception("Error streaming query: %s", e)
+            writer.write(_chunk({"type": "error", "error": str(e)}))
+        writer.write(b"0\r\n\r\n")
+    finally:
+        await events.aclose()
+
+async def _handle_connection(service, reader, writer):
+    try:
+        try:
+            request = await _read_request(reader)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            writer.write(_response(400, {"error": f"Malformed request: {e}"}))
+            return
+        if request is None:
+            return
+        method, path, body = request
+
+        if method == "GET" and path == "/health":
+            writer.write(_response(200, {"status": "ok"}))
+        elif method == "GET" and path == "/stats":
+            writer.write(_response(200, service.stats()))
+        elif method == "GET" and path == "/metrics":
+            writer.write(_response(200, export_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE))
+        elif method == "POST" and path == "/query":
+            try:
+                payload = json.loads(body or b"{}")
+                user_query = str(payload["query"]).strip()
+                filters = payload.get("filters")
+                if filters is not None and not (isinstance(filters, dict) and set(filters) <= set(FILTER_FIELDS)):
+                    raise TypeError("filters must be an object with keys from FILTER_FIELDS")
+            except (ValueError, KeyError, TypeError):
+                writer.write(_response(400, {"error": 'Expected a JSON body like {"query": "...", "extra_data": "...", "filters": {...}} '
+                                                    f'(filter keys: {", ".join(FILTER_FIELDS)}).'}))
+                return
+            extra_data = str(payload.get("extra_data") or "").strip()
+            if payload.get("stream"):
+                await _write_stream(writer, service.stream_query(user_query, extra_data, filters))
+                return
+            try:
+                result = await service.handle_query(user_query, extra_data, filters, trace=bool(payload.get("trace")))
+                writer.write(_response(200, result))
+            except ServiceBusy:
+                writer.write(_response(503, {"error": "Too many queued requests; try again later."}))
+            except Exception as e:
+                logger.exception("Error handling query: %s", e)
+                writer.write(_response(500, {"error": str(e)}))
+        else:
+            writer.write(_response(404, {"error": f"No route for {method} {path}."}))
+    finally:
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+async def serve(service, host="127.0.0.1", port=8000):
+    """
+    Run the HTTP/JSON endpoint until cancelled.
+
+    Routes:
+        POST /query   {"query": "...", "extra_data": "...", "filters": {...}, "trace": true} -> agent result
+                      (with "stream": true, newline-delimited JSON events as text is generated)
+        GET  /stats   queue depth, concurrency counters, micro-batching, response cache, stage timing and
+                      model load stats
+        GET  /metrics stage timings and counters in the Prometheus text format
+        GET  /health  liveness check
+    """
+    server = await asyncio.start_server(partial(_handle_connection, service), host, port)
+    logger.info("Serving on http://%s:%d (POST /query, GET /stats, GET /metrics, GET /health)", host, port)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident news RAG query server.")
+    parser.add_argument("--data", default="data/sample.json", help="Line-delimited JSON dataset.")
+    parser.add_argument("--store", default="data/artifacts", help="Artifact directory.")
+    parser.add_argument("--index-type", default="flat", help="FAISS index type (see src.search.INDEX_TYPES).")
+    parser.add_argument("--shards", type=int, default=1, help="Index shards, searched in parallel (1 = one index).")
+    parser.add_argument("--shard-by", default="hash", choices=SHARD_BY, help="How articles are assigned to shards.")
+    parser.add_argument("--build-workers", type=int, help="Shard build processes (default: one per shard and core).")
+    parser.add_argument("--response-cache-size", type=int, default=1024,
+                        help="Responses kept by the semantic response cache (0 disables it).")
+    parser.add_argument("--response-cache-ttl", type=float, default=3600, help="Seconds a cached response is reused.")
+    parser.add_argument("--response-cache-threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Minimum query cosine similarity for a cache hit.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--retrieval-workers", type=int, default=4)
+    parser.add_argument("--model-workers", type=int, default=1)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--micro-batch-size", type=int, default=1,
+                        help="Coalesce up to this many concurrent model calls into one batch (1 = off).")
+    parser.add_argument("--micro-batch-wait-ms", type=float, default=10.0,
+                        help="Longest time a model call waits for others to join its batch.")
+    parser.add_argument("--warmup", action="store_true", help="Load all models before accepting requests.")
+    parser.add_argument("--threads", type=int,
+                        help="Intra-op threads per model call (default: INFERENCE_THREADS or the library default).")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.threads:
+        set_num_threads(args.threads)
+
+    if args.micro_batch_size > 1:
+        enable_micro_batching(max_batch_size=args.micro_batch_size, max_wait_ms=args.micro_batch_wait_ms)
+        # Calls only coalesce if enough model threads submit at the same time.
+        args.model_workers = max(args.model_workers, args.micro_batch_size)
+
+    async def run():
+        service = QueryService.from_store(
+            args.data, args.store, index_type=args.index_type,
+            num_shards=args.shards, shard_by=args.shard_by, build_workers=args.build_workers,
+            response_cache_size=args.response_cache_size, response_cache_ttl=args.response_cache_ttl,
+            response_cache_threshold=args.response_cache_threshold,
+            retrieval_workers=args.retrieval_workers, model_workers=args.model_workers,
+            max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+        )
+        if service is None:
+            logger.error("Failed to load data!")
+            return
+        if args.warmup:
+            warmup()
+        await serve(service, args.host, args.port)
+
+    asyncio.run(run())
+
+if __name__ == '__main__':
+    main()
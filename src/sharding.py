@@ -0,0 +1,269 @@
+# src/sharding.py
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from src.artifact_store import EMBEDDINGS_FILE, KEYS_FILE, SHARDS_DIR, open_article_store, read_manifest
+from src.search import build_index, add_vectors
+
+# Files of shard 0 inside the SHARDS_DIR of an artifact directory:
+#   shard-0000.faiss    FAISS index of the shard, over local ids 0..n-1
+#   shard-0000.ids.i64  raw int64 global index id of each local id
+#   shard-0000.f32      shard embeddings, only while a build is running
+
+# How articles are assigned to shards: by a hash of the article key (even sizes),
+# or by category (all articles of a category in one shard, categories spread so
+# that shard sizes stay as even as possible).
+SHARD_BY = ("hash", "category")
+
+def shard_path(store_dir, shard, suffix):
+    """
+    Path of a shard file ("faiss", "ids.i64" or "f32").
+    """
+    return os.path.join(store_dir, SHARDS_DIR, f"shard-{shard:04d}.{suffix}")
+
+def _write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def read_shard_ids(store_dir, shard):
+    """
+    Return the global index ids of a shard (empty if it has none).
+    """
+    path = shard_path(store_dir, shard, "ids.i64")
+    if not os.path.exists(path):
+        return np.empty(0, dtype=np.int64)
+    return np.fromfile(path, dtype=np.int64)
+
+def assign_shards(keys, categories, num_shards, by="hash", category_shards=None, shard_sizes=None):
+    """
+    Assign articles to shards.
+
+    Parameters:
+        keys (numpy.ndarray): uint64 article key hashes (see src.artifact_store.article_key_hashes).
+        categories (list): Category of each article (only used with by="category").
+        num_shards (int): Number of shards.
+        by (str): One of SHARD_BY.
+        category_shards (dict): Category -> shard of the categories already placed;
+                                new categories are added to it (by="category").
+        shard_sizes (array-like): Current number of articles per shard (by="category").
+
+    Returns:
+        numpy.ndarray: The int64 shard of each article.
+    """
+    if by not in SHARD_BY:
+        raise ValueError(f"Unknown shard_by '{by}'. Expected one of {SHARD_BY}.")
+    if by == "hash":
+        return (np.asarray(keys, dtype=np.uint64) % np.uint64(num_shards)).astype(np.int64)
+    category_shards = category_shards if category_shards is not None else {}
+    names = np.array([category.strip().upper() if isinstance(category, str) else "" for category in categories])
+    unique_names, inverse, counts = np.unique(names, return_inverse=True, return_counts=True)
+    sizes = np.zeros(num_shards, dtype=np.int64) if shard_sizes is None else np.array(shard_sizes, dtype=np.int64)
+    for position in np.flatnonzero([name in category_shards for name in unique_names]):
+        sizes[category_shards[unique_names[position]]] += counts[position]
+    # New categories, largest first, go to the shard with the fewest articles.
+    for position in sorted(np.flatnonzero([name not in category_shards for name in unique_names]),
+                           key=lambda position: -counts[position]):
+        shard = int(np.argmin(sizes))
+        category_shards[str(unique_names[position])] = shard
+        sizes[shard] += counts[position]
+    return np.array([category_shards[name] for name in unique_names], dtype=np.int64)[inverse]
+
+def _build_shard(store_dir, shard, ids, index_type, index_params, text_column='short_description', batch_size=64,
+                 num_threads=None, embeddings_shape=None):
+    # Runs in a worker process. Embeds the shard's articles (or, with embeddings_shape,
+    # reads their rows from the store's embeddings file) and writes the shard index.
+    start = time.perf_counter()
+    if num_threads:
+        from src.backends import set_num_threads
+        set_num_threads(num_threads)
+        faiss.omp_set_num_threads(num_threads)
+    if embeddings_shape is not None:
+        stored = np.memmap(os.path.join(store_dir, EMBEDDINGS_FILE), dtype=np.float32, mode="r",
+                           shape=embeddings_shape)
+        embeddings = np.ascontiguousarray(stored[ids])
+        del stored
+    else:
+        from src.data_preprocessing import embedding_texts
+        from src.embedding import get_embeddings
+        articles = pd.DataFrame(open_article_store(store_dir).gather(ids, fields=[text_column, "headline"]))
+        embeddings = get_embeddings(embedding_texts(articles, text_column=text_column), batch_size=batch_size)
+        # The parent copies these rows into the store's embeddings file.
+        embeddings.tofile(shard_path(store_dir, shard, "f32"))
+    index = build_index(embeddings, index_type=index_type, **index_params)
+    _write_atomic(shard_path(store_dir, shard, "faiss"), lambda path: faiss.write_index(index, path))
+    return shard, int(embeddings.shape[1]), time.perf_counter() - start
+
+def _scatter_embeddings(store_dir, shards, num_rows, dimension, mode):
+    # Copy the per-shard embedding files into the store's embeddings file (row i = index id i).
+    embeddings = np.memmap(os.path.join(store_dir, EMBEDDINGS_FILE), dtype=np.float32, mode=mode,
+                           shape=(num_rows, dimension))
+    for shard in shards:
+        path = shard_path(store_dir, shard, "f32")
+        embeddings[read_shard_ids(store_dir, shard)] = np.fromfile(path, dtype=np.float32).reshape(-1, dimension)
+        os.remove(path)
+    embeddings.flush()
+    del embeddings
+
+def build_shards(store_dir, num_rows, num_shards, by="hash", text_column='short_description', batch_size=64,
+                 num_workers=None, index_type="flat", category_shards=None, **index_params):
+    """
+    Partition the articles of a store into shards, then embed and index every
+    shard in its own process, so the build scales with the number of cores.
+    Each worker loads its own embedding model and uses cpu_count // num_workers
+    threads. Called by src.artifact_store.build_artifacts once the metadata and
+    keys are written; the embeddings file is filled from the shards at the end.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        num_rows (int): Number of articles in the store.
+        num_shards (int): Number of shards.
+        by (str): One of SHARD_BY.
+        text_column (str): Column used to compute the embeddings.
+        batch_size (int): Batch size for embedding.
+        num_workers (int): Worker processes (default: one per shard, at most one per core).
+        index_type (str): FAISS index type of every shard (see src.search.INDEX_TYPES).
+        category_shards (dict): Filled with the category -> shard placement (by="category").
+        **index_params: Extra build_index() settings, applied per shard.
+
+    Returns:
+        int: The embedding dimension.
+    """
+    os.makedirs(os.path.join(store_dir, SHARDS_DIR), exist_ok=True)
+    keys = np.fromfile(os.path.join(store_dir, KEYS_FILE), dtype=np.uint64, count=num_rows)
+    categories = open_article_store(store_dir).texts("category") if by == "category" else None
+    assignment = assign_shards(keys, categories, num_shards, by=by, category_shards=category_shards)
+    shard_ids = {}
+    for shard in range(num_shards):
+        ids = np.flatnonzero(assignment == shard).astype(np.int64)
+        _write_atomic(shard_path(store_dir, shard, "ids.i64"), ids.tofile)
+        if len(ids):
+            shard_ids[shard] = ids
+    print(f"Shard sizes: {[int((assignment == shard).sum()) for shard in range(num_shards)]}")
+
+    cpu_count = os.cpu_count() or 1
+    num_workers = num_workers or min(len(shard_ids), cpu_count)
+    num_threads = max(1, cpu_count // num_workers)
+    dimension = None
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # Largest shards first, so no worker is left with a big shard at the end.
+        futures = [
+            executor.submit(_build_shard, store_dir, shard, ids, index_type, index_params, text_column,
+                            batch_size, num_threads)
+            for shard, ids in sorted(shard_ids.items(), key=lambda item: -len(item[1]))
+        ]
+        for future in as_completed(futures):
+            shard, dimension, seconds = future.result()
+            print(f"Shard {shard} built in {seconds:.1f}s ({len(shard_ids[shard])} rows).")
+    print(f"{len(shard_ids)} shards built with {num_workers} workers in {time.perf_counter() - start:.1f}s.")
+    _scatter_embeddings(store_dir, shard_ids, num_rows, dimension, mode="w+")
+    return dimension
+
+def rebuild_shard(store_dir, shard, reembed=False, text_column='short_description', batch_size=64):
+    """
+    Rebuild the index of one shard (e.g. after a corrupted file, or with
+    reembed=True after an embedding fix) without touching the other shards.
+    The shard keeps its articles.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        shard (int): The shard to rebuild.
+        reembed (bool): Re-embed the shard's articles (and update their rows in
+                        the embeddings file) instead of reusing the stored embeddings.
+        text_column (str): Column used to compute the embeddings.
+        batch_size (int): Batch size for embedding.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None or not manifest.get("shards"):
+        raise ValueError(f"{store_dir} does not hold a sharded index.")
+    sharding = manifest["shards"]
+    if not 0 <= shard < sharding["num_shards"]:
+        raise ValueError(f"Shard {shard} out of range (the store has {sharding['num_shards']}).")
+    ids = read_shard_ids(store_dir, shard)
+    if len(ids) == 0:
+        print(f"Shard {shard} is empty.")
+        return
+    shape = (manifest["num_rows"], manifest["dimension"])
+    _, _, seconds = _build_shard(store_dir, shard, ids, manifest.get("index_type", "flat"),
+                                 sharding.get("index_params", {}), text_column=text_column, batch_size=batch_size,
+                                 embeddings_shape=None if reembed else shape)
+    if reembed:
+        _scatter_embeddings(store_dir, [shard], shape[0], shape[1], mode="r+")
+    print(f"Shard {shard} rebuilt in {seconds:.1f}s ({len(ids)} rows).")
+
+def read_shards(store_dir, num_shards, io_flags=0):
+    """
+    Read the shard indexes of a store and their global ids (empty shards are skipped).
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        num_shards (int): Number of shards recorded in the manifest.
+        io_flags (int): faiss.read_index flags (e.g. to memory-map the shards).
+
+    Returns:
+        tuple: (shards, shard_ids), as taken by src.search.ShardedIndex.
+
+    Raises:
+        ValueError: If a shard index and its ids file disagree, or every shard is empty.
+    """
+    shards, shard_ids = [], []
+    for shard in range(num_shards):
+        ids = read_shard_ids(store_dir, shard)
+        if len(ids) == 0:
+            continue
+        index = faiss.read_index(shard_path(store_dir, shard, "faiss"), io_flags)
+        if index.ntotal != len(ids):
+            raise ValueError(f"Shard {shard} index holds {index.ntotal} vectors but {len(ids)} ids.")
+        shards.append(index)
+        shard_ids.append(ids)
+    if not shards:
+        raise ValueError(f"No shard of {store_dir} holds any vectors.")
+    return shards, shard_ids
+
+def add_to_shards(store_dir, manifest, start, keys, categories, embeddings):
+    """
+    Add newly ingested articles to their shards (used by src.ingest.merge_segments).
+    Only the shards that receive articles are rewritten.
+
+    Parameters:
+        store_dir (str): Directory that holds the artifacts.
+        manifest (dict): The store manifest; new categories are recorded in it (the caller writes it).
+        start (int): Index id of the first new article.
+        keys (numpy.ndarray): uint64 key hashes of the new articles.
+        categories (list): Categories of the new articles.
+        embeddings (numpy.ndarray): Their embeddings.
+    """
+    sharding = manifest["shards"]
+    num_shards = sharding["num_shards"]
+    assignment = assign_shards(keys, categories, num_shards, by=sharding.get("by", "hash"),
+                               category_shards=sharding.setdefault("categories", {}),
+                               shard_sizes=[len(read_shard_ids(store_dir, shard)) for shard in range(num_shards)])
+    for shard in np.unique(assignment):
+        rows = np.flatnonzero(assignment == shard)
+        index_path = shard_path(store_dir, shard, "faiss")
+        if os.path.exists(index_path):
+            index = faiss.read_index(index_path)
+            add_vectors(index, embeddings[rows])
+        else:
+            index = build_index(embeddings[rows], index_type=manifest.get("index_type", "flat"),
+                                **sharding.get("index_params", {}))
+        ids = np.concatenate([read_shard_ids(store_dir, shard), start + rows.astype(np.int64)])
+        _write_atomic(index_path, lambda path: faiss.write_index(index, path))
+        _write_atomic(shard_path(store_dir, shard, "ids.i64"), ids.tofile)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild one shard of a sharded artifact store.")
+    parser.add_argument("shard", type=int)
+    parser.add_argument("--store-dir", default="data/artifacts")
+    parser.add_argument("--reembed", action="store_true", help="Re-embed the shard's articles.")
+    args = parser.parse_args()
+    rebuild_shard(args.store_dir, args.shard, reembed=args.reembed)
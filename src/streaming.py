@@ -0,0 +1,88 @@
+# src/streaming.py
+
+import asyncio
+import threading
+
+from src.tracing import run_in_context
+
+# Seconds to wait for the next piece of text before giving up on a stalled generation.
+STREAM_TIMEOUT = 300
+
+class StreamedCall:
+    def __init__(self, func, tokenizer, *args, **kwargs):
+        """
+        Run func(*args, streamer=streamer, **kwargs) in a background thread, where
+        streamer is a transformers TextIteratorStreamer, and iterate over the text
+        as the model produces it. func is typically a pipeline or generate call
+        (greedy or sampled; beam search cannot be streamed).
+
+        After the iteration, result holds func's return value; an exception raised
+        by func is re-raised by the iteration.
+
+        Parameters:
+            func (callable): Accepts a streamer keyword argument and passes it to model.generate.
+            tokenizer: The tokenizer used to decode the streamed tokens.
+        """
+        from transformers import TextIteratorStreamer
+        self.streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, timeout=STREAM_TIMEOUT,
+                                             skip_special_tokens=True)
+        self.result = None
+        self._error = None
+        self._thread = threading.Thread(target=run_in_context(self._run, func, args, kwargs), name="streamer",
+                                        daemon=True)
+
+    def _run(self, func, args, kwargs):
+        try:
+            self.result = func(*args, streamer=self.streamer, **kwargs)
+        except BaseException as error:
+            self._error = error
+            # Unblock the consumer if generation failed before it ended the stream.
+            self.streamer.end()
+
+    def __iter__(self):
+        self._thread.start()
+        for text in self.streamer:
+            if text:
+                yield text
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+async def iterate_in_thread(chunks, executor=None):
+    """
+    Consume a blocking iterator (e.g. stream_linkedin_post) on an executor
+    thread and yield its items to asyncio code as soon as each one arrives.
+
+    Parameters:
+        chunks (iterator): The iterator; it is advanced only on the executor thread.
+        executor (concurrent.futures.Executor): Where to run it (the loop's default if None).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+    finished = object()
+
+    def produce():
+        try:
+            for item in chunks:
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except BaseException as error:
+            loop.call_soon_threadsafe(queue.put_nowait, (finished, error))
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, (finished, None))
+
+    future = loop.run_in_executor(executor, run_in_context(produce))
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                break
+            yield item
+        await future
+        if error is not None:
+            raise error
+    finally:
+        # The consumer may stop early (e.g. the client disconnected).
+        stopped.set()
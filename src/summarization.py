@@ -1,41 +1,349 @@
-from transformers import pipeline
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 
-# Initialize the summarization pipeline using facebook/bart-large-cnn
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+from src.models import register_model, get_model
+from src.backends import get_backend, load_pipeline
+from src.batching import register_batch_function, get_batcher
+from src.tracing import span, increment
+from src.streaming import StreamedCall
 
-def generate_summary_local(text, default_max=40, default_min=20):
+# Name of the summarization model; also part of every summary cache key.
+SUMMARY_MODEL_NAME = "facebook/bart-large-cnn"
+
+def _load_summarizer(backend=None):
+    return load_pipeline("summarization", SUMMARY_MODEL_NAME, backend or get_backend("summarizer"))
+
+def summary_model_key():
+    """
+    The model part of summary cache keys: the model name, plus the backend when
+    it is not fp32 PyTorch (int8 and ONNX summaries can differ slightly).
+    """
+    backend = get_backend("summarizer")
+    return SUMMARY_MODEL_NAME if backend == "torch" else f"{SUMMARY_MODEL_NAME}:{backend}"
+
+# The summarization pipeline (facebook/bart-large-cnn) is loaded on first use (see src.models);
+# SUMMARIZER_BACKEND selects torch, int8 or onnx (see src.backends).
+register_model("summarizer", _load_summarizer)
+
+def __getattr__(name):
+    # Keeps `from src.summarization import summarizer` working without loading at import time.
+    if name == "summarizer":
+        return get_model("summarizer")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Beam count used for every summary.
+NUM_BEAMS = 3
+
+# Puts between two purges of expired and surplus rows from the on-disk summary cache.
+PURGE_INTERVAL = 256
+
+class SummaryCache:
+    def __init__(self, max_size=1024, ttl=None, db_path=None, max_rows=1000000):
+        """
+        Two-level summary cache: an in-memory LRU backed by an optional SQLite file.
+        
+        Parameters:
+            max_size (int): Maximum number of summaries kept in memory.
+            ttl (float): Seconds after which an entry expires (None = never).
+            db_path (str): SQLite file for the persistent layer (None = memory only).
+            max_rows (int): Maximum number of summaries kept on disk; the oldest are
+                            deleted first (None = unbounded).
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (summary, created_at)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db = None
+        if db_path is not None:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS summaries_created_at ON summaries (created_at)")
+            self._db.commit()
+            self.purge_expired()
+    
+    @staticmethod
+    def make_key(text, max_length, min_length, num_beams=NUM_BEAMS, do_sample=True, model_name=None):
+        """
+        Cache key: a hash of the text plus the model name (and backend) and generation parameters.
+        """
+        model_name = model_name or summary_model_key()
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_name}|{max_length}|{min_length}|{num_beams}|{int(do_sample)}|{content_hash}"
+    
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+    
+    def get(self, key):
+        """
+        Return the cached summary for the key, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT summary, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, summary):
+        """
+        Store a summary in memory and, if configured, on disk.
+        """
+        entry = (summary, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)", (key, entry[0], entry[1]))
+                self._puts += 1
+                if self._puts % PURGE_INTERVAL == 0:
+                    self._purge()
+                self._db.commit()
+    
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def _purge(self):
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM summaries WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_rows is not None:
+            self._db.execute("DELETE FROM summaries WHERE key NOT IN "
+                             "(SELECT key FROM summaries ORDER BY created_at DESC LIMIT ?)", (self.max_rows,))
+    
+    def purge_expired(self):
+        """
+        Delete expired entries, and the oldest ones beyond max_rows, from the
+        on-disk store. Runs when the cache is opened and every PURGE_INTERVAL puts.
+        """
+        if self._db is None:
+            return
+        with self._lock:
+            self._purge()
+            self._db.commit()
+    
+    def stats(self):
+        """
+        Return hit/miss counters and the hit rate.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._entries)}
+
+# Cache used by the summarization functions; replace it with set_summary_cache().
+summary_cache = SummaryCache()
+
+def set_summary_cache(cache):
+    """
+    Replace the cache used by generate_summary_local / generate_summaries_local
+    (e.g. with a SQLite-backed one). Pass None to disable caching.
+    """
+    global summary_cache
+    summary_cache = cache
+
+def summary_length_params(text, default_max=40, default_min=20):
+    """
+    Return the (max_length, min_length) used to summarize the given text.
+    Short inputs (under 50 words) use the defaults; longer inputs scale with their length.
+    """
+    input_length = len(text.split())
+    if input_length < 50:
+        return default_max, default_min
+    return min(100, input_length + 20), min(40, input_length)
+
+def generate_summary_local(text, default_max=40, default_min=20, use_cache=True, deterministic=False):
     """
     Generate a summary for the given text using BART.
     For very short inputs, if the text is already concise, return it or do a slight rephrase.
+    See generate_summaries_local for use_cache and deterministic.
+    """
+    return generate_summaries_local([text], default_max, default_min, batch_size=1,
+                                    use_cache=use_cache, deterministic=deterministic)[0]
+
+def generate_summaries_local(texts, default_max=40, default_min=20, batch_size=8, use_cache=True, deterministic=False):
     """
-    words = text.split()
-    input_length = len(words)
+    Generate summaries for several texts with batched BART forward passes.
     
-    # If the text is very short, just rephrase slightly or return a modified version
-    if input_length < 50:
-        # Option 1: Just return a rephrased version. You could also try summarizer with more constrained parameters.
-        summary_list = summarizer(
-            text,
-            max_length=default_max,
-            min_length=default_min,
-            num_beams=3,
-            do_sample=True,
-            temperature=0.8
-        )
-        return summary_list[0]['summary_text']
-    else:
-        # For longer texts, you can adjust dynamically.
-        max_length = min(100, input_length + 20)
-        min_length = min(40, input_length)
-        summary_list = summarizer(
+    Texts that share the same length rules (see summary_length_params) go
+    through the pipeline together; inside each group they are sorted by
+    length so every padded batch holds inputs of similar size. Empty or
+    missing texts get an empty summary without calling the model.
+    
+    Parameters:
+        texts (list): The texts to summarize.
+        default_max (int): Maximum summary length for short inputs.
+        default_min (int): Minimum summary length for short inputs.
+        batch_size (int): Number of texts per forward pass.
+        use_cache (bool): Look summaries up in (and add them to) the module summary cache.
+        deterministic (bool): Use plain beam search instead of sampling, so the
+                              same text always yields the same (cacheable) summary.
+    
+    Returns:
+        list: One summary string per input text, in the input order.
+    """
+    with span("summarize", texts=len(texts)) as attributes:
+        cache = summary_cache if use_cache else None
+        
+        summaries = [""] * len(texts)
+        keys = {}
+        pending = []
+        for i, text in enumerate(texts):
+            if not (isinstance(text, str) and text.strip()):
+                continue
+            max_length, min_length = summary_length_params(text, default_max, default_min)
+            if cache is not None:
+                keys[i] = SummaryCache.make_key(text, max_length, min_length, do_sample=not deterministic)
+                cached = cache.get(keys[i])
+                increment("summary_cache_lookups", result="miss" if cached is None else "hit")
+                if cached is not None:
+                    summaries[i] = cached
+                    continue
+            pending.append((i, (text, max_length, min_length, deterministic)))
+        attributes["generated"] = len(pending)
+        if not pending:
+            return summaries
+        
+        # With micro-batching enabled, cache misses from concurrent requests share forward passes.
+        batcher = get_batcher("summarizer")
+        if batcher is not None:
+            futures = [batcher.submit(item) for _, item in pending]
+            results = [future.result() for future in futures]
+        else:
+            results = _summarize_batch([item for _, item in pending], batch_size=batch_size)
+        for (i, _), summary in zip(pending, results):
+            summaries[i] = summary
+            if cache is not None:
+                cache.put(keys[i], summary)
+        return summaries
+
+def _summarize_batch(items, batch_size=8):
+    """
+    Run the summarizer over (text, max_length, min_length, deterministic) items.
+    
+    Items that share the same generation parameters go through the pipeline
+    together; inside each group they are sorted by length so every padded batch
+    holds inputs of similar size.
+    
+    Returns:
+        list: One summary string per item, in the input order.
+    """
+    summaries = [""] * len(items)
+    groups = {}
+    for i, (_, max_length, min_length, deterministic) in enumerate(items):
+        groups.setdefault((max_length, min_length, deterministic), []).append(i)
+    
+    for (max_length, min_length, deterministic), ids in groups.items():
+        generation_kwargs = _generation_kwargs(deterministic)
+        ids.sort(key=lambda i: len(items[i][0]))
+        with span("summarizer_forward", texts=len(ids), max_length=max_length):
+            summary_list = get_model("summarizer")(
+                [items[i][0] for i in ids],
+                batch_size=batch_size,
+                max_length=max_length,
+                min_length=min_length,
+                **generation_kwargs
+            )
+        for i, summary in zip(ids, summary_list):
+            summaries[i] = summary['summary_text']
+    return summaries
+
+# Used by the "summarizer" micro-batcher (see src.batching).
+register_batch_function("summarizer", _summarize_batch)
+
+def _generation_kwargs(deterministic, num_beams=NUM_BEAMS):
+    generation_kwargs = {"num_beams": num_beams, "do_sample": not deterministic}
+    if not deterministic:
+        generation_kwargs["temperature"] = 0.8
+    return generation_kwargs
+
+def _summarize_streamed(text, max_length, min_length, deterministic, streamer):
+    # Single-beam BART call that feeds the streamer token by token.
+    with span("summarizer_forward", texts=1, max_length=max_length, streamed=True):
+        summary = get_model("summarizer")(
             text,
             max_length=max_length,
             min_length=min_length,
-            num_beams=3,
-            do_sample=True,
-            temperature=0.8
+            streamer=streamer,
+            **_generation_kwargs(deterministic, num_beams=1)
         )
-        return summary_list[0]['summary_text']
+    return summary[0]['summary_text']
+
+def stream_summary_local(text, default_max=40, default_min=20, use_cache=True, deterministic=False):
+    """
+    Streaming variant of generate_summary_local: yields the summary as BART
+    produces it, so the first words can be shown right away.
+    
+    Beam search cannot be streamed (beams are reordered until the end), so a
+    summary that is not cached is decoded with a single beam (greedy if
+    deterministic, sampled otherwise) and cached under its own key. A cached
+    summary, including a beam-search one from generate_summaries_local or
+    presummarize_corpus, is yielded in one piece.
+    
+    Parameters:
+        The same as generate_summary_local.
+    
+    Yields:
+        str: The next piece of the summary (nothing for an empty text).
+    """
+    if not (isinstance(text, str) and text.strip()):
+        return
+    max_length, min_length = summary_length_params(text, default_max, default_min)
+    cache = summary_cache if use_cache else None
+    key = SummaryCache.make_key(text, max_length, min_length, num_beams=1, do_sample=not deterministic)
+    if cache is not None:
+        for lookup_key in (SummaryCache.make_key(text, max_length, min_length, do_sample=not deterministic), key):
+            cached = cache.get(lookup_key)
+            if cached is not None:
+                increment("summary_cache_lookups", result="hit")
+                yield cached
+                return
+        increment("summary_cache_lookups", result="miss")
+    
+    call = StreamedCall(_summarize_streamed, get_model("summarizer").tokenizer, text, max_length, min_length,
+                        deterministic)
+    yield from call
+    if cache is not None:
+        cache.put(key, call.result)
+
+def presummarize_corpus(texts, batch_size=8, chunk_size=256, deterministic=True):
+    """
+    Offline job: summarize every text and store the results in the summary cache,
+    so later requests for these articles are cache hits.
+    
+    Parameters:
+        texts (list): The corpus texts (e.g. the short_description column).
+        batch_size (int): Number of texts per forward pass.
+        chunk_size (int): Number of texts handled between progress reports.
+        deterministic (bool): Use beam search only (recommended for a reusable cache).
+    
+    Returns:
+        int: Number of texts processed.
+    """
+    texts = list(texts)
+    for start in range(0, len(texts), chunk_size):
+        generate_summaries_local(texts[start:start + chunk_size], batch_size=batch_size,
+                                 use_cache=True, deterministic=deterministic)
+        print(f"Pre-summarized {min(start + chunk_size, len(texts))}/{len(texts)} texts.")
+    return len(texts)
 
 if __name__ == '__main__':
     sample_text = (
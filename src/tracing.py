@@ -0,0 +1,239 @@
+# src/tracing.py
+
+import contextvars
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every exported Prometheus metric.
+METRIC_PREFIX = "news_rag"
+
+# The trace of the request being handled and the innermost open span. Context
+# variables follow asyncio tasks; executor threads get them through run_in_context().
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+_metrics_lock = threading.Lock()
+# stage name -> [calls, wall seconds, cpu seconds], over all requests since start/reset.
+_stage_totals = {}
+# (counter name, sorted label items) -> value
+_counters = {}
+
+class Trace:
+    def __init__(self, name="request"):
+        """
+        The spans recorded while handling one request. Spans may be added from
+        several threads (retrieval and model executors).
+        """
+        self.name = name
+        self.spans = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def stage_totals(self):
+        """
+        Return wall and CPU milliseconds summed per stage name.
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            stage = totals.setdefault(record["name"], {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0})
+            stage["calls"] += 1
+            stage["wall_ms"] = round(stage["wall_ms"] + record["wall_ms"], 4)
+            stage["cpu_ms"] = round(stage["cpu_ms"] + record["cpu_ms"], 4)
+        return totals
+
+    def to_dict(self):
+        """
+        Return the trace as JSON-serializable data: every span in start order.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda record: record["start_ms"])
+        return {"name": self.name, "spans": spans, "stages": self.stage_totals()}
+
+    def format(self):
+        """
+        Render the spans as an indented text tree (one line per span).
+        """
+        spans = self.to_dict()["spans"]
+        children = {}
+        for record in spans:
+            children.setdefault(record["parent"], []).append(record)
+        lines = []
+
+        def walk(parent, depth):
+            for record in children.get(parent, []):
+                attributes = " ".join(f"{key}={value}" for key, value in record["attributes"].items())
+                lines.append(f"{'  ' * depth}{record['name']}: {record['wall_ms']:.2f} ms wall, "
+                             f"{record['cpu_ms']:.2f} ms cpu {attributes}".rstrip())
+                walk(record["id"], depth + 1)
+
+        walk(None, 0)
+        return "\n".join(lines)
+
+def current_trace():
+    """
+    Return the trace of the current request, or None outside start_trace().
+    """
+    return _current_trace.get()
+
+@contextmanager
+def start_trace(name="request"):
+    """
+    Record every span opened inside the block (in this task or in threads
+    started through run_in_context) into a new Trace.
+
+    Yields:
+        Trace: The trace being recorded.
+    """
+    trace = Trace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage: wall-clock time and the CPU time of the calling thread
+    (work done on FAISS/BLAS worker threads is not included in the CPU time).
+    The result goes to the current trace, if any, and to the process-wide stage totals.
+
+    Parameters:
+        name (str): Stage name (e.g. "faiss_search").
+        **attributes: Values attached to the span (e.g. top_k=5).
+
+    Yields:
+        dict: The span attributes; add entries to record results (e.g. cache hits).
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    span_id = next(_span_ids)
+    token = _current_span.set(span_id)
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield attributes
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        _current_span.reset(token)
+        with _metrics_lock:
+            totals = _stage_totals.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+        if trace is not None:
+            trace._add({
+                "id": span_id,
+                "parent": parent,
+                "name": name,
+                "start_ms": round((wall_start - trace._start) * 1000, 4),
+                "wall_ms": round(wall * 1000, 4),
+                "cpu_ms": round(cpu * 1000, 4),
+                "thread": threading.current_thread().name,
+                "attributes": attributes,
+            })
+
+def run_in_context(func, *args, **kwargs):
+    """
+    Return a zero-argument callable that runs func in a copy of the current
+    context, so spans opened in an executor thread join the caller's trace.
+    """
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args, **kwargs)
+
+def increment(name, value=1, **labels):
+    """
+    Add to a process-wide counter (e.g. increment("summary_cache_lookups", result="hit")).
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def metrics_snapshot():
+    """
+    Return the stage totals and counters accumulated since start (or reset_metrics()).
+
+    Returns:
+        dict: {"stages": {name: {"calls", "wall_seconds", "cpu_seconds"}},
+               "counters": [{"name", "labels", "value"}]}
+    """
+    with _metrics_lock:
+        stages = {
+            name: {"calls": calls, "wall_seconds": round(wall, 6), "cpu_seconds": round(cpu, 6)}
+            for name, (calls, wall, cpu) in sorted(_stage_totals.items())
+        }
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+    return {"stages": stages, "counters": counters}
+
+def export_json():
+    """
+    Return metrics_snapshot() as a JSON string.
+    """
+    return json.dumps(metrics_snapshot(), indent=2)
+
+def _labels(items):
+    if not items:
+        return ""
+    pairs = []
+    for key, value in items:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def export_prometheus():
+    """
+    Return the metrics in the Prometheus text exposition format.
+    """
+    snapshot = metrics_snapshot()
+    lines = []
+    for metric, field, help_text in (
+        ("stage_calls_total", "calls", "Number of times each pipeline stage ran."),
+        ("stage_wall_seconds_total", "wall_seconds", "Wall-clock seconds spent in each pipeline stage."),
+        ("stage_cpu_seconds_total", "cpu_seconds", "CPU seconds (calling thread) spent in each pipeline stage."),
+    ):
+        lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+        for stage, values in snapshot["stages"].items():
+            lines.append(f'{METRIC_PREFIX}_{metric}{{stage="{stage}"}} {values[field]}')
+    declared = set()
+    for counter in snapshot["counters"]:
+        metric = f"{METRIC_PREFIX}_{counter['name']}_total"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} counter")
+            declared.add(metric)
+        lines.append(f"{metric}{_labels(sorted(counter['labels'].items()))} {counter['value']}")
+    return "\n".join(lines) + "\n"
+
+def reset_metrics():
+    """
+    Clear the process-wide stage totals and counters.
+    """
+    with _metrics_lock:
+        _stage_totals.clear()
+        _counters.clear()
+
+if __name__ == '__main__':
+    with start_trace("demo") as trace:
+        with span("outer", top_k=3):
+            with span("inner") as attributes:
+                sum(range(100000))
+                attributes["items"] = 100000
+        increment("cache_lookups", result="hit")
+    print(trace.format())
+    print(export_prometheus())